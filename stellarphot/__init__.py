@@ -13,6 +13,8 @@ except ImportError:
 # ``from stellarphot import apass_dr9``.
 from .catalogs import *
 from .core import *
+from .dataset import *
+from .flux_matrix import *
 
 # We load this for its side effect of adding YAML representations for the models
 from .table_representations import *
@@ -14,7 +14,6 @@ from astropy.coordinates import SkyCoord
 from astropy.io.ascii import InconsistentTableError
 from astropy.table import Column, QTable, Table, TableAttribute
 from astropy.time import Time
-from astropy.utils.decorators import lazyproperty
 from astropy.utils.exceptions import AstropyUserWarning
 from astropy.wcs import WCS
 from astroquery.vizier import Vizier
@@ -27,7 +26,7 @@ from .settings import Camera, Observatory
 from .table_representations import (
     _generate_old_table_representers,
     deserialize_models_in_table_meta,
-    serialize_models_in_table_meta,
+    serialized_table_meta,
 )
 
 # NOTE: ``core.py`` holds the table data-structure classes only
@@ -118,6 +117,13 @@ class BaseEnhancedTable(QTable):
         names as values.  This is used to automatically update the column
         names to the desired names BEFORE the validation is performed.
 
+    copy: bool, optional (Default: True)
+        If ``False``, the columns of `input_data` are used without being
+        copied, which avoids doubling the memory needed for large tables. Use
+        this only if `input_data` is not going to be changed or used after
+        creating this table, e.g. when it was made just to create this table.
+        The input data is validated either way.
+
     Notes
     -----
 
@@ -128,12 +134,18 @@ class BaseEnhancedTable(QTable):
     """
 
     def __init__(
-        self, *args, input_data=None, table_description=None, colname_map=None, **kwargs
+        self,
+        *args,
+        input_data=None,
+        table_description=None,
+        colname_map=None,
+        copy=True,
+        **kwargs,
     ):
         if (table_description is None) and (input_data is None):
             # Assume user is trying to create an empty table and let QTable
             # handle it
-            super().__init__(*args, **kwargs)
+            super().__init__(*args, copy=copy, **kwargs)
         else:
             # Confirm a proper table description is passed (that is dict-like with keys
             # and values)
@@ -156,8 +168,14 @@ class BaseEnhancedTable(QTable):
                     f"type {type(input_data)})."
                 )
 
-            # Copy data before potential modification
-            data = input_data.copy()
+            # Copy data before potential modification. Even if the data is not
+            # copied this makes a new table, so renaming columns does not
+            # change input_data.
+            data = input_data.copy(copy_data=copy)
+            if not copy:
+                # The metadata is small and may be changed below (e.g. by
+                # setting table attributes), so it is always copied.
+                data.meta = deepcopy(data.meta)
 
             # Rename columns before validation (if needed)
             if colname_map is not None:
@@ -182,10 +200,15 @@ class BaseEnhancedTable(QTable):
             for col in data.colnames:
                 if col not in order_col_list:
                     order_col_list.append(col)
-            data = data[order_col_list]
+            # Selecting the columns with data[order_col_list] would copy them
+            # again, so make a table of the columns in order without copying.
+            data = data.__class__(
+                [data[col] for col in order_col_list], meta=data.meta, copy=False
+            )
 
-            # Call QTable initializer to finish up
-            super().__init__(data=data, **kwargs)
+            # Call QTable initializer to finish up; data is already a copy if
+            # one was needed.
+            super().__init__(data=data, copy=False, **kwargs)
 
     def _validate_columns(self, data):
         # Check the format of the data table matches the table_description by
@@ -231,15 +254,27 @@ class BaseEnhancedTable(QTable):
         # Converts filter names in filter column to AAVSO standard names
         # Assumes _passband_map is in namespace.
 
-        # Create a list of new passband names instead of trying to change names in place
-        # in case any of the new names are longer than the longest of the old names.
-        # If that happens, astropy by default just truncates the names.
-        new_filter_name = [
-            (self._passband_map[orig_pb] if orig_pb in self._passband_map else orig_pb)
-            for orig_pb in self["passband"]
-        ]
+        # Look up each distinct passband name once rather than once per row.
+        # The new names are put in a new array instead of trying to change names
+        # in place in case any of the new names are longer than the longest of
+        # the old names. If that happens, astropy by default just truncates the
+        # names.
+        orig_passbands, row_passband = np.unique(
+            np.asarray(self["passband"]), return_inverse=True
+        )
+        new_passbands = np.array(
+            [
+                (
+                    self._passband_map[orig_pb]
+                    if orig_pb in self._passband_map
+                    else orig_pb
+                )
+                for orig_pb in orig_passbands
+            ],
+            dtype=str,
+        )
 
-        self["passband"] = new_filter_name
+        self["passband"] = new_passbands[row_passband]
 
     def clean(self, remove_rows_with_mask=False, **other_restrictions):
         """
@@ -332,6 +367,17 @@ class BaseEnhancedTable(QTable):
         **kwargs : dict
             Additional keyword arguments to pass to the `astropy.table.Table.read`
             method.
+
+        Notes
+        -----
+        Tables written in the Parquet format (files ending in ``.parquet``
+        or ``.parq``, which requires ``pyarrow``) can be read in part. Pass
+        ``include_names`` with a list of columns to read only those columns
+        and ``filters`` to read only the rows that match, e.g.
+        ``filters=[("night", "=", 60000), ("passband", "in", ["V", "B"])]``.
+        Only the columns that are asked for are read from the file, and parts
+        of the file whose rows cannot match the filters are skipped. See
+        `astropy.io.misc.parquet.read_table_parquet` for the details.
         """
         # Try reading the table using the QTable.read method
         try:
@@ -345,7 +391,9 @@ class BaseEnhancedTable(QTable):
             # If we got here, we can assume the table is a new one and has
             # models as dictionaries in the metadata.
             deserialize_models_in_table_meta(table.meta)
-        return cls(table)
+        # The table that was read is not used for anything else, so there is
+        # no need to copy it.
+        return cls(table, copy=False)
 
     def write(self, *args, **kwargs):
         """
@@ -358,11 +406,124 @@ class BaseEnhancedTable(QTable):
         **kwargs : dict
             Additional keyword arguments to pass to the `astropy.table.Table.write`
             method.
+
+        Notes
+        -----
+        Files ending in ``.parquet`` or ``.parq`` are written in the Parquet
+        format, which requires ``pyarrow``. That is much faster to read and
+        write than ECSV for large tables, and can be read in part; see `read`.
+        Units, `~astropy.time.Time` columns and the models in the metadata,
+        such as the camera and observatory, are kept in either format.
         """
-        original_meta = deepcopy(self.meta)
-        serialize_models_in_table_meta(self.meta)
-        super().write(*args, **kwargs)
-        self.meta = original_meta
+        # The models in the metadata are written as dictionaries. Write a copy
+        # of the metadata that has them serialized rather than changing the
+        # metadata of this table.
+        original_meta = self.meta
+        self.meta = serialized_table_meta(original_meta)
+        try:
+            super().write(*args, **kwargs)
+        finally:
+            self.meta = original_meta
+
+
+def _light_travel_time(times, sky_coords, location):
+    """
+    Barycentric light travel time for observations at the given times and
+    sky positions, which is the same as
+    ``times.light_travel_time(sky_coords, location=location)`` but evaluates
+    the ephemeris only once for each distinct time.
+
+    Parameters
+    ----------
+    times : `astropy.time.Time`
+        Times of the observations.
+
+    sky_coords : `astropy.coordinates.SkyCoord`
+        Position of the source, either one for all of the times or one for
+        each time.
+
+    location : `astropy.coordinates.EarthLocation`
+        Location of the observatory.
+
+    Returns
+    -------
+    `astropy.units.Quantity`
+        The light travel time for each observation.
+    """
+    # The light travel time is the position of the observatory relative to the
+    # barycenter projected onto the direction to the source, divided by c. The
+    # light travel time in the direction of each of the ICRS axes is the
+    # corresponding component of that position over c, so three evaluations
+    # at each distinct time give the light travel time in every direction
+    # exactly, not as an approximation.
+    _, first, inverse = np.unique(times.jd, return_index=True, return_inverse=True)
+    distinct_times = times[first]
+    axes = SkyCoord(ra=[0, 90, 0] * u.deg, dec=[0, 0, 90] * u.deg)
+    position = np.stack(
+        [
+            distinct_times.light_travel_time(axis, location=location).to_value(u.s)
+            for axis in axes
+        ],
+        axis=-1,
+    )
+    direction = sky_coords.icrs.represent_as("unitspherical").to_cartesian().xyz.value
+    return (position[inverse] * np.moveaxis(direction, 0, -1)).sum(axis=-1) * u.s
+
+
+def _night(date_obs, longitude):
+    """
+    Integer counter for the night of each observation, which is the MJD (UTC)
+    at local noon before the evening of the observation, truncated to an
+    integer.
+
+    Parameters
+    ----------
+    date_obs : `astropy.time.Time`
+        UTC times of the observations.
+
+    longitude : float
+        Longitude of the observatory in degrees. Local time is taken to be
+        UTC offset by a whole number of hours, ``int(longitude / 15)``.
+
+    Returns
+    -------
+    numpy.ndarray of int
+        The night of each observation.
+    """
+    hr_offset = int(longitude / 15)
+    # Work with the whole days and the fraction of the day separately to keep
+    # the precision of the two parts of the Time. The local date that starts
+    # at noon, as an MJD, is
+    #   floor(local MJD - 0.5) = floor(jd1 - 2400001 + jd2 + hr_offset / 24)
+    # and local noon on that date, in UTC, is 0.5 - hr_offset / 24 days later,
+    # which adds a day only if hr_offset is -12.
+    days = date_obs.jd1 - 2400001
+    whole_days = np.floor(days)
+    local_noon_date = whole_days + np.floor(
+        (days - whole_days) + date_obs.jd2 + hr_offset / 24
+    )
+    return local_noon_date.astype(int) + (12 - hr_offset) // 24
+
+
+def _light_curve_table(star_data, flux_column):
+    """
+    Add the columns that `lightkurve.LightCurve` needs to photometry, adding
+    metadata about where each column came from.
+    """
+    star_data["time"] = star_data["bjd"]
+    star_data.meta["time"] = "BJD at midpoint of exposure, column bjd"
+
+    star_data["flux"] = star_data[flux_column]
+    star_data.meta["flux"] = "Instrumental magnitude, column mag_inst"
+
+    # Why value? Because the instrumental magnitude error is fubar,
+    # see #463
+    flux_error_col = (
+        "mag_error" if flux_column == "mag_inst" else flux_column + "_error"
+    )
+    star_data["flux_err"] = star_data[flux_error_col].value
+    star_data.meta["flux_err"] = "Error in instrumental magnitude, column mag_error"
+    return star_data
 
 
 class PhotometryData(BaseEnhancedTable):
@@ -405,6 +566,10 @@ class PhotometryData(BaseEnhancedTable):
         exist in `data` will be retained.  If False, will throw an error
         if any computed columns already exist in `data`.
 
+    copy: bool, optional (Default: True)
+        If ``False``, the columns of `input_data` are used without being
+        copied. See `~stellarphot.BaseEnhancedTable` for details.
+
     Attributes
     ----------
     camera: `stellarphot.Camera`
@@ -614,32 +779,10 @@ class PhotometryData(BaseEnhancedTable):
                     match this_col:
 
                         case "night":
-                            # Generate integer counter for nights. This should be
-                            # approximately the MJD at noon local before the evening of
-                            # the observation.
-                            hr_offset = int(
-                                self.observatory.earth_location.lon.value / 15
-                            )
-                            # Compute offset to 12pm Local Time before evening
-                            LocalTime = Time(self["date-obs"]) + hr_offset * u.hr
-                            hr = LocalTime.ymdhms.hour
-                            # Compute number of hours to shift to arrive at 12 noon
-                            # local time
-                            shift_hr = hr.copy()
-                            shift_hr[hr < 12] = shift_hr[hr < 12] + 12
-                            shift_hr[hr >= 12] = shift_hr[hr >= 12] - 12
-                            delta = (
-                                -shift_hr * u.hr
-                                - LocalTime.ymdhms.minute * u.min
-                                - LocalTime.ymdhms.second * u.s
-                            )
-                            shift = Column(data=delta, name="shift")
-                            # Compute MJD at local noon before the evening of this
-                            # observation.
                             self["night"] = Column(
-                                data=np.array(
-                                    (Time(self["date-obs"]) + shift).to_value("mjd"),
-                                    dtype=int,
+                                data=_night(
+                                    self["date-obs"],
+                                    self.observatory.earth_location.lon.value,
                                 ),
                                 name="night",
                             )
@@ -655,13 +798,117 @@ class PhotometryData(BaseEnhancedTable):
                 self._passband_map = passband_map.model_copy()
                 self._update_passbands()
 
-    @lazyproperty
+    def _cached(self, name, colnames, compute):
+        """
+        Return ``compute()``, which depends only on the columns ``colnames``,
+        computing it again only if one of those columns has been replaced
+        since the last time.
+        """
+        # Replacing a column, or adding or removing rows, makes new column
+        # objects, so holding on to the columns the value was computed from
+        # tells whether it is still valid. Sorting, reversing and assigning
+        # to the table change the values inside the same column objects, so
+        # they clear the caches instead; see _clear_column_caches. Changing
+        # the values of a column directly, e.g. ``table["ra"][0] = 1``, is
+        # not detected.
+        columns = [self.columns[colname] for colname in colnames]
+        caches = self.__dict__.setdefault("_column_caches", {})
+        if name in caches:
+            cached_columns, value = caches[name]
+            if all(
+                cached is column
+                for cached, column in zip(cached_columns, columns, strict=True)
+            ):
+                return value
+        value = compute()
+        caches[name] = (columns, value)
+        return value
+
+    def _clear_column_caches(self):
+        """
+        Forget every value computed by `_cached`.
+        """
+        self.__dict__.pop("_column_caches", None)
+
+    def __setitem__(self, item, value):
+        self._clear_column_caches()
+        super().__setitem__(item, value)
+
+    def add_column(self, *args, **kwargs):
+        self._clear_column_caches()
+        super().add_column(*args, **kwargs)
+
+    def replace_column(self, *args, **kwargs):
+        self._clear_column_caches()
+        super().replace_column(*args, **kwargs)
+
+    def sort(self, *args, **kwargs):
+        self._clear_column_caches()
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self._clear_column_caches()
+        super().reverse()
+
+    @property
     def coord(self):
         """
         Return the coordinates of the stars in the table as a `SkyCoord` object.
         This is computed from the 'ra' and 'dec' columns in the table.
         """
-        return SkyCoord(ra=self["ra"], dec=self["dec"])
+        return self._cached(
+            "coord", ["ra", "dec"], lambda: SkyCoord(ra=self["ra"], dec=self["dec"])
+        )
+
+    @property
+    def _star_index(self):
+        """
+        The rows of each star in each passband.
+
+        Returns
+        -------
+
+        order : `numpy.ndarray`
+            Indexes of the rows sorted by star_id, then passband, and then
+            by their order in the table.
+
+        starts : `numpy.ndarray`
+            The rows of group ``i`` are ``order[starts[i]:starts[i + 1]]``.
+
+        star_ids, passbands : `numpy.ndarray`
+            The star_id and passband of each group, sorted by star_id and then
+            passband.
+        """
+
+        def make_index():
+            star_id = np.asarray(self["star_id"])
+            passband = np.asarray(self["passband"])
+            order = np.lexsort((passband, star_id))
+            sorted_star_id = star_id[order]
+            sorted_passband = passband[order]
+            new_group = np.ones(len(order), dtype=bool)
+            new_group[1:] = (sorted_star_id[1:] != sorted_star_id[:-1]) | (
+                sorted_passband[1:] != sorted_passband[:-1]
+            )
+            first = np.flatnonzero(new_group)
+            starts = np.append(first, len(order))
+            return order, starts, sorted_star_id[first], sorted_passband[first]
+
+        return self._cached("star_index", ["star_id", "passband"], make_index)
+
+    def _groups_for(self, star_id):
+        """
+        The groups of the star index that belong to ``star_id``, one for each
+        passband.
+        """
+        _, _, star_ids, _ = self._star_index
+        groups = np.arange(
+            np.searchsorted(star_ids, star_id, side="left"),
+            np.searchsorted(star_ids, star_id, side="right"),
+        )
+        # numpy converts star_id to the type of the column for the search, so
+        # e.g. "1" would be found among integer ids, which it does not match.
+        return groups[star_ids[groups] == star_id]
 
     @property
     def mag_inst(self):
@@ -697,7 +944,8 @@ class PhotometryData(BaseEnhancedTable):
             the table metadata.
 
         bjd_coordinates: `astropy.coordinates.SkyCoord`, optional (Default: None)
-            The coordinates to use for computing the BJD. If None, the RA and Dec
+            The coordinates to use for computing the BJD, either one position
+            for all rows or one for each row. If None, the RA and Dec
             columns in the table will be used.
         """
         if observatory is None:
@@ -732,7 +980,8 @@ class PhotometryData(BaseEnhancedTable):
             times_tdb = times.tdb
             times_tdb.format = "jd"  # Switch to JD format
 
-            # Compute light travel time corrections
+            # Compute light travel time corrections. Every star in an image has
+            # the same time, so the ephemeris is only evaluated once per image.
             if bjd_coordinates is None:
                 sky_coords = SkyCoord(
                     ra=self["ra"][valid_coordinates],
@@ -742,9 +991,7 @@ class PhotometryData(BaseEnhancedTable):
             else:
                 sky_coords = bjd_coordinates
 
-            ltt_bary = times.light_travel_time(
-                sky_coords, location=observatory.earth_location
-            )
+            ltt_bary = _light_travel_time(times, sky_coords, observatory.earth_location)
             time_barycenter = times_tdb + ltt_bary
 
             # BJD at midpoint of exposure at each location
@@ -761,6 +1008,43 @@ class PhotometryData(BaseEnhancedTable):
 
         self["bjd"] = Time(bjd, format="jd", scale="tdb")
 
+    def _star_id_for(self, target):
+        """
+        The star_id of the target of `lightcurve_for`.
+        """
+        # This will get set if we need to find the star_id from the coordinates
+        coordinates = None
+
+        if isinstance(target, str):
+            # If the target is a string, it could be a star_id or a name that can be
+            # resolved to coordinates.
+
+            # Try star_id first, since that doesn't require a network call
+            if len(self._groups_for(target)):
+                star_id = target
+            else:
+                coordinates = SkyCoord.from_name(target)
+        elif isinstance(target, SkyCoord):
+            # A single position can be given as an array with one element
+            coordinates = target.reshape(()) if target.size == 1 else target
+        else:
+            star_id = target
+
+        if coordinates is not None:
+            # Find the star_id for the closest coordinate match. The search tree
+            # for the match is kept with the coordinates, so it is only built
+            # once.
+            idx, d2d, _ = coordinates.match_to_catalog_sky(self.coord)
+            star_id = self["star_id"][idx]
+            if d2d > 1 * u.arcsec:
+                raise ValueError(
+                    f"No matching star in the photometry data found at {coordinates}."
+                )
+
+        if not len(self._groups_for(star_id)):
+            raise ValueError(f"No star found that matched {target}.")
+        return star_id
+
     def lightcurve_for(self, target, flux_column="mag_inst", passband=None):
         """
         Return the light curve for a single star as a `lightkurve.LightCurve` object.
@@ -788,72 +1072,86 @@ class PhotometryData(BaseEnhancedTable):
             ``flux_err``.
         """
 
-        # This will get set if we need to find the star_id from the coordinates
-        coordinates = None
-
-        if isinstance(target, str):
-            # If the target is a string, it could be a star_id or a name that can be
-            # resolved to coordinates.
-
-            # Try star_id first, since that doesn't require a network call
-            if target in self["star_id"]:
-                star_id = target
-            else:
-                coordinates = SkyCoord.from_name(target)
-        elif isinstance(target, SkyCoord):
-            coordinates = target
-        else:
-            star_id = target
-
-        if coordinates is not None:
-            # Find the star_id for the closest coordinate match
-            my_coordinates = SkyCoord(self["ra"], self["dec"])
-            idx, d2d, _ = coordinates.match_to_catalog_sky(my_coordinates)
-            star_id = self["star_id"][idx]
-            if d2d > 1 * u.arcsec:
-                raise ValueError(
-                    f"No matching star in the photometry data found at {coordinates}."
-                )
-
-        if star_id not in self["star_id"]:
-            raise ValueError(f"No star found that matched {target}.")
+        star_id = self._star_id_for(target)
 
-        star_data = self[self["star_id"] == star_id]
+        order, starts, _, passbands = self._star_index
+        groups = self._groups_for(star_id)
+        star_passbands = passbands[groups]
 
-        passbands = set(star_data["passband"])
-
-        passband_strings = ", ".join(sorted(passbands))
-        if len(passbands) > 1 and passband is None:
+        passband_strings = ", ".join(star_passbands)
+        if len(star_passbands) > 1 and passband is None:
             raise ValueError(
                 f"Multiple passbands found for this star: {passband_strings}. "
                 f"You must specify a passband."
             )
 
         if passband is not None:
-            if passband not in passbands:
+            if passband not in star_passbands:
                 raise ValueError(
                     f"Passband {passband} not found for this star. "
                     f"Passbands in the data are {passband_strings}."
                 )
-            star_data = star_data[star_data["passband"] == passband]
+            groups = groups[star_passbands == passband]
 
-        # Create the columns that light curve needs, adding metadata about where each
-        # column came from.
-        star_data["time"] = star_data["bjd"]
-        star_data.meta["time"] = "BJD at midpoint of exposure, column bjd"
+        group = groups[0]
+        star_data = self[order[starts[group] : starts[group + 1]]]
+        return lk.LightCurve(_light_curve_table(star_data, flux_column))
 
-        star_data["flux"] = star_data[flux_column]
-        star_data.meta["flux"] = "Instrumental magnitude, column mag_inst"
+    def lightcurves(self, flux_column="mag_inst", passband=None):
+        """
+        Return the light curves of all of the stars as `lightkurve.LightCurve`
+        objects.
 
-        # Why value? Because the instrumental magnitude error is fubar,
-        # see #463
-        flux_error_col = (
-            "mag_error" if flux_column == "mag_inst" else flux_column + "_error"
-        )
-        star_data["flux_err"] = star_data[flux_error_col].value
-        star_data.meta["flux_err"] = "Error in instrumental magnitude, column mag_error"
+        This is much faster than calling `lightcurve_for` for each star.
+
+        Parameters
+        ----------
+        flux_column : str, optional
+            The name of the column to use as the flux. Default is 'mag_inst'. This need
+            not actually be a flux.
 
-        return lk.LightCurve(star_data)
+        passband : str, optional
+            The passband to use to generate the lightcurves for. This is only
+            needed if there is more that one passband in the data.
+
+        Returns
+        -------
+        dict
+            The light curve of each star, keyed by star_id. Each light curve is
+            the same as the one `lightcurve_for` returns for that star.
+        """
+        order, starts, star_ids, passbands = self._star_index
+        passband_strings = ", ".join(sorted(set(passbands)))
+        if passband is None:
+            if len(set(passbands)) > 1:
+                raise ValueError(
+                    f"Multiple passbands found: {passband_strings}. "
+                    f"You must specify a passband."
+                )
+            groups = np.arange(len(star_ids))
+        else:
+            groups = np.flatnonzero(passbands == passband)
+            if not len(groups):
+                raise ValueError(
+                    f"Passband {passband} not found. "
+                    f"Passbands in the data are {passband_strings}."
+                )
+
+        # Sort the rows by star once, so that each light curve is a slice
+        rows = np.concatenate(
+            [order[starts[group] : starts[group + 1]] for group in groups]
+        )
+        all_stars = _light_curve_table(self[rows], flux_column)
+        ends = np.cumsum(starts[groups + 1] - starts[groups])
+        return {
+            star_id: lk.LightCurve(all_stars[end - n_rows : end])
+            for star_id, end, n_rows in zip(
+                star_ids[groups].tolist(),
+                ends,
+                starts[groups + 1] - starts[groups],
+                strict=True,
+            )
+        }
 
     def write_aavso_extended(self, path, **kwargs):
         """Write this photometry table in the AAVSO Extended File Format.
@@ -904,6 +1202,10 @@ class CatalogData(BaseEnhancedTable):
         If True, the catalog data does not contain error information, so a
         column of NaNs will be added for the error values.
 
+    copy: bool, optional (Default: True)
+        If ``False``, the columns of `input_data` are used without being
+        copied. See `~stellarphot.BaseEnhancedTable` for details.
+
     Attributes
     ----------
     catalog_name: str
@@ -989,7 +1291,9 @@ class CatalogData(BaseEnhancedTable):
                     # user has opted in to making a column of NaNs
                     no_catalog_error
                 ):
-                    input_data_copy = input_data.copy()
+                    # BaseEnhancedTable copies the data if needed, so only a new
+                    # table is needed here to hold the new column.
+                    input_data_copy = input_data.copy(copy_data=False)
                     # Make the error column of NaNs
                     input_data_copy["mag_error"] = np.full(len(input_data), np.nan)
                 else:
@@ -1467,6 +1771,10 @@ class SourceListData(BaseEnhancedTable):
         names as values.  This is used to automatically update the column
         names to the desired names BEFORE the validation is performed.
 
+    copy: bool, optional (Default: True)
+        If ``False``, the columns of `input_data` are used without being
+        copied. See `~stellarphot.BaseEnhancedTable` for details.
+
     Attributes
     ----------
     has_ra_dec: bool
@@ -1522,9 +1830,9 @@ class SourceListData(BaseEnhancedTable):
         "ycenter": u.pix,
     }
 
-    def __init__(self, *args, input_data=None, colname_map=None, **kwargs):
+    def __init__(self, *args, input_data=None, colname_map=None, copy=True, **kwargs):
         if input_data is None:
-            super().__init__(*args, **kwargs)
+            super().__init__(*args, copy=copy, **kwargs)
         else:
             # Check data before copying to avoid recursive loop and non-QTable
             # data input.
@@ -1537,7 +1845,7 @@ class SourceListData(BaseEnhancedTable):
                 )
 
             # Process inputs and save as needed
-            data = input_data.copy()
+            data = input_data.copy(copy_data=copy)
 
             # Rename columns before checking for ra/dec or xcenter/ycenter
             # columns being missing.
@@ -1595,10 +1903,13 @@ class SourceListData(BaseEnhancedTable):
                     )
 
             # Convert input data to QTable (while also checking for required columns)
+            # data is already a copy (if one is needed), so there is no need
+            # to copy it again.
             super().__init__(
                 table_description=self.sourcelist_descript,
                 input_data=data,
                 colname_map=None,
+                copy=False,
                 **kwargs,
             )
             self.meta["has_ra_dec"] = ra_dec_present
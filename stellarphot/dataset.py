@@ -0,0 +1,329 @@
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import numpy as np
+from astropy.table import vstack
+
+from .core import PhotometryData
+
+__all__ = ["PhotometryDataset"]
+
+
+def _as_set(value):
+    """
+    ``None`` for no value, otherwise the value(s) as a set.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str) or not hasattr(value, "__iter__"):
+        return {value}
+    return set(value)
+
+
+class PhotometryDataset:
+    """
+    Photometry stored on disk in Parquet files, partitioned by night and
+    passband, that can be added to one set of nights at a time and read in
+    part.
+
+    Each night and passband is a directory, e.g.
+    ``night=60000/passband=V``, that holds one or more Parquet files, each of
+    them a complete `~stellarphot.PhotometryData`. Reading the photometry
+    of some nights or passbands only opens the files in those directories,
+    and only the requested stars and columns are read from them. Writing to
+    and reading from the dataset requires ``pyarrow``.
+
+    Parameters
+    ----------
+
+    path : str or Path
+        Directory of the dataset. It is created when photometry is first
+        added to it.
+
+    Examples
+    --------
+
+    Add each new night of photometry to the dataset as it is done, then
+    read the light curve of one star in one passband::
+
+        dataset = PhotometryDataset("wasp-10-photometry")
+        dataset.append(photometry)
+        light_curve = dataset.lightcurve_for(3, passband="SR")
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if self.path.exists() and not self.path.is_dir():
+            raise ValueError(f"path '{path}' exists and is not a directory.")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}('{self.path}')"
+
+    def _partitions(self, night=None, passband=None):
+        """
+        The night, passband and directory of each partition, in order of night
+        and passband, optionally limited to some nights and passbands.
+        """
+        nights = _as_set(night)
+        passbands = _as_set(passband)
+        night_dirs = {
+            int(night_dir.name.removeprefix("night=")): night_dir
+            for night_dir in self.path.glob("night=*")
+            if night_dir.is_dir()
+        }
+        for this_night in sorted(night_dirs):
+            if nights is not None and this_night not in nights:
+                continue
+            passband_dirs = {
+                unquote(passband_dir.name.removeprefix("passband=")): passband_dir
+                for passband_dir in night_dirs[this_night].glob("passband=*")
+                if passband_dir.is_dir()
+            }
+            for this_passband in sorted(passband_dirs):
+                if passbands is not None and this_passband not in passbands:
+                    continue
+                yield this_night, this_passband, passband_dirs[this_passband]
+
+    def _partition_dir(self, night, passband):
+        # Passbands are names chosen by the user, so make sure they are safe
+        # to use in a path.
+        return self.path / f"night={night}" / f"passband={quote(passband, safe='')}"
+
+    @property
+    def nights(self):
+        """
+        The nights in the dataset.
+        """
+        return sorted({night for night, _, _ in self._partitions()})
+
+    @property
+    def passbands(self):
+        """
+        The passbands in the dataset.
+        """
+        return sorted({passband for _, passband, _ in self._partitions()})
+
+    def _files(self, night=None, passband=None):
+        for _, _, partition_dir in self._partitions(night=night, passband=passband):
+            yield from sorted(partition_dir.glob("*.parquet"))
+
+    def _check_matches_dataset(self, photometry):
+        """
+        Raise an error if the camera or observatory of the photometry is not the
+        same as that of the photometry already in the dataset.
+        """
+        first_file = next(self._files(), None)
+        if first_file is None:
+            return
+        existing = PhotometryData.read(first_file, schema_only=True)
+        for attribute in ["camera", "observatory"]:
+            if getattr(existing, attribute) != getattr(photometry, attribute):
+                raise ValueError(
+                    f"The {attribute} of the photometry does not match the "
+                    f"{attribute} of the photometry in the dataset {self.path}."
+                )
+
+    def _check_not_in_dataset(self, partition_dir, photometry):
+        """
+        Raise an error if any star already has photometry in the partition at
+        one of the times in the photometry.
+        """
+        files = sorted(partition_dir.glob("*.parquet"))
+        if not files:
+            return
+        times = photometry["date-obs"].jd
+        keys = set(zip(times.tolist(), photometry["star_id"].tolist(), strict=True))
+        for file_path in files:
+            existing = PhotometryData.read(
+                file_path, include_names=["date-obs", "star_id"]
+            )
+            # Only rows at one of the times can be the same as a new row
+            existing_times = existing["date-obs"].jd
+            same_time = np.isin(existing_times, times)
+            existing_keys = zip(
+                existing_times[same_time].tolist(),
+                existing["star_id"][same_time].tolist(),
+                strict=True,
+            )
+            if not keys.isdisjoint(existing_keys):
+                raise ValueError(
+                    "Some of the photometry is already in the dataset "
+                    f"{self.path}: a star has photometry at the same time in "
+                    f"{file_path.relative_to(self.path)}."
+                )
+
+    def append(self, photometry):
+        """
+        Add photometry to the dataset.
+
+        The photometry is written to new files, one for each night and
+        passband in it; nothing already in the dataset is changed. Photometry
+        of a star at a time for which the dataset already has photometry of
+        that star is not added, so adding the same photometry twice raises an
+        error instead of duplicating it.
+
+        Parameters
+        ----------
+
+        photometry : `stellarphot.PhotometryData`
+            The photometry to add. Its camera and observatory must match those
+            of the photometry already in the dataset.
+
+        Returns
+        -------
+
+        list of Path
+            The files that were written.
+
+        Raises
+        ------
+
+        ValueError
+            If the camera or observatory do not match, or some of the
+            photometry is already in the dataset. Nothing is written then.
+        """
+        if not isinstance(photometry, PhotometryData):
+            raise TypeError(
+                "photometry must be a stellarphot.PhotometryData, not "
+                f"{type(photometry)}."
+            )
+        self._check_matches_dataset(photometry)
+
+        by_partition = photometry.group_by(["night", "passband"])
+        partitions = [
+            (self._partition_dir(key["night"], str(key["passband"])), partition)
+            for key, partition in zip(
+                by_partition.groups.keys, by_partition.groups, strict=True
+            )
+        ]
+        # Check all of the partitions before writing any of them
+        for partition_dir, partition in partitions:
+            self._check_not_in_dataset(partition_dir, partition)
+
+        written = []
+        for partition_dir, partition in partitions:
+            partition_dir.mkdir(parents=True, exist_ok=True)
+            part = len(list(partition_dir.glob("*.parquet")))
+            file_path = partition_dir / f"part-{part:05d}.parquet"
+            partition.write(file_path)
+            written.append(file_path)
+        return written
+
+    def iter_partitions(self, night=None, passband=None, star_id=None, columns=None):
+        """
+        Read the photometry one night and passband at a time.
+
+        Parameters
+        ----------
+
+        night : int or list of int, optional
+            Read only these nights.
+
+        passband : str or list of str, optional
+            Read only these passbands.
+
+        star_id : int, str or list, optional
+            Read only the rows for these stars.
+
+        columns : list of str, optional
+            Read only these columns.
+
+        Yields
+        ------
+
+        `stellarphot.PhotometryData`
+            The photometry of each night and passband, in order of night and
+            then passband.
+        """
+        filters = None
+        if star_id is not None:
+            filters = [("star_id", "in", list(_as_set(star_id)))]
+        for _, _, partition_dir in self._partitions(night=night, passband=passband):
+            tables = [
+                PhotometryData.read(file_path, include_names=columns, filters=filters)
+                for file_path in sorted(partition_dir.glob("*.parquet"))
+            ]
+            if tables:
+                yield tables[0] if len(tables) == 1 else vstack(tables)
+
+    def read(self, night=None, passband=None, star_id=None, columns=None):
+        """
+        Read photometry from the dataset.
+
+        Only the files for the requested nights and passbands are opened,
+        and only the requested stars and columns are read from them.
+
+        Parameters
+        ----------
+
+        night : int or list of int, optional
+            Read only these nights.
+
+        passband : str or list of str, optional
+            Read only these passbands.
+
+        star_id : int, str or list, optional
+            Read only the rows for these stars.
+
+        columns : list of str, optional
+            Read only these columns.
+
+        Returns
+        -------
+
+        `stellarphot.PhotometryData`
+            The photometry, in order of night and then passband. If nothing in
+            the dataset matches, the table is empty.
+        """
+        tables = list(
+            self.iter_partitions(
+                night=night, passband=passband, star_id=star_id, columns=columns
+            )
+        )
+        if not tables:
+            return PhotometryData()
+        return tables[0] if len(tables) == 1 else vstack(tables)
+
+    def lightcurve_for(self, target, flux_column="mag_inst", passband=None, night=None):
+        """
+        Return the light curve for a single star as a `lightkurve.LightCurve`
+        object, reading only that star's photometry from the dataset.
+
+        Parameters
+        ----------
+
+        target : str, int, or `astropy.coordinates.SkyCoord`
+            The target star. This can be a star_id, a SkyCoord object, or a name
+            that can be resolved by `astropy.coordinates.SkyCoord.from_name`.
+
+        flux_column : str, optional
+            The name of the column to use as the flux. Default is 'mag_inst'.
+            This need not actually be a flux.
+
+        passband : str, optional
+            The passband to use to generate the lightcurve for. This is only
+            needed if there is more that one passband in the data.
+
+        night : int or list of int, optional
+            Use only these nights.
+
+        Returns
+        -------
+
+        `lightkurve.LightCurve`
+            The light curve for the star; see
+            `stellarphot.PhotometryData.lightcurve_for`.
+        """
+        # Only the ids and positions of the stars are needed to find the target
+        positions = self.read(
+            night=night,
+            passband=passband,
+            columns=["star_id", "passband", "ra", "dec"],
+        )
+        if not len(positions):
+            raise ValueError(f"No photometry in the dataset {self.path} matched.")
+        star_id = positions._star_id_for(target)
+        star_data = self.read(night=night, passband=passband, star_id=star_id)
+        return star_data.lightcurve_for(
+            star_id, flux_column=flux_column, passband=passband
+        )
@@ -1,10 +1,14 @@
 import astropy.units as u
 import numpy as np
 from astropy.coordinates import SkyCoord
-from astropy.table import QTable, Table
-from astropy.time import Time
+from astropy.table import vstack
 
-from stellarphot import PhotometryData, SourceListData
+from stellarphot import (
+    FluxMatrix,
+    PhotometryData,
+    PhotometryDataset,
+    SourceListData,
+)
 
 __all__ = ["add_in_quadrature", "calc_aij_relative_flux", "add_relative_flux_column"]
 
@@ -19,10 +23,12 @@ def add_in_quadrature(array):
 def calc_aij_relative_flux(
     star_data,
     comp_stars,
-    in_place=True,
+    in_place=None,
     coord_column=None,
     star_id_column="star_id",
     counts_column_name="aperture_net_cnts",
+    night=None,
+    passband=None,
 ):
     """
     Calculate AstroImageJ-style flux ratios.
@@ -30,8 +36,10 @@ def calc_aij_relative_flux(
     Parameters
     ----------
 
-    star_data : 'stellarphot.PhotometryData'
-        Photometry data from one or more images.
+    star_data : 'stellarphot.PhotometryData' or 'stellarphot.PhotometryDataset'
+        Photometry data from one or more images. The photometry in a dataset
+        is read and processed one night and passband at a time, so the
+        comparison stars are checked separately for each night and passband.
 
     comp_stars : '~astropy.table.Table'
         Table of comparison stars in the field. Must contain a column
@@ -46,7 +54,10 @@ def calc_aij_relative_flux(
 
     in_place : bool,  optional
         If ``True``, add new columns to input table. Otherwise, return
-        new table with those columns added.
+        new table with those columns added. The default is ``True`` if
+        `star_data` is a table. A dataset cannot be changed in place, so
+        ``in_place=True`` raises a ``ValueError`` if `star_data` is a
+        dataset.
 
     coord_column : str,  optional
         If provided, use this column to match comparison stars to coordinates.
@@ -59,14 +70,66 @@ def calc_aij_relative_flux(
         Name of the column that provides a unique identifier for each
         comparison star.
 
+    night : int or list of int, optional
+        Use only these nights of a dataset. Can only be used if `star_data`
+        is a dataset.
+
+    passband : str or list of str, optional
+        Use only these passbands of a dataset. Can only be used if
+        `star_data` is a dataset.
+
     Returns
     -------
 
-    `stellarphot.PhotometryData` or None
-        The return type depends on the value of ``in_place``. If it is
-        ``False``, then the new columns are returned as a separate table,
-        otherwise the columns are simply added to the input table.
+    `stellarphot.PhotometryData`
+        The input table with the new columns added. If ``in_place`` is
+        ``False`` this is a copy of the input table; otherwise it is the
+        input table itself. If `star_data` is a dataset, this is a new table
+        with the photometry of the selected nights and passbands, one after
+        the other. Each night and passband is then calculated on its own:
+        a comparison star is excluded only from the nights and passbands in
+        which it is missing, has ``NaN`` counts or a mismatched position, and
+        the comparison sets of different nights and passbands may differ.
+
+    Raises
+    ------
+
+    ValueError
+        If `star_data` is a dataset and ``in_place`` is ``True`` or there is
+        no photometry for the selected nights and passbands, or if
+        `star_data` is a table and ``night`` or ``passband`` is given.
     """
+    if isinstance(star_data, PhotometryDataset):
+        if in_place:
+            raise ValueError(
+                "The relative flux cannot be added to a dataset in place; "
+                "use in_place=False to get a new table."
+            )
+        results = [
+            calc_aij_relative_flux(
+                partition,
+                comp_stars,
+                coord_column=coord_column,
+                star_id_column=star_id_column,
+                counts_column_name=counts_column_name,
+            )
+            for partition in star_data.iter_partitions(night=night, passband=passband)
+        ]
+        if not results:
+            raise ValueError(
+                "There is no photometry in the dataset for the selected "
+                "nights and passbands."
+            )
+        return vstack(results)
+
+    if night is not None or passband is not None:
+        raise ValueError(
+            "night and passband can only be used when star_data is a "
+            "PhotometryDataset."
+        )
+
+    if in_place is None:
+        in_place = True
 
     # Match comparison star list to instrumental magnitude information
     if star_data["ra"].unit is None:
@@ -104,40 +167,25 @@ def calc_aij_relative_flux(
             "comparison star coordinates are correct."
         )
 
-    check_for_bad = Table(
-        data=[star_data[star_id_column].data, good], names=["star_id", "good"]
-    )
-    check_for_bad = check_for_bad.group_by("star_id")
-    is_all_good = check_for_bad.groups.aggregate(np.all)
-
-    bad_comps = set(is_all_good["star_id"][~is_all_good["good"]])
-
-    # Check for comps that are only in some of the images
-    # Make a small table with just star IDs and date-obs
-    check_for_missing = Table(
-        data=[star_data[star_id_column], star_data["date-obs"]],
-        names=["star_id", "date-obs"],
-    ).group_by("date-obs")
-    star_id_sets = check_for_missing.groups.aggregate(set)["star_id"]
-    good_ids = set.intersection(*star_id_sets)
-    bad_comps_missing = set(is_all_good["star_id"]) - good_ids
-    bad_comps = bad_comps | bad_comps_missing
-
-    # Check whether any of the comp stars have NaN values and,
-    # if they do, exclude them from the comp set.
-    check_for_nan = Table(
-        data=[star_data[star_id_column].data, star_data[counts_column_name].data],
-        names=["star_id", "net_counts"],
+    # Arrange the photometry with one row for each time and one column for
+    # each star, so that the comparison stars can be checked and their counts
+    # summed at each time without grouping the table.
+    matrix = FluxMatrix(star_data, star_id_column=star_id_column)
+    good_matrix = np.zeros(matrix.shape, dtype=bool)
+    good_matrix[matrix.time_index, matrix.star_index] = good
+    present = matrix.present
+    counts = matrix[counts_column_name]
+
+    # A comparison star must match in every image in which it was measured,
+    # must be in all of the images and must not have NaN counts in any of
+    # them.
+    comp_stars_ok = (
+        np.all(good_matrix | ~present, axis=0)
+        & np.all(present, axis=0)
+        & ~np.any(np.isnan(counts) & present, axis=0)
     )
-    check_for_nan = check_for_nan.group_by("star_id")
-    check_for_nan["good"] = ~np.isnan(check_for_nan["net_counts"])
-    is_all_good = check_for_nan.groups.aggregate(np.all)
-
-    bad_comps = bad_comps | set(is_all_good["star_id"][~is_all_good["good"]])
-
-    for comp in bad_comps:
-        this_comp = star_data[star_id_column] == comp
-        good[this_comp] = False
+    comp_matrix = good_matrix & comp_stars_ok
+    good = matrix.to_rows(comp_matrix)
 
     # Every time in the input data must have at least one comparison star;
     # otherwise the comparison counts at the times with no comparison stars
@@ -145,9 +193,7 @@ def calc_aij_relative_flux(
     # any one time is excluded as a comparison star at every time, so this
     # also catches the case in which every comparison star has been
     # excluded.
-    star_times = np.asarray(star_data["date-obs"].value)
-    times_with_comps = set(star_times[good])
-    if set(star_times) - times_with_comps:
+    if not np.all(np.any(comp_matrix, axis=1)):
         raise RuntimeError(
             "There are one or more times in the photometry data at which "
             "none of the comparison stars has valid data, so relative flux "
@@ -157,36 +203,23 @@ def calc_aij_relative_flux(
         )
 
     error_column_name = "noise_electrons"
-    # Calculate comp star counts for each time
-
-    # Make a small table with just counts, errors and time for all of the comparison
-    # stars.
-
-    comp_fluxes = star_data["date-obs", counts_column_name, error_column_name][good]
-    # Convert comp_fluxes to a regular Table, not a QTable, to work around
-    # https://github.com/astropy/astropy/issues/10944
-    # in which it was reported that QTable columns with units cannot be aggregated.
-
-    comp_fluxes = Table(comp_fluxes)
-
-    # Check whether any of the columns are masked, but with no masked values,
-    # and convert to regular column...eventually
-
-    comp_fluxes = comp_fluxes.group_by("date-obs")
-    comp_totals = comp_fluxes.groups.aggregate(np.sum)[counts_column_name]
-    # Count the comparison stars in each image by counting the rows in each
-    # group. Counting nonzero fluxes would be wrong here -- exactly zero net
-    # counts is a legitimate measured value (net counts can even be negative
-    # after sky subtraction) and must not be mistaken for a missing star.
-    comp_num_stars = np.diff(comp_fluxes.groups.indices)
-    comp_errors = comp_fluxes.groups.aggregate(add_in_quadrature)[error_column_name]
-
-    comp_total_vector = np.ones_like(star_data[counts_column_name])
-    comp_error_vector = np.ones_like(star_data[error_column_name])
 
+    # Calculate comp star counts and errors for each time. Counting the
+    # comparison stars, rather than nonzero fluxes, matters here -- exactly
+    # zero net counts is a legitimate measured value (net counts can even be
+    # negative after sky subtraction) and must not be mistaken for a missing
+    # star.
+    comp_num_stars = comp_matrix.sum(axis=1)
     if len(set(comp_num_stars)) > 1:
         raise RuntimeError("Different number of stars in comparison sets")
 
+    comp_totals = np.where(comp_matrix, counts, 0).sum(axis=1)
+    comp_errors = np.sqrt(
+        (np.where(comp_matrix, matrix[error_column_name], 0) ** 2).sum(axis=1)
+    )
+    comp_total_vector = comp_totals[matrix.time_index]
+    comp_error_vector = comp_errors[matrix.time_index]
+
     # Calculate relative flux for every star
 
     # Have to remove the flux of the star if the star is a comparison
@@ -197,17 +230,6 @@ def calc_aij_relative_flux(
     is_comp[good] = 1
     flux_offset = -star_data[counts_column_name] * is_comp
 
-    # Convert comp_fluxes back to a QTable and redo groups
-    comp_fluxes = QTable(comp_fluxes)
-    comp_fluxes = comp_fluxes.group_by("date-obs")
-    # This seems a little hacky; there must be a better way
-    for date_obs, comp_total, comp_error in zip(
-        comp_fluxes.groups.keys, comp_totals, comp_errors, strict=True
-    ):
-        this_time = star_data["date-obs"] == date_obs[0]
-        comp_total_vector[this_time] *= comp_total
-        comp_error_vector[this_time] = comp_error * comp_fluxes[error_column_name].unit
-
     # A comparison star is excluded from its own comparison ensemble: its
     # flux is removed from the comparison total (via flux_offset) and its
     # error is removed from the comparison error, so that the relative flux
@@ -296,18 +318,19 @@ def add_relative_flux_column(
     if "bjd" not in flux_group.colnames:
         if verbose:
             print("Adding BJD column to photometry data")
-        # Accumulate the BJD here
-        bjds = []
-
-        for group in flux_group.groups:
-            mean_ra = group["ra"].mean()
-            mean_dec = group["dec"].mean()
-            group.add_bjd_col(bjd_coordinates=SkyCoord(mean_ra, mean_dec))
-            bjds.extend(group["bjd"].jd)
-
-        # Each (ephemeral) group had a BJD, this adds the column to the
-        # original table.
-        flux_group["bjd"] = Time(bjds, scale="tdb", format="jd")
+        # The BJD of each image is computed for the mean position of the
+        # stars in it, all at once rather than one image at a time.
+        starts = flux_group.groups.indices[:-1]
+        n_rows = np.diff(flux_group.groups.indices)
+        mean_ra = np.add.reduceat(np.asarray(flux_group["ra"]), starts) / n_rows
+        mean_dec = np.add.reduceat(np.asarray(flux_group["dec"]), starts) / n_rows
+        flux_group.add_bjd_col(
+            bjd_coordinates=SkyCoord(
+                ra=np.repeat(mean_ra, n_rows),
+                dec=np.repeat(mean_dec, n_rows),
+                unit="degree",
+            )
+        )
 
     if verbose:
         print("Writing photometry data with relative flux columns")
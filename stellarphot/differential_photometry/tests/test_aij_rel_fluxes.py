@@ -7,7 +7,7 @@ from astropy.coordinates import SkyCoord
 from astropy.table import Table
 from astropy.time import Time
 
-from stellarphot import PhotometryData, SourceListData
+from stellarphot import PhotometryData, PhotometryDataset, SourceListData
 from stellarphot.differential_photometry.aij_rel_fluxes import (
     add_relative_flux_column,
     calc_aij_relative_flux,
@@ -130,6 +130,72 @@ def test_relative_flux_calculation(
         assert "relative_flux" not in input_table.colnames
 
 
+def test_relative_flux_calculation_from_dataset(tmp_path):
+    pytest.importorskip("pyarrow")
+    expected_flux, expected_error, input_table, comp_star = _raw_photometry_table()
+    input_table["passband"] = "V"
+    input_table["night"] = 60000
+    next_night = input_table.copy()
+    next_night["night"] = 60001
+    dataset = PhotometryDataset(tmp_path)
+    dataset.append(input_table)
+    dataset.append(next_night)
+
+    output_table = calc_aij_relative_flux(dataset, comp_star)
+
+    n_times = 2 * len(np.unique(input_table["date-obs"]))
+    assert len(output_table) == 2 * len(input_table)
+    np.testing.assert_allclose(
+        output_table["relative_flux"], _repeat(expected_flux, n_times)
+    )
+    np.testing.assert_allclose(
+        output_table["relative_flux_error"], _repeat(expected_error, n_times)
+    )
+
+
+def test_relative_flux_calculation_from_dataset_one_night(tmp_path):
+    pytest.importorskip("pyarrow")
+    expected_flux, expected_error, input_table, comp_star = _raw_photometry_table()
+    input_table["passband"] = "V"
+    input_table["night"] = 60000
+    next_night = input_table.copy()
+    next_night["night"] = 60001
+    # Make one of the comparison stars bad on the second night only; it
+    # should still be used on the first night.
+    next_night["aperture_net_cnts"][next_night["star_id"] == 2] = np.nan
+    dataset = PhotometryDataset(tmp_path)
+    dataset.append(input_table)
+    dataset.append(next_night)
+
+    output_table = calc_aij_relative_flux(
+        dataset, comp_star, in_place=False, night=60000, passband="V"
+    )
+
+    assert set(output_table["night"]) == {60000}
+    n_times = len(np.unique(input_table["date-obs"]))
+    np.testing.assert_allclose(
+        output_table["relative_flux"], _repeat(expected_flux, n_times)
+    )
+
+    with pytest.raises(ValueError, match="no photometry in the dataset"):
+        calc_aij_relative_flux(dataset, comp_star, passband="R")
+
+
+def test_relative_flux_calculation_from_dataset_in_place(tmp_path):
+    pytest.importorskip("pyarrow")
+    _, _, input_table, comp_star = _raw_photometry_table()
+    input_table["passband"] = "V"
+    input_table["night"] = 60000
+    dataset = PhotometryDataset(tmp_path)
+    dataset.append(input_table)
+
+    with pytest.raises(ValueError, match="cannot be added to a dataset in place"):
+        calc_aij_relative_flux(dataset, comp_star, in_place=True)
+
+    with pytest.raises(ValueError, match="can only be used when star_data"):
+        calc_aij_relative_flux(input_table, comp_star, night=60000)
+
+
 @pytest.mark.parametrize("bad_thing", ["RA", "NaN", "missing"])
 def test_bad_comp_star(bad_thing):
     expected_flux, expected_error, input_table, comp_star = _raw_photometry_table()
@@ -0,0 +1,156 @@
+import numpy as np
+from astropy.time import Time
+from astropy.units import Quantity
+
+__all__ = ["FluxMatrix"]
+
+
+class FluxMatrix:
+    """
+    Photometry arranged as two-dimensional arrays with one row for each time
+    and one column for each star.
+
+    The arrangement is worked out once, when the matrix is made, so that any
+    column of the photometry can then be had as an array of shape
+    ``(n_times, n_stars)`` without grouping the table. Cells for which there
+    is no photometry, i.e. stars that were not measured at some time, are
+    NaN.
+
+    Parameters
+    ----------
+
+    photometry : `stellarphot.PhotometryData`
+        The photometry. There can be at most one row for each star at each
+        time.
+
+    star_id_column : str, optional (Default: "star_id")
+        Name of the column that identifies the stars.
+
+    Attributes
+    ----------
+
+    photometry : `stellarphot.PhotometryData`
+        The photometry the matrix was made from.
+
+    times : `astropy.time.Time`
+        The times of the rows of the matrix, in order, taken from the
+        ``date-obs`` column of the photometry.
+
+    star_ids : `numpy.ndarray`
+        The star ids of the columns of the matrix, in order.
+
+    time_index, star_index : `numpy.ndarray`
+        For each row of the photometry, the row and column of the matrix
+        that it is in.
+
+    rows : `numpy.ndarray`
+        The row of the photometry in each cell of the matrix, or -1 for cells
+        without photometry.
+
+    Examples
+    --------
+
+    Find the stars whose net counts are NaN at any time::
+
+        matrix = FluxMatrix(photometry)
+        counts = matrix["aperture_net_cnts"]
+        nan_stars = matrix.star_ids[(np.isnan(counts) & matrix.present).any(axis=0)]
+    """
+
+    def __init__(self, photometry, star_id_column="star_id"):
+        self.photometry = photometry
+
+        date_obs = photometry["date-obs"]
+        if isinstance(date_obs, Time):
+            # Sorting on both parts of the Julian date keeps the full precision
+            # of the times.
+            keys = [date_obs.jd2, date_obs.jd1]
+        else:
+            keys = [np.asarray(date_obs)]
+        by_time = np.lexsort(keys)
+        new_time = np.zeros(len(by_time), dtype=bool)
+        new_time[:1] = True
+        for key in keys:
+            new_time[1:] |= key[by_time][1:] != key[by_time][:-1]
+        self.time_index = np.empty(len(by_time), dtype=int)
+        self.time_index[by_time] = np.cumsum(new_time) - 1
+        self.times = date_obs[by_time[new_time]]
+
+        self.star_ids, self.star_index = np.unique(
+            np.asarray(photometry[star_id_column]), return_inverse=True
+        )
+
+        self.rows = np.full(self.shape, -1)
+        self.rows[self.time_index, self.star_index] = np.arange(len(photometry))
+        if (self.rows >= 0).sum() < len(photometry):
+            raise ValueError(
+                "There is more than one row of photometry for at least one star "
+                "at one time, so the photometry cannot be arranged as a matrix."
+            )
+        self._arrays = {}
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} of {self.shape[0]} times and "
+            f"{self.shape[1]} stars>"
+        )
+
+    @property
+    def shape(self):
+        """
+        The number of times and the number of stars.
+        """
+        return len(self.times), len(self.star_ids)
+
+    @property
+    def present(self):
+        """
+        Boolean array that is ``True`` for the cells that have photometry.
+        """
+        return self.rows >= 0
+
+    def __getitem__(self, colname):
+        """
+        A column of the photometry as an array of shape ``(n_times, n_stars)``,
+        with NaN where there is no photometry. The array has the units of the
+        column, if it has any, and is made only once.
+        """
+        if colname not in self._arrays:
+            column = self.photometry[colname]
+            # Masked values are missing too
+            mask = np.broadcast_to(getattr(column, "mask", False), len(column))
+            values = getattr(column, "unmasked", column)
+            if isinstance(values, Quantity):
+                values = values.value
+            values = np.ma.getdata(values)
+            if not np.issubdtype(values.dtype, np.number) and values.dtype != bool:
+                raise TypeError(
+                    f"Column '{colname}' is not numeric, so it cannot be "
+                    "arranged as a matrix."
+                )
+            array = np.full(self.shape, np.nan, dtype=np.result_type(values, 1.0))
+            array[self.time_index[~mask], self.star_index[~mask]] = values[~mask]
+            if getattr(column, "unit", None) is not None:
+                array = Quantity(array, column.unit, copy=False)
+            self._arrays[colname] = array
+        return self._arrays[colname]
+
+    def to_rows(self, array):
+        """
+        The values of an array of shape ``(n_times, n_stars)`` at each row of
+        the photometry, for example to add a result computed from the matrix
+        to the photometry as a column.
+
+        Parameters
+        ----------
+
+        array : array-like
+            Array with a value for each time and star.
+
+        Returns
+        -------
+
+        array-like
+            The value for each row of the photometry.
+        """
+        return array[self.time_index, self.star_index]
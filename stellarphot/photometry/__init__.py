@@ -1,5 +1,12 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 
+from .background import *
+from .checkpoint import *
+from .header_index import *
+from .image_statistics import *
 from .photometry import *
 from .profiles import *
+from .registration import *
 from .source_detection import *
+from .stacking import *
+from .watcher import *
@@ -0,0 +1,312 @@
+import numpy as np
+from astropy.nddata import NDData
+from astropy.utils import lazyproperty
+from scipy.ndimage import median_filter
+
+from .stamps import clipped_statistics
+
+__all__ = ["BackgroundMesh"]
+
+
+def _box_centers(size, box_size):
+    """
+    Center of each box along one axis of an image; the last box may be
+    smaller than the others.
+    """
+    starts = np.arange(0, size, box_size)
+    stops = np.minimum(starts + box_size, size)
+    return (starts + stops - 1) / 2
+
+
+def _interpolation_weights(centers, coordinates):
+    """
+    Indexes of the two box centers on either side of each coordinate and the
+    weight of the second one for linear interpolation. Coordinates beyond the
+    first or last center get the value of that box.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    if len(centers) == 1:
+        index = np.zeros(coordinates.shape, dtype=int)
+        return index, index, np.zeros(coordinates.shape)
+    upper = np.clip(np.searchsorted(centers, coordinates), 1, len(centers) - 1)
+    lower = upper - 1
+    weight = (coordinates - centers[lower]) / (centers[upper] - centers[lower])
+    return lower, upper, np.clip(weight, 0, 1)
+
+
+def _fill_missing(mesh):
+    """
+    Replace the NaN in a mesh with the median of their neighbors, working
+    inwards from the boxes that have values.
+    """
+    mesh = mesh.copy()
+    while np.isnan(mesh).any():
+        padded = np.pad(mesh, 1, constant_values=np.nan)
+        neighbors = np.stack(
+            [
+                padded[dy : dy + mesh.shape[0], dx : dx + mesh.shape[1]]
+                for dy in range(3)
+                for dx in range(3)
+            ]
+        )
+        missing = np.isnan(mesh) & np.isfinite(neighbors).any(axis=0)
+        mesh[missing] = np.nanmedian(neighbors[:, missing], axis=0)
+    return mesh
+
+
+class BackgroundMesh:
+    """
+    Model of a sky background that varies across an image.
+
+    The image is divided into square boxes, and the sigma-clipped median and
+    standard deviation of a sample of the pixels in each box are calculated,
+    for all of the boxes at once. These make a coarse mesh that is smoothed with a
+    median filter, to remove boxes dominated by a bright star, and is
+    interpolated linearly between the centers of the boxes to find the
+    background at any position. The background at every pixel of the image is
+    only calculated if it is asked for, and only once.
+
+    Make one for each image and use it wherever the background is needed,
+    e.g. in `source_detection`, `compute_fwhm` and `fast_fwhm_from_image`,
+    instead of calculating statistics of the whole image each time.
+
+    Parameters
+    ----------
+
+    image : `numpy.ndarray` or `astropy.nddata.CCDData`
+        The image. Masked pixels, and pixels that are not finite, are ignored.
+
+    box_size : int, optional (default=64)
+        Size of the boxes, in pixels. The boxes should be larger than the
+        stars in the image but smaller than the scale on which the background
+        changes.
+
+    sigma : float, optional (default=3.0)
+        The number of standard deviations to use as the lower and upper
+        clipping limit for the pixels in each box.
+
+    iters : int, optional (default=5)
+        The maximum number of clipping iterations.
+
+    filter_size : int, optional (default=3)
+        Size, in boxes, of the median filter applied to the mesh. Use 1 to
+        not filter the mesh.
+
+    max_masked_fraction : float, optional (default=0.5)
+        Boxes with a larger fraction of masked or non-finite pixels than this
+        are left out of the mesh, and their values are filled in from the
+        neighboring boxes.
+
+    accuracy : float, optional (default=0.1)
+        The standard error of the background in each box that is acceptable,
+        as a fraction of the standard deviation of the pixels. Only as many
+        pixels of each box as are needed for this are used, spread evenly
+        over the box, which is much faster than using all of them. Use a
+        small value to use every pixel.
+
+    Attributes
+    ----------
+
+    shape : tuple of int
+        The shape of the image.
+
+    box_size : int
+        Size of the boxes, in pixels.
+
+    background_mesh, rms_mesh : `numpy.ndarray`
+        The background and its standard deviation in each box, after
+        filtering.
+
+    y_centers, x_centers : `numpy.ndarray`
+        Position of the center of each row and each column of boxes.
+
+    equivalent_area : float
+        The number of pixels whose mean has the same standard error as the
+        background in one box. In the noise of a measurement that uses this
+        background as its sky, it takes the place of the area of the annulus.
+        It leaves out the smoothing of the mesh, so it slightly overestimates
+        the error of the background.
+
+    Examples
+    --------
+
+    Find sources in an image whose background is not flat::
+
+        background = BackgroundMesh(ccd, box_size=64)
+        sources = source_detection(ccd, background=background)
+    """
+
+    def __init__(
+        self,
+        image,
+        box_size=64,
+        sigma=3.0,
+        iters=5,
+        filter_size=3,
+        max_masked_fraction=0.5,
+        accuracy=0.1,
+    ):
+        if isinstance(image, NDData):
+            data, mask = image.data, image.mask
+        else:
+            data, mask = np.ma.getdata(image), np.ma.getmask(image)
+        if mask is np.ma.nomask:
+            mask = None
+        if data.ndim != 2:
+            raise ValueError("The image must be two-dimensional.")
+        box_size = int(box_size)
+        if box_size < 1:
+            raise ValueError(f"box_size must be at least 1, not {box_size}.")
+
+        self.shape = data.shape
+        self.box_size = box_size
+        self.y_centers = _box_centers(data.shape[0], box_size)
+        self.x_centers = _box_centers(data.shape[1], box_size)
+        n_y, n_x = len(self.y_centers), len(self.x_centers)
+
+        # Only as many pixels of each box as are needed for the accuracy are
+        # used: every step-th pixel in each direction.
+        n_pixels = np.pi / 2 / accuracy**2
+        step = max(1, int(np.sqrt(box_size**2 / n_pixels)))
+        offsets = np.arange(0, box_size, step)
+        rows = (box_size * np.arange(n_y)[:, np.newaxis] + offsets).ravel()
+        columns = (box_size * np.arange(n_x)[:, np.newaxis] + offsets).ravel()
+        good_rows = rows < data.shape[0]
+        good_columns = columns < data.shape[1]
+        # The standard error of a median is sqrt(pi / 2) times that of a mean
+        self.equivalent_area = 2 / np.pi * len(offsets) ** 2
+
+        # Pad the sampled pixels with NaN to a whole number of boxes, then put
+        # the pixels of each box in a row so that the statistics of all of the
+        # boxes are calculated at once.
+        boxes = np.full((len(rows), len(columns)), np.nan)
+        in_image = np.ix_(good_rows, good_columns)
+        sampled = np.ix_(rows[good_rows], columns[good_columns])
+        boxes[in_image] = data[sampled]
+        if mask is not None:
+            boxes[in_image] = np.where(mask[sampled], np.nan, boxes[in_image])
+        boxes = (
+            boxes.reshape(n_y, len(offsets), n_x, len(offsets))
+            .swapaxes(1, 2)
+            .reshape(n_y * n_x, len(offsets) ** 2)
+        )
+        n_good = np.isfinite(boxes).sum(axis=1)
+        _, median, std = clipped_statistics(boxes, sigma=sigma, iters=iters)
+
+        # Only the pixels that are in the image count towards the fraction
+        # that is masked.
+        box_areas = np.outer(
+            good_rows.reshape(n_y, -1).sum(axis=1),
+            good_columns.reshape(n_x, -1).sum(axis=1),
+        ).ravel()
+        too_masked = n_good < (1 - max_masked_fraction) * box_areas
+        median[too_masked] = np.nan
+        std[too_masked] = np.nan
+        if too_masked.all():
+            raise ValueError(
+                "Every box has too many masked or non-finite pixels to estimate "
+                "the background."
+            )
+
+        self.background_mesh = _fill_missing(median.reshape(n_y, n_x))
+        self.rms_mesh = _fill_missing(std.reshape(n_y, n_x))
+        if filter_size > 1:
+            self.background_mesh = median_filter(
+                self.background_mesh, size=filter_size, mode="nearest"
+            )
+            self.rms_mesh = median_filter(
+                self.rms_mesh, size=filter_size, mode="nearest"
+            )
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} of {self.background_mesh.shape[0]} by "
+            f"{self.background_mesh.shape[1]} boxes of {self.box_size} pixels>"
+        )
+
+    @property
+    def median_background(self):
+        """
+        The median of the background over the image.
+        """
+        return np.median(self.background_mesh)
+
+    @property
+    def median_rms(self):
+        """
+        The median of the standard deviation of the background over the image.
+        """
+        return np.median(self.rms_mesh)
+
+    def _interpolate(self, mesh, x, y):
+        y_low, y_high, y_weight = _interpolation_weights(self.y_centers, y)
+        x_low, x_high, x_weight = _interpolation_weights(self.x_centers, x)
+        return (1 - y_weight) * (
+            (1 - x_weight) * mesh[y_low, x_low] + x_weight * mesh[y_low, x_high]
+        ) + y_weight * (
+            (1 - x_weight) * mesh[y_high, x_low] + x_weight * mesh[y_high, x_high]
+        )
+
+    def _interpolate_image(self, mesh):
+        # Interpolating along the rows of the mesh and then along the columns
+        # needs much less memory than interpolating each pixel.
+        x_low, x_high, x_weight = _interpolation_weights(
+            self.x_centers, np.arange(self.shape[1])
+        )
+        rows = (1 - x_weight) * mesh[:, x_low] + x_weight * mesh[:, x_high]
+        y_low, y_high, y_weight = _interpolation_weights(
+            self.y_centers, np.arange(self.shape[0])
+        )
+        y_weight = y_weight[:, np.newaxis]
+        return (1 - y_weight) * rows[y_low] + y_weight * rows[y_high]
+
+    def background_at(self, x, y):
+        """
+        The background at some positions in the image.
+
+        Parameters
+        ----------
+
+        x, y : float or array-like
+            The positions, in pixels.
+
+        Returns
+        -------
+
+        `numpy.ndarray`
+            The background at each position.
+        """
+        return self._interpolate(self.background_mesh, x, y)
+
+    def rms_at(self, x, y):
+        """
+        The standard deviation of the background at some positions in the
+        image.
+
+        Parameters
+        ----------
+
+        x, y : float or array-like
+            The positions, in pixels.
+
+        Returns
+        -------
+
+        `numpy.ndarray`
+            The standard deviation of the background at each position.
+        """
+        return self._interpolate(self.rms_mesh, x, y)
+
+    @lazyproperty
+    def background(self):
+        """
+        The background at every pixel of the image.
+        """
+        return self._interpolate_image(self.background_mesh)
+
+    @lazyproperty
+    def background_rms(self):
+        """
+        The standard deviation of the background at every pixel of the image.
+        """
+        return self._interpolate_image(self.rms_mesh)
@@ -0,0 +1,312 @@
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+from astropy.table import vstack
+
+from stellarphot import PhotometryData
+
+try:
+    import pyarrow
+    from pyarrow import parquet
+except ImportError:  # pragma: no cover
+    # pyarrow is an optional dependency (the ``parquet`` extra). Without it
+    # the results are stored as ECSV, which is much slower to read back.
+    pyarrow = None
+
+__all__ = ["PhotometryCheckpoint"]
+
+
+class PhotometryCheckpoint:
+    """
+    A store of the photometry of individual images that allows photometry on a
+    directory of images to be resumed.
+
+    The photometry of each image is written to the store as soon as it is done,
+    and a line is added to a manifest recording the image's path, size and
+    modification time. An image is considered done if it is in the manifest and
+    its size and modification time have not changed, so a run that stopped
+    partway through only needs to redo the images that were not finished, and a
+    directory that keeps getting new images only needs photometry on the new
+    ones.
+
+    Parameters
+    ----------
+
+    store_directory : str or Path
+        Directory in which the results and the manifest are stored. It is
+        created if it does not exist.
+
+    photometry_settings : `stellarphot.settings.PhotometrySettings`
+        The photometry settings for the run. The manifest records a hash of the
+        settings (and of the contents of the source list file); if that hash
+        does not match the one in an existing manifest, the stored results are
+        discarded because they were made with different settings.
+
+    Notes
+    -----
+    The logging settings are not part of the hash, since they do not affect
+    the photometry.
+
+    The manifest is a log with one JSON line per image that is only ever
+    appended to, so recording an image takes the same time however many
+    images are in the store. It is read, and rewritten with one line per
+    image, when the store is opened. The results are stored in the Parquet
+    format if ``pyarrow`` is installed and as ECSV otherwise.
+    """
+
+    manifest_name = "manifest.jsonl"
+
+    def __init__(self, store_directory, photometry_settings):
+        self.store_directory = Path(store_directory)
+        self.store_directory.mkdir(parents=True, exist_ok=True)
+        self.settings_hash = self.hash_settings(photometry_settings)
+        self._manifest_path = self.store_directory / self.manifest_name
+        self._frames = self._load_manifest()
+
+    @staticmethod
+    def hash_settings(photometry_settings):
+        """
+        Return a hash of the settings that affect the photometry.
+
+        Parameters
+        ----------
+
+        photometry_settings : `stellarphot.settings.PhotometrySettings`
+            The photometry settings.
+
+        Returns
+        -------
+
+        str
+            Hexadecimal hash of the settings and of the contents of the source
+            list file.
+        """
+        settings_hash = hashlib.sha256(
+            photometry_settings.model_dump_json(exclude={"logging_settings"}).encode()
+        )
+        source_list_file = photometry_settings.source_location_settings.source_list_file
+        try:
+            settings_hash.update(Path(source_list_file).read_bytes())
+        except OSError:
+            # If the source list cannot be read the photometry will fail anyway
+            pass
+        return settings_hash.hexdigest()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, path):
+        return self.is_done(path)
+
+    @staticmethod
+    def _key(path):
+        return str(Path(path).resolve())
+
+    @staticmethod
+    def _file_state(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_manifest(self):
+        try:
+            lines = self._manifest_path.read_text().splitlines()
+        except FileNotFoundError:
+            lines = []
+
+        frames = {}
+        if lines and json.loads(lines[0])["settings_hash"] == self.settings_hash:
+            # Later lines for an image replace earlier ones
+            for line in lines[1:]:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line is incomplete if a run was interrupted while
+                    # writing it; that image is simply done again.
+                    continue
+                frames[entry.pop("path")] = entry
+        elif lines:
+            # Results made with other settings cannot be reused, so remove them
+            for line in lines[1:]:
+                try:
+                    result = json.loads(line)["result"]
+                except json.JSONDecodeError:
+                    continue
+                if result is not None:
+                    (self.store_directory / result).unlink(missing_ok=True)
+
+        self._write_manifest(frames)
+        return frames
+
+    def _write_manifest(self, frames):
+        """
+        Write a manifest with one line for each of the frames.
+        """
+        lines = [json.dumps(dict(settings_hash=self.settings_hash))]
+        lines += [json.dumps(dict(path=key, **entry)) for key, entry in frames.items()]
+        # Write to a temporary file and then move it into place so that the
+        # manifest is never left half-written if the run is interrupted.
+        temporary_path = self._manifest_path.with_suffix(".tmp")
+        temporary_path.write_text("\n".join(lines) + "\n")
+        os.replace(temporary_path, self._manifest_path)
+
+    def is_done(self, path):
+        """
+        Check whether an image is done and has not changed since.
+
+        Parameters
+        ----------
+
+        path : str or Path
+            Path to the image.
+
+        Returns
+        -------
+
+        bool
+            ``True`` if there is a result for this image in the store and the
+            size and modification time of the image are unchanged.
+        """
+        entry = self._frames.get(self._key(path))
+        if entry is None:
+            return False
+        size, mtime_ns = self._file_state(path)
+        return entry["size"] == size and entry["mtime_ns"] == mtime_ns
+
+    def record(self, path, has_wcs, photom_data, dropped_sources):
+        """
+        Store the result of photometry on one image.
+
+        Parameters
+        ----------
+
+        path : str or Path
+            Path to the image.
+
+        has_wcs : bool
+            Whether the image has a WCS. Images without one are skipped.
+
+        photom_data : `stellarphot.PhotometryData` or None
+            The photometry of the image, or ``None`` if photometry failed.
+
+        dropped_sources : list or None
+            The star_ids of the sources that did not have photometry done.
+        """
+        key = self._key(path)
+        result = None
+        if photom_data is not None:
+            extension = ".ecsv" if pyarrow is None else ".parquet"
+            result = hashlib.sha256(key.encode()).hexdigest()[:20] + extension
+            photom_data.write(self.store_directory / result, overwrite=True)
+
+        size, mtime_ns = self._file_state(path)
+        entry = dict(
+            fname=Path(path).name,
+            size=size,
+            mtime_ns=mtime_ns,
+            has_wcs=has_wcs,
+            result=result,
+            dropped_sources=dropped_sources,
+        )
+        # The result is written before the image is added to the manifest, so
+        # an image in the manifest always has its result in the store.
+        with open(self._manifest_path, "a") as manifest:
+            manifest.write(json.dumps(dict(path=key, **entry)) + "\n")
+        previous = self._frames.get(key)
+        if previous is not None and previous["result"] not in (None, result):
+            (self.store_directory / previous["result"]).unlink(missing_ok=True)
+        self._frames[key] = entry
+
+    def has_wcs(self, path):
+        """
+        Check whether an image in the store has a WCS, without loading its
+        photometry.
+
+        Parameters
+        ----------
+
+        path : str or Path
+            Path to the image.
+
+        Returns
+        -------
+
+        bool
+            Whether the image has a WCS.
+        """
+        return self._frames[self._key(path)]["has_wcs"]
+
+    def load(self, path):
+        """
+        Load the stored result for one image.
+
+        Parameters
+        ----------
+
+        path : str or Path
+            Path to the image.
+
+        Returns
+        -------
+
+        fname : str
+            Name of the image file.
+
+        has_wcs : bool
+            Whether the image has a WCS.
+
+        photom_data : `stellarphot.PhotometryData` or None
+            The photometry of the image, or ``None`` if photometry failed.
+
+        dropped_sources : list or None
+            The star_ids of the sources that did not have photometry done.
+        """
+        entry = self._frames[self._key(path)]
+        photom_data = None
+        if entry["result"] is not None:
+            photom_data = PhotometryData.read(self.store_directory / entry["result"])
+        return (
+            entry["fname"],
+            entry["has_wcs"],
+            photom_data,
+            entry["dropped_sources"],
+        )
+
+    def photometry(self):
+        """
+        Combine all of the stored photometry into one table.
+
+        Returns
+        -------
+
+        photom_data : `stellarphot.PhotometryData` or None
+            The photometry of all the images in the store, in the order in
+            which they were stored, or ``None`` if there is no photometry in
+            the store.
+        """
+        results = [
+            self.store_directory / entry["result"]
+            for entry in self._frames.values()
+            if entry["result"] is not None
+        ]
+        if not results:
+            return None
+        if len(results) > 1 and all(result.suffix == ".parquet" for result in results):
+            # Reading each result as a table means parsing its metadata, which
+            # takes much longer than reading its data, so join the data of all
+            # of them and read that as one table instead.
+            try:
+                combined = pyarrow.concat_tables(
+                    [parquet.read_table(result) for result in results]
+                )
+            except pyarrow.ArrowInvalid:
+                # The results do not all have the same columns
+                pass
+            else:
+                buffer = io.BytesIO()
+                parquet.write_table(combined, buffer)
+                buffer.seek(0)
+                return PhotometryData.read(buffer, format="parquet")
+        return vstack([PhotometryData.read(result) for result in results])
@@ -0,0 +1,313 @@
+import os
+import sqlite3
+import warnings
+from pathlib import Path
+
+from astropy.io import fits
+from astropy.table import Table
+from astropy.wcs import WCS, FITSFixedWarning
+
+__all__ = ["HeaderIndex"]
+
+# Header keywords that can hold the exposure time, in order of preference
+EXPOSURE_KEYWORDS = ["EXPOSURE", "EXPTIME", "TELAPSE", "ELAPTIME", "ONTIME", "LIVETIME"]
+
+FITS_EXTENSIONS = ("fit", "fits", "fts")
+COMPRESSED_EXTENSIONS = ("", ".gz", ".bz2", ".Z", ".zip", ".fz")
+
+# Columns of the index, other than the file name and state, with the SQL type
+# of each. Bump SCHEMA_VERSION if these change so that old indexes are rebuilt.
+COLUMNS = {
+    "object": "",
+    "filter": "",
+    "date_obs": "TEXT",
+    "exposure": "REAL",
+    "exposure_keyword": "TEXT",
+    "airmass": "REAL",
+    "has_wcs": "INTEGER",
+}
+SCHEMA_VERSION = 1
+
+# Seconds to wait for another process (e.g. a watcher and a batch run on the
+# same directory) to finish writing to the index before giving up on it.
+BUSY_TIMEOUT = 30
+
+# Value of ``index_path`` that keeps the index in memory
+IN_MEMORY = ":memory:"
+
+
+def _wcs_from_header(header):
+    """
+    The WCS of a header, or ``None`` if it has none, decided the same way
+    `~astropy.nddata.CCDData` does.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=FITSFixedWarning)
+            wcs = WCS(header)
+    except Exception:
+        return None
+    return wcs if wcs.wcs.ctype[0] else None
+
+
+def _header_values(header):
+    """
+    The values of the indexed keywords in a header, in the order of
+    ``COLUMNS``.
+    """
+    exposure_keyword = next((kw for kw in EXPOSURE_KEYWORDS if kw in header), None)
+    exposure = header[exposure_keyword] if exposure_keyword is not None else None
+    values = [
+        header.get("OBJECT"),
+        header.get("FILTER"),
+        header.get("DATE-OBS"),
+        exposure,
+        exposure_keyword,
+        header.get("AIRMASS"),
+        _wcs_from_header(header) is not None,
+    ]
+    # Keywords without a value (or with one SQLite cannot store) are treated
+    # as missing
+    return [value if isinstance(value, str | int | float) else None for value in values]
+
+
+class HeaderIndex:
+    """
+    A persistent index of the FITS headers of the images in a directory, used
+    to select images without reading every header each time.
+
+    The index is a SQLite database that records, for each image, its size and
+    modification time and the header keywords that stellarphot uses:
+    ``OBJECT``, ``FILTER``, ``DATE-OBS``, the exposure time (from the first of
+    the exposure keywords that is present), ``AIRMASS`` and whether the image
+    has a WCS. When the index is updated only the headers of images that are
+    new or have changed are read, and images that have been removed are
+    dropped from the index.
+
+    Parameters
+    ----------
+
+    directory : str or Path
+        Directory with the images.
+
+    index_path : str or Path, optional (Default: None)
+        Path of the SQLite database. By default it is a file named
+        ``.stellarphot_headers.sqlite`` in ``directory``. If it is
+        ``":memory:"`` the index is kept in memory, so it only lasts as long
+        as this object and nothing is written to disk. The index is also kept
+        in memory, and `index_path` set to ``None``, if the file cannot be
+        created, for example because the directory is read-only, or if
+        another process keeps it locked for longer than ``BUSY_TIMEOUT``
+        seconds.
+
+    ext : int, optional (Default: 0)
+        The FITS extension whose header is indexed.
+
+    Notes
+    -----
+    The images are found by their file name extension (``.fit``, ``.fits`` or
+    ``.fts``, optionally compressed), like
+    `ccdproc.ImageFileCollection` does.
+    """
+
+    index_name = ".stellarphot_headers.sqlite"
+
+    def __init__(self, directory, index_path=None, ext=0):
+        self.directory = Path(directory)
+        if not self.directory.is_dir():
+            raise ValueError(f"directory '{directory}' is not a valid directory.")
+        self.ext = ext
+        if index_path is None:
+            index_path = self.directory / self.index_name
+        if str(index_path) == IN_MEMORY:
+            self.index_path = None
+            self._connection = sqlite3.connect(IN_MEMORY)
+            self._create_tables()
+            return
+        self.index_path = Path(index_path)
+        try:
+            self._connection = sqlite3.connect(self.index_path, timeout=BUSY_TIMEOUT)
+            self._create_tables()
+        except sqlite3.OperationalError:
+            self._use_memory()
+
+    def _use_memory(self):
+        """
+        Replace the index on disk with an empty index in memory.
+        """
+        if hasattr(self, "_connection"):
+            self._connection.close()
+        self.index_path = None
+        self._connection = sqlite3.connect(IN_MEMORY)
+        self._create_tables()
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _create_tables(self):
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value)"
+            )
+            settings = dict(self._connection.execute("SELECT key, value FROM settings"))
+            if settings != {"schema_version": SCHEMA_VERSION, "ext": self.ext}:
+                # The index was made for another extension or by another
+                # version, so start over
+                self._connection.execute("DROP TABLE IF EXISTS headers")
+                self._connection.execute("DELETE FROM settings")
+                self._connection.executemany(
+                    "INSERT INTO settings VALUES (?, ?)",
+                    [("schema_version", SCHEMA_VERSION), ("ext", self.ext)],
+                )
+            columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS headers "
+                f"(file TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, {columns})"
+            )
+
+    def _image_files(self):
+        extensions = tuple(
+            f".{ext}{compression}"
+            for ext in FITS_EXTENSIONS
+            for compression in COMPRESSED_EXTENSIONS
+        )
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(extensions) and entry.is_file():
+                    yield entry
+
+    def update(self):
+        """
+        Bring the index up to date with the directory.
+
+        Returns
+        -------
+
+        int
+            The number of headers that were read.
+        """
+        try:
+            return self._update()
+        except sqlite3.OperationalError:
+            if self.index_path is None:
+                raise
+            # Most likely another process has kept the index locked for
+            # longer than BUSY_TIMEOUT, so carry on without it.
+            self._use_memory()
+            return self._update()
+
+    def _update(self):
+        stored = {
+            file: (size, mtime_ns)
+            for file, size, mtime_ns in self._connection.execute(
+                "SELECT file, size, mtime_ns FROM headers"
+            )
+        }
+
+        rows = []
+        present = set()
+        for entry in self._image_files():
+            present.add(entry.name)
+            stat = entry.stat()
+            state = (stat.st_size, stat.st_mtime_ns)
+            if stored.get(entry.name) == state:
+                continue
+            try:
+                header = fits.getheader(entry.path, self.ext)
+            except (OSError, IndexError):
+                # Not readable (yet); leave it out so it is tried again next
+                # time the index is updated.
+                present.discard(entry.name)
+                continue
+            rows.append((entry.name, *state, *_header_values(header)))
+
+        placeholders = ", ".join("?" * (len(COLUMNS) + 3))
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM headers WHERE file = ?",
+                [(file,) for file in stored.keys() - present],
+            )
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO headers VALUES ({placeholders})", rows
+            )
+        return len(rows)
+
+    def files_filtered(self, include_path=False, **keywords):
+        """
+        Names of the indexed images whose keywords have the given values.
+
+        The index is not updated first; call `update` for that.
+
+        Parameters
+        ----------
+
+        include_path : bool, optional (Default: False)
+            If ``True``, return the full path of each image instead of its
+            name.
+
+        **keywords
+            Values of the columns of the index (``object``, ``filter``,
+            ``date_obs``, ``exposure``, ``exposure_keyword``, ``airmass`` or
+            ``has_wcs``) that the images must have. As for
+            `ccdproc.ImageFileCollection.files_filtered`, strings are compared
+            without regard to case, ``"*"`` matches any value and ``None``
+            matches images without the keyword.
+
+        Returns
+        -------
+
+        list of str
+            The matching images, sorted by name.
+        """
+        conditions = []
+        values = []
+        for name, value in keywords.items():
+            if name not in COLUMNS:
+                raise ValueError(
+                    f"'{name}' is not in the header index, which has the columns "
+                    f"{', '.join(COLUMNS)}."
+                )
+            if value is None:
+                conditions.append(f"{name} IS NULL")
+            elif value == "*":
+                conditions.append(f"{name} IS NOT NULL")
+            elif isinstance(value, str):
+                conditions.append(f"{name} = ? COLLATE NOCASE")
+                values.append(value)
+            else:
+                conditions.append(f"{name} = ?")
+                values.append(value)
+
+        query = "SELECT file FROM headers"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        files = [
+            file
+            for (file,) in self._connection.execute(query + " ORDER BY file", values)
+        ]
+        if include_path:
+            files = [str(self.directory / file) for file in files]
+        return files
+
+    @property
+    def summary(self):
+        """
+        `astropy.table.Table` with one row per indexed image.
+        """
+        cursor = self._connection.execute("SELECT * FROM headers ORDER BY file")
+        names = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        if not rows:
+            return Table(names=names)
+        table = Table(rows=rows, names=names)
+        table["has_wcs"] = table["has_wcs"].astype(bool)
+        return table
@@ -0,0 +1,91 @@
+import numpy as np
+from astropy.nddata import NDData
+from astropy.stats import sigma_clipped_stats
+
+__all__ = ["fast_sigma_clipped_stats"]
+
+
+def _sample_pixels(data, n_pixels, sampling, seed):
+    """
+    About ``n_pixels`` pixels of an image, spread over all of it.
+    """
+    if sampling == "grid":
+        # Every pixel of a regular grid; slicing does not copy the image.
+        step = max(1, int((data.size / n_pixels) ** (1 / data.ndim)))
+        return data[(slice(None, None, step),) * data.ndim]
+    if sampling == "random":
+        rng = np.random.default_rng(seed)
+        return data[tuple(rng.integers(0, size, n_pixels) for size in data.shape)]
+    raise ValueError(f"sampling must be 'grid' or 'random', not '{sampling}'.")
+
+
+def fast_sigma_clipped_stats(
+    image, sigma=3.0, maxiters=5, accuracy=0.01, sampling="grid", seed=0
+):
+    """
+    Calculate sigma-clipped statistics of an image from a sample of its
+    pixels.
+
+    The median of an image is found by sorting its pixels, which for a large
+    image takes much longer than any use of the statistics needs. This
+    function instead calculates the statistics of only as many pixels as
+    needed to reach the requested accuracy, using
+    `astropy.stats.sigma_clipped_stats`. Images with fewer pixels than that
+    are used in full, so for them the result is the same as that of
+    `~astropy.stats.sigma_clipped_stats`.
+
+    Parameters
+    ----------
+
+    image : `numpy.ndarray` or `astropy.nddata.CCDData`
+        The image. Masked pixels, and pixels that are NaN, are ignored.
+
+    sigma : float or None, optional (default=3.0)
+        The number of standard deviations to use as the lower and upper
+        clipping limit. If ``None``, the pixels are not clipped.
+
+    maxiters : int, optional (default=5)
+        The maximum number of clipping iterations.
+
+    accuracy : float, optional (default=0.01)
+        The standard error of the median that is acceptable, as a fraction of
+        the standard deviation of the pixels. The number of pixels used is
+        about ``(pi / 2) / accuracy**2``, e.g. about 16,000 pixels for the
+        default.
+
+    sampling : {"grid", "random"}, optional (default="grid")
+        How to choose the pixels: every pixel of a regular grid that covers
+        the image, or pixels at random.
+
+    seed : int, optional (default=0)
+        Seed of the random number generator used when `sampling` is
+        ``"random"``, so that the same pixels are used each time.
+
+    Returns
+    -------
+
+    mean, median, std : float
+        The mean, median and standard deviation of the sampled pixels.
+    """
+    if isinstance(image, NDData):
+        data, mask = image.data, image.mask
+    else:
+        data, mask = np.ma.getdata(image), np.ma.getmask(image)
+    if mask is np.ma.nomask:
+        mask = None
+
+    n_pixels = int(np.ceil(np.pi / 2 / accuracy**2))
+    if data.size > n_pixels:
+        sample = _sample_pixels(data, n_pixels, sampling, seed)
+        if mask is not None:
+            mask = _sample_pixels(mask, n_pixels, sampling, seed)
+    else:
+        sample = data
+    if mask is not None:
+        sample = sample[~mask]
+    if not np.isfinite(sample).all():
+        sample = sample[np.isfinite(sample)]
+
+    if sigma is None:
+        return np.nanmean(sample), np.nanmedian(sample), np.nanstd(sample)
+    return sigma_clipped_stats(sample, sigma=sigma, maxiters=maxiters)
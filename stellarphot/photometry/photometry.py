@@ -1,26 +1,23 @@
 import logging
+import os
 import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
 from astropy import units as u
 from astropy.coordinates import SkyCoord
-from astropy.nddata import CCDData, NoOverlapError
-from astropy.stats import SigmaClip
-from astropy.table import Column, vstack
+from astropy.io import fits
+from astropy.nddata import CCDData, NDData, NoOverlapError, fits_ccddata_reader
+from astropy.table import Column, QTable, vstack
 from astropy.time import Time
 from astropy.utils.exceptions import AstropyUserWarning
-from astropy.wcs import FITSFixedWarning
-from ccdproc import ImageFileCollection
-from photutils.aperture import (
-    ApertureStats,
-    CircularAnnulus,
-    CircularAperture,
-    aperture_photometry,
-)
-from photutils.centroids import centroid_sources
+from astropy.wcs import WCS, FITSFixedWarning
+from photutils.aperture import SkyAperture
 from pydantic import BaseModel, validate_call
-from scipy.spatial.distance import cdist
+from scipy.spatial import KDTree
 
 from stellarphot import PhotometryData, SourceListData
 from stellarphot.settings import (
@@ -31,20 +28,24 @@ from stellarphot.settings import (
     PhotometrySettings,
 )
 
+from .background import BackgroundMesh
+from .checkpoint import PhotometryCheckpoint
+from .header_index import EXPOSURE_KEYWORDS, HeaderIndex, _wcs_from_header
+from .registration import FrameRegistration
 from .source_detection import compute_fwhm, fast_fwhm_from_image
+from .stamps import clipped_statistics, stamp_photometry
 
 __all__ = [
     "AperturePhotometry",
     "single_image_photometry",
     "multi_image_photometry",
+    "iter_image_photometry",
     "find_too_close",
+    "read_image_sections",
     "clipped_sky_per_pix_stats",
     "calculate_noise",
 ]
 
-# Allowed FITS header keywords for exposure values
-EXPOSURE_KEYWORDS = ["EXPOSURE", "EXPTIME", "TELAPSE", "ELAPTIME", "ONTIME", "LIVETIME"]
-
 # Attribute used to tag logging handlers that stellarphot itself created, so
 # that we can later remove only those and leave any caller-supplied handlers
 # (and the root logger's handlers) untouched. See issue #153.
@@ -60,6 +61,8 @@ class AperturePhotometry(BaseModel):
     def __call__(
         self,
         file_or_directory: str | Path,
+        workers: int | None = None,
+        read_sections: bool = False,
         **kwargs,
     ) -> PhotometryData:
         """
@@ -87,6 +90,30 @@ class AperturePhotometry(BaseModel):
             whose value is ``object_of_interest``. *Only used for multi-image
             photometry* to select which files to perform photometry on.
 
+        workers : int, optional (Default: None)
+            Number of worker processes to use. If ``None`` or 1, the images are
+            processed one at a time in this process. *Only used for multi-image
+            photometry*; see `multi_image_photometry` for details.
+
+        checkpoint_dir : str or Path, optional (Default: None)
+            Directory in which to store the photometry of each image so that
+            an interrupted run can be resumed. *Only used for multi-image
+            photometry*; see `multi_image_photometry` for details.
+
+        read_sections : bool, optional (Default: False)
+            If ``True``, only read the parts of each image around the sources;
+            see `read_image_sections`.
+
+        register_frames : bool, optional (Default: False)
+            If ``True``, images without a WCS are registered to an image that
+            has one instead of being skipped. *Only used for multi-image
+            photometry*; see `multi_image_photometry` for details.
+
+        index_path : str or Path, optional (Default: None)
+            Where to keep the index of the image headers, or ``":memory:"`` to
+            write nothing to the image directory. *Only used for multi-image
+            photometry*; see `multi_image_photometry` for details.
+
         Returns
         -------
         photom_data : `stellarphot.PhotometryData`
@@ -98,9 +125,18 @@ class AperturePhotometry(BaseModel):
         # Make sure we have a Path object
         path = Path(file_or_directory)
         if path.is_dir():
-            photom_data = multi_image_photometry(path, self.settings, **kwargs)
+            photom_data = multi_image_photometry(
+                path,
+                self.settings,
+                workers=workers,
+                read_sections=read_sections,
+                **kwargs,
+            )
         elif path.is_file():
-            image = CCDData.read(path)
+            if read_sections:
+                image = read_image_sections(path, self.settings)
+            else:
+                image = CCDData.read(path)
             photom_data = single_image_photometry(
                 image, self.settings, fname=str(path), **kwargs
             )
@@ -111,6 +147,487 @@ class AperturePhotometry(BaseModel):
 
         return photom_data
 
+    def iter_directory(
+        self,
+        directory,
+        object_of_interest=None,
+        workers=None,
+        checkpoint_dir=None,
+        read_sections=False,
+        register_frames=False,
+        index_path=None,
+    ):
+        """
+        Perform aperture photometry on a directory of images, yielding the
+        result for each image as soon as it is done.
+
+        Parameters
+        ----------
+        directory : str or Path
+            The directory of images on which to perform aperture photometry.
+
+        object_of_interest : str, optional (Default: None)
+            Name of the object of interest. The only files on which photometry
+            will be done are those whose header contains the keyword ``OBJECT``
+            whose value is ``object_of_interest``.
+
+        workers : int, optional (Default: None)
+            Number of worker processes to use; see `multi_image_photometry`.
+
+        checkpoint_dir : str or Path, optional (Default: None)
+            Directory in which to store the photometry of each image as it is
+            done; see `multi_image_photometry`.
+
+        read_sections : bool, optional (Default: False)
+            If ``True``, only read the parts of each image around the sources;
+            see `read_image_sections`.
+
+        register_frames : bool, optional (Default: False)
+            If ``True``, images without a WCS are registered to an image that
+            has one instead of being skipped; see `multi_image_photometry`.
+
+        index_path : str or Path, optional (Default: None)
+            Where to keep the index of the image headers, or ``":memory:"`` to
+            write nothing to the image directory; see
+            `multi_image_photometry`.
+
+        Returns
+        -------
+        generator
+            A generator of ``(fname, photom_data, dropped_sources)`` tuples, one
+            for each image; see `iter_image_photometry`.
+        """
+        path = Path(directory)
+        if not path.is_dir():
+            raise ValueError(f"directory '{path}' is not a valid directory.")
+
+        return iter_image_photometry(
+            path,
+            self.settings,
+            object_of_interest=object_of_interest,
+            workers=workers,
+            checkpoint_dir=checkpoint_dir,
+            read_sections=read_sections,
+            register_frames=register_frames,
+            index_path=index_path,
+        )
+
+
+@lru_cache(maxsize=8)
+def _read_source_list_cached(file_state):
+    # file_state is (path, size, modification time); only the path is needed
+    # to read the file, the rest is there so a changed file is read again.
+    return SourceListData.read(file_state[0])
+
+
+def _read_source_list(source_list_file):
+    """
+    Read a source list, reusing the result of an earlier read of the same,
+    unchanged, file.
+
+    Photometry on a sequence of images reads the same source list once per
+    image, so the table is cached using the path, size and modification time
+    of the file as the key. The table that is returned may be shared between
+    calls, so it must not be modified.
+
+    Parameters
+    ----------
+    source_list_file : str or Path
+        Path to the source list.
+
+    Returns
+    -------
+    sourcelist : `stellarphot.SourceListData`
+        The source list.
+    """
+    try:
+        stat = os.stat(source_list_file)
+    except (OSError, TypeError, ValueError):
+        # Let SourceListData.read raise its usual error for a bad file
+        return SourceListData.read(source_list_file)
+    return _read_source_list_cached(
+        (str(Path(source_list_file).resolve()), stat.st_size, stat.st_mtime_ns)
+    )
+
+
+@lru_cache(maxsize=4)
+def _sky_coords(sky_positions_bytes):
+    """
+    `~astropy.coordinates.SkyCoord` of the sources of a source list.
+
+    The RA and Dec are passed as the bytes of a (2, N) float array, in degrees,
+    so that the coordinates are only made once for each source list.
+    """
+    ra, dec = np.frombuffer(sky_positions_bytes, dtype=float).reshape(2, -1)
+    return SkyCoord(ra, dec, unit=u.deg, frame="icrs")
+
+
+def _wcs_fingerprint(wcs):
+    """
+    Summary of everything that the transformation of a WCS from sky to pixel
+    positions depends on.
+
+    Returns the linear part of the WCS and the rest of it (the projection and
+    any SIP distortion) as two separate byte strings, or ``None`` if it is not
+    a FITS WCS or has distortion lookup tables, which are not summarized.
+    """
+    if not isinstance(wcs, WCS) or any(
+        table is not None
+        for table in (wcs.cpdis1, wcs.cpdis2, wcs.det2im1, wcs.det2im2)
+    ):
+        return None
+    linear = [
+        wcs.wcs.crpix,
+        wcs.wcs.crval,
+        (wcs.wcs.get_pc() * wcs.wcs.get_cdelt()[:, np.newaxis]).ravel(),
+        [wcs.wcs.lonpole, wcs.wcs.latpole],
+    ]
+    nonlinear = [
+        "|".join(wcs.wcs.ctype).encode(),
+        np.array([wcs.wcs.equinox]).tobytes(),
+        repr(wcs.wcs.get_pv()).encode(),
+        wcs.wcs.radesys.encode(),
+    ]
+    if wcs.sip is not None:
+        nonlinear.extend(
+            np.asarray(coefficients, dtype=float).tobytes()
+            for coefficients in (
+                wcs.sip.a,
+                wcs.sip.b,
+                wcs.sip.ap,
+                wcs.sip.bp,
+            )
+            if coefficients is not None
+        )
+        linear.append(wcs.sip.crpix)
+    return np.concatenate(linear).tobytes(), b"|".join(nonlinear)
+
+
+def _control_points(xs, ys, n_per_side=4):
+    """
+    Indexes of a few positions spread over the area covered by all of them:
+    the first position in each cell of a grid, and the positions at the
+    edges.
+    """
+    finite = np.flatnonzero(np.isfinite(xs) & np.isfinite(ys))
+    if len(finite) == 0:
+        return finite
+    x, y = xs[finite], ys[finite]
+    cells = [
+        np.minimum(
+            ((values - values.min()) / (np.ptp(values) or 1) * n_per_side).astype(int),
+            n_per_side - 1,
+        )
+        for values in (x, y)
+    ]
+    _, first = np.unique(cells[0] * n_per_side + cells[1], return_index=True)
+    edges = [np.argmin(x), np.argmax(x), np.argmin(y), np.argmax(y)]
+    return finite[np.unique(np.concatenate([first, edges]))]
+
+
+# Pixel positions of the sources of the most recently used source lists, by
+# the bytes of their sky positions. Each entry holds the fingerprint of the
+# WCS, the pixel positions found with it and the indexes of the control
+# points used to check an affine update of the positions.
+_pixel_position_cache = {}
+_PIXEL_POSITION_CACHE_SIZE = 4
+
+# The largest error, in pixels, of the positions found by an affine update of
+# the positions for an earlier WCS.
+_AFFINE_TOLERANCE = 0.01
+
+
+def _world_to_pixel(wcs, ra, dec):
+    """
+    Pixel positions of sky positions, reusing the work done for the same
+    sky positions and an earlier WCS.
+
+    A sequence of images of a field usually has the same, or nearly the same,
+    WCS for every image. If the WCS is the same as the last one used for these
+    sky positions, the positions found then are used again. If only the linear
+    part of the WCS is different, the earlier positions, including the SIP
+    distortion, are moved by the affine transformation that fits the exact
+    positions of a few control points. That is used if it matches those
+    positions to within ``_AFFINE_TOLERANCE`` pixels; otherwise every position
+    is found with the WCS.
+
+    Parameters
+    ----------
+    wcs : `astropy.wcs.WCS`
+        The WCS of the image.
+
+    ra, dec : array-like
+        The sky positions, in degrees.
+
+    Returns
+    -------
+    xs, ys : `numpy.ndarray`
+        The pixel positions.
+    """
+    sky_key = np.array([ra, dec], dtype=float).tobytes()
+    coords = _sky_coords(sky_key)
+    fingerprint = _wcs_fingerprint(wcs)
+    if fingerprint is None:
+        return wcs.world_to_pixel(coords)
+
+    cached = _pixel_position_cache.pop(sky_key, None)
+    if cached is not None:
+        # Keep the entry, now as the most recently used one
+        _pixel_position_cache[sky_key] = cached
+        cached_fingerprint, xs, ys, control = cached
+        if fingerprint == cached_fingerprint:
+            return xs.copy(), ys.copy()
+        if fingerprint[1] == cached_fingerprint[1] and len(control) >= 3:
+            control_xs, control_ys = wcs.world_to_pixel(coords[control])
+            before = np.column_stack([xs[control], ys[control], np.ones(len(control))])
+            after = np.column_stack([control_xs, control_ys])
+            affine, *_ = np.linalg.lstsq(before, after, rcond=None)
+            if np.abs(before @ affine - after).max() < _AFFINE_TOLERANCE:
+                moved = np.column_stack([xs, ys, np.ones(len(xs))]) @ affine
+                return moved[:, 0], moved[:, 1]
+
+    xs, ys = wcs.world_to_pixel(coords)
+    xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+    _pixel_position_cache.pop(sky_key, None)
+    if len(_pixel_position_cache) >= _PIXEL_POSITION_CACHE_SIZE:
+        # Forget the source list that was used least recently
+        _pixel_position_cache.pop(next(iter(_pixel_position_cache)))
+    _pixel_position_cache[sky_key] = (
+        fingerprint,
+        xs.copy(),
+        ys.copy(),
+        _control_points(xs, ys),
+    )
+    return xs, ys
+
+
+def _image_hdu(hdus, hdu):
+    """
+    The HDU with the image and its header, which for an empty primary HDU is
+    the first extension with data, as `~astropy.nddata.fits_ccddata_reader`
+    does.
+    """
+    header = hdus[hdu].header
+    if hdu == 0 and hdus[0].data is None:
+        for index in range(1, len(hdus)):
+            if hdus[index].is_image and hdus.fileinfo(index)["datSpan"] > 0:
+                combined_header = hdus[index].header.copy()
+                combined_header.extend(header, unique=True)
+                return hdus[index], combined_header
+    return hdus[hdu], header.copy()
+
+
+def _unit_from_header(header):
+    unit = header.get("BUNIT")
+    if not unit:
+        return None
+    if unit.strip().lower() == "adu":
+        return u.adu
+    unit = CCDData.known_invalid_fits_unit_strings.get(unit, unit)
+    return u.Unit(unit)
+
+
+# Keywords that say how the data in a FITS file is scaled
+_SCALING_KEYWORDS = ["BSCALE", "BZERO", "BLANK"]
+
+
+def _scaled_dtype(raw, header):
+    """
+    The type of the data as astropy scales it, or ``None`` if it is not
+    scaled.
+    """
+    bscale = header.get("BSCALE", 1)
+    bzero = header.get("BZERO", 0)
+    if bscale == 1 and bzero == 0:
+        return None
+    if (
+        np.issubdtype(raw.dtype, np.signedinteger)
+        and bscale == 1
+        and bzero == 2 ** (8 * raw.dtype.itemsize - 1)
+    ):
+        # The FITS convention for unsigned integers
+        return np.dtype(f"uint{8 * raw.dtype.itemsize}")
+    return np.dtype(float)
+
+
+def _scaled(raw, header, dtype):
+    data = raw.astype(float) * header.get("BSCALE", 1) + header.get("BZERO", 0)
+    if np.issubdtype(raw.dtype, np.integer) and "BLANK" in header:
+        data[raw == header["BLANK"]] = np.nan
+    return data.astype(dtype)
+
+
+class ScaledImageData:
+    """
+    The data of a scaled FITS image (one with ``BSCALE`` or ``BZERO``) that
+    scales only the pixels that are read from it.
+
+    Indexing it, or taking pixels with `take`, reads those pixels from the
+    unscaled data and scales them; ``numpy.asarray`` scales the whole image.
+
+    Parameters
+    ----------
+
+    raw : `numpy.ndarray`
+        The data as it is stored in the file, usually memory-mapped.
+
+    header : `astropy.io.fits.Header`
+        The header with the ``BSCALE``, ``BZERO`` and ``BLANK`` keywords.
+
+    dtype : `numpy.dtype`
+        The type of the scaled data.
+    """
+
+    def __init__(self, raw, header, dtype):
+        self.raw = raw
+        self.dtype = np.dtype(dtype)
+        # Keep only the scaling, since the keywords are removed from the
+        # header of the image
+        self._scaling = fits.Header(
+            [card for card in header.cards if card.keyword in _SCALING_KEYWORDS]
+        )
+
+    @property
+    def shape(self):
+        return self.raw.shape
+
+    @property
+    def ndim(self):
+        return self.raw.ndim
+
+    @property
+    def size(self):
+        return self.raw.size
+
+    def __getitem__(self, key):
+        return _scaled(self.raw[key], self._scaling, self.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        data = _scaled(self.raw, self._scaling, self.dtype)
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def take(self, indices):
+        """
+        Scaled pixels at the ``indices`` of the flattened image, like
+        `numpy.ndarray.take`.
+        """
+        return _scaled(self.raw.take(indices), self._scaling, self.dtype)
+
+
+def read_image_sections(path, photometry_settings, hdu=0):
+    """
+    Read only the parts of an image that photometry of the sources in the
+    source list needs.
+
+    The image is memory-mapped, so only the parts of it that photometry
+    touches, the pixels around each source, are read from disk and the memory
+    needed is set by the number of sources rather than by the size of the
+    image. The result can be passed to
+    `~stellarphot.photometry.single_image_photometry` with the same
+    ``photometry_settings`` and gives the same photometry as the whole image.
+
+    Parameters
+    ----------
+
+    path : str or Path
+        Path to the FITS image.
+
+    photometry_settings : `stellarphot.settings.PhotometrySettings`
+        The photometry settings; with a variable aperture, or a sky modelled
+        from the whole image, a scaled image is read in full.
+
+    hdu : int or str, optional (Default: 0)
+        The HDU with the image. If it is the primary HDU and that has no
+        data, the first extension with data is used.
+
+    Returns
+    -------
+
+    `astropy.nddata.CCDData`
+        The image, with its full header, WCS and unit, and the mask from a
+        ``MASK`` extension, if there is one.
+
+    Notes
+    -----
+    If the image is scaled (has ``BSCALE`` or ``BZERO``, as images of
+    unsigned integers do), the data on disk is not what photometry uses. The
+    data of the image is then a `ScaledImageData`, which scales only the
+    pixels that are read from it, so the stamps around the sources are scaled
+    as they are extracted and no array the size of the image is made. Use
+    ``numpy.asarray(ccd.data)`` to get all of the scaled data.
+
+    With a variable aperture the FWHM is measured from the whole image, and
+    with ``sky_method="mesh"`` the sky background is modelled from the whole
+    image, so in either case a scaled image is read in full. Compressed images
+    cannot be memory-mapped, so they are decompressed in full.
+    """
+    with fits.open(path, memmap=True, do_not_scale_image_data=True) as hdus:
+        image_hdu, header = _image_hdu(hdus, hdu)
+        wcs = _wcs_from_header(header)
+        raw = image_hdu.data
+        mask = hdus["MASK"].data if "MASK" in hdus else None
+        if mask is not None:
+            # Masks are stored as bytes that are 0 or 1
+            mask = mask.view(bool) if mask.dtype == np.uint8 else mask.astype(bool)
+
+        dtype = _scaled_dtype(raw, header)
+        if dtype is None:
+            # Only the parts of the memory-mapped file that are used are read
+            data = raw
+        elif (
+            photometry_settings.photometry_apertures.variable_aperture
+            or photometry_settings.photometry_optional_settings.sky_method == "mesh"
+        ):
+            data = _scaled(raw, header, dtype)
+        else:
+            # Only the pixels around the sources are read and scaled
+            data = ScaledImageData(raw, header, dtype)
+        if dtype is not None:
+            # The data is no longer scaled
+            for keyword in _SCALING_KEYWORDS:
+                header.remove(keyword, ignore_missing=True)
+        del raw
+
+    return CCDData(
+        data, unit=_unit_from_header(header), mask=mask, wcs=wcs, meta=header
+    )
+
+
+def _read_frame(full_path, hdu, photometry_settings, read_sections):
+    """
+    Read one image of a directory, either in full or only the sections
+    needed for the photometry.
+    """
+    if read_sections:
+        return read_image_sections(full_path, photometry_settings, hdu=hdu)
+    return fits_ccddata_reader(full_path, hdu=hdu)
+
+
+def _read_registered_frame(
+    full_path, hdu, photometry_settings, read_sections, registration
+):
+    """
+    Read one image of a directory and, if it has no WCS and ``registration``
+    is not ``None``, give it the WCS of the reference image moved to match it.
+
+    Returns the image and a message to log about the registration, which is
+    ``None`` if the image was not registered or did not need to be.
+    """
+    ccd = _read_frame(full_path, hdu, photometry_settings, read_sections)
+    if ccd.wcs is not None or registration is None:
+        return ccd, None
+
+    if read_sections:
+        # Without a WCS the sections around the sources cannot be found, so
+        # the whole image is needed to register it.
+        ccd = fits_ccddata_reader(full_path, hdu=hdu)
+    try:
+        transform = registration.register(ccd)
+    except ValueError as error:
+        return ccd, f"  Could not register this image: {error}"
+    ccd.wcs = transform.transform_wcs(registration.wcs)
+    return ccd, f"  Registered to the reference image: {transform}"
+
 
 def _add_log_handlers(logger, logfile, console_log):
     """
@@ -190,6 +707,262 @@ def _remove_our_handlers(logger):
             logger.removeHandler(handler)
 
 
+class _LogMessageCollector(logging.Handler):
+    """
+    Logging handler that keeps the messages it handles instead of writing them.
+
+    Worker processes of a parallel `multi_image_photometry` run cannot write to
+    the log file or console of the parent process themselves, so they collect
+    their messages with this handler and return them to the parent, which then
+    logs them in image order. Only the level and the formatted message are kept
+    so that the messages can always be pickled.
+    """
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self.messages = []
+        setattr(self, _STELLARPHOT_HANDLER, True)
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+# Photometry settings, and the registration to use for images without a WCS,
+# for the worker processes of a parallel multi_image_photometry run. They are
+# sent to each worker once, by _init_photometry_worker, instead of being sent
+# along with every image.
+_worker_photometry_settings = None
+_worker_registration = None
+
+
+def _init_photometry_worker(settings_json, registration=None):
+    """
+    Initialize a worker process for parallel photometry.
+
+    Parameters
+    ----------
+    settings_json : str
+        The photometry settings as a JSON string.
+
+    registration : `~stellarphot.photometry.FrameRegistration`, optional
+        Registration to the reference image, used to find the WCS of images
+        that do not have one.
+    """
+    global _worker_photometry_settings, _worker_registration
+    _worker_photometry_settings = PhotometrySettings.model_validate_json(settings_json)
+    _worker_registration = registration
+    # Suppress the FITSFixedWarning that is raised when reading a FITS file header
+    warnings.filterwarnings("ignore", category=FITSFixedWarning)
+
+
+def _photometry_worker(full_path, hdu, read_sections=False):
+    """
+    Read one image and perform photometry on it in a worker process.
+
+    Parameters
+    ----------
+    full_path : str
+        Path to the image.
+
+    hdu : int or str
+        The HDU that contains the image.
+
+    read_sections : bool, optional
+        If ``True``, only read the sections of the image that the photometry
+        needs, using `read_image_sections`.
+
+    Returns
+    -------
+    fname : str
+        Name of the file, without the path.
+
+    has_wcs : bool
+        ``False`` if the image has no WCS, and could not be registered, in
+        which case no photometry is done.
+
+    photom_data : `stellarphot.PhotometryData` or None
+        Result of `single_image_photometry`.
+
+    dropped_sources : list or None
+        Result of `single_image_photometry`.
+
+    registration_message : str or None
+        Message about the registration of the image, if it was registered.
+
+    messages : list of (int, str)
+        The level and text of each message logged by `single_image_photometry`.
+    """
+    fname = Path(full_path).name
+    ccd, registration_message = _read_registered_frame(
+        full_path, hdu, _worker_photometry_settings, read_sections, _worker_registration
+    )
+    if ccd.wcs is None:
+        return fname, False, None, None, registration_message, []
+
+    logger = logging.getLogger("single_image_photometry")
+    # A forked worker inherits the handlers of the parent process, which would
+    # write to the parent's log file directly; replace them with a collector.
+    # Because the collector is tagged as one of our handlers,
+    # single_image_photometry uses it instead of setting up its own.
+    _remove_our_handlers(logger)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    collector = _LogMessageCollector()
+    logger.addHandler(collector)
+    try:
+        photom_data, dropped_sources = single_image_photometry(
+            ccd,
+            _worker_photometry_settings,
+            fname=fname,
+            logline="    >",
+        )
+    finally:
+        _remove_our_handlers(logger)
+
+    return (
+        fname,
+        True,
+        photom_data,
+        dropped_sources,
+        registration_message,
+        collector.messages,
+    )
+
+
+def _serial_frame_photometry(
+    paths, hdu, photometry_settings, logger, read_sections=False, registration=None
+):
+    """
+    Perform photometry on a list of images one at a time.
+
+    Yields ``(fname, has_wcs, photom_data, dropped_sources)`` for each image,
+    in order. Images without a WCS are registered with ``registration``, if it
+    is not ``None``, or else skipped, in which case ``has_wcs`` is ``False``
+    and the last two values are ``None``.
+    """
+    for full_path in paths:
+        this_fname = Path(full_path).name
+        this_ccd, registration_message = _read_registered_frame(
+            full_path, hdu, photometry_settings, read_sections, registration
+        )
+        logger.info(f"multi_image_photometry: Processing image {this_fname}")
+        if registration_message is not None:
+            logger.info(registration_message)
+        if this_ccd.wcs is None:
+            logger.warning("                   .... SKIPPING THIS IMAGE (NO WCS)")
+            yield this_fname, False, None, None
+            continue
+
+        # Call single_image_photometry on each image
+        logger.info("  Calling single_image_photometry ...")
+        this_phot, this_missing_sources = single_image_photometry(
+            this_ccd,
+            photometry_settings,
+            fname=this_fname,
+            logline="    >",
+        )
+        yield this_fname, True, this_phot, this_missing_sources
+
+
+def _parallel_frame_photometry(
+    paths,
+    hdu,
+    photometry_settings,
+    logger,
+    workers,
+    read_sections=False,
+    registration=None,
+):
+    """
+    Perform photometry on a list of images with a pool of processes.
+
+    This yields exactly what `_serial_frame_photometry` does, in the same order,
+    and the messages logged by `single_image_photometry` in the workers are
+    logged in this process, in image order.
+    """
+    paths = iter(paths)
+
+    # The workers send their log messages back here, so the handlers that
+    # single_image_photometry would normally set up are set up here instead.
+    single_logger = logging.getLogger("single_image_photometry")
+    _remove_our_handlers(single_logger)
+    fh = _add_log_handlers(
+        single_logger,
+        photometry_settings.logging_settings.logfile,
+        photometry_settings.logging_settings.console_log,
+    )
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_photometry_worker,
+            initargs=(photometry_settings.model_dump_json(), registration),
+        ) as executor:
+            # Only keep a few images per worker in flight so that finished
+            # results do not pile up in memory ahead of the consumer.
+            pending = deque(
+                executor.submit(_photometry_worker, path, hdu, read_sections)
+                for _, path in zip(range(2 * workers), paths, strict=False)
+            )
+            while pending:
+                (
+                    this_fname,
+                    has_wcs,
+                    this_phot,
+                    this_missing_sources,
+                    registration_message,
+                    messages,
+                ) = pending.popleft().result()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append(
+                        executor.submit(
+                            _photometry_worker, next_path, hdu, read_sections
+                        )
+                    )
+
+                logger.info(f"multi_image_photometry: Processing image {this_fname}")
+                if registration_message is not None:
+                    logger.info(registration_message)
+                if has_wcs:
+                    logger.info("  Calling single_image_photometry ...")
+                    for level, message in messages:
+                        single_logger.log(level, message)
+                else:
+                    logger.warning(
+                        "                   .... SKIPPING THIS IMAGE (NO WCS)"
+                    )
+                try:
+                    yield this_fname, has_wcs, this_phot, this_missing_sources
+                except GeneratorExit:
+                    # The consumer stopped early; do not wait for the images
+                    # that have not been started yet.
+                    for future in pending:
+                        future.cancel()
+                    raise
+    finally:
+        if fh is not None:
+            fh.flush()
+            fh.close()
+        _remove_our_handlers(single_logger)
+
+
+def _mark_saturated(ccd_image, max_data_value):
+    """
+    Return a copy of an image with the saturated pixels set to NaN and the
+    non-finite pixels added to its mask.
+    """
+    data = ccd_image.data.astype(float)
+    data[data > max_data_value] = np.nan
+    bad_pixels = ~np.isfinite(data)
+    mask = ccd_image.mask
+    if bad_pixels.any():
+        mask = bad_pixels if mask is None else mask | bad_pixels
+    return CCDData(
+        data, unit=ccd_image.unit, mask=mask, wcs=ccd_image.wcs, meta=ccd_image.meta
+    )
+
+
 def single_image_photometry(
     ccd_image,
     photometry_settings,
@@ -260,7 +1033,7 @@ def single_image_photometry(
     the `use_coordinates` parameter should be set to "sky".
     """
 
-    sourcelist = SourceListData.read(
+    sourcelist = _read_source_list(
         photometry_settings.source_location_settings.source_list_file
     )
     camera = photometry_settings.camera
@@ -359,21 +1132,13 @@ def single_image_photometry(
         )
         return None, None
 
-    # Set high pixels to NaN (make sure ccd_image.data is a float array first)
-    ccd_image.data = ccd_image.data.astype(float)
-    ccd_image.data[ccd_image.data > camera.max_data_value.value] = np.nan
-
-    # Add any non-finite pixels -- the saturated pixels marked as NaN above
-    # plus any NaN already present in the input -- to the image mask so that
-    # they are excluded from the aperture sums instead of turning the sums
-    # into NaN. See #591. Sources whose aperture contains any of these pixels
-    # are flagged as saturated below.
-    bad_pixels = ~np.isfinite(ccd_image.data)
-    if bad_pixels.any():
-        if ccd_image.mask is not None:
-            ccd_image.mask = ccd_image.mask | bad_pixels
-        else:
-            ccd_image.mask = bad_pixels
+    # Pixels above the maximum data value are saturated. They, and any
+    # non-finite pixels in the input, are excluded from the aperture sums
+    # instead of turning the sums into NaN (see #591), and sources whose
+    # aperture contains any of them are flagged as saturated below. This is
+    # done on the stamps around the sources, so the image itself is neither
+    # copied nor modified.
+    max_data_value = camera.max_data_value.value
 
     # Extract necessary values from sourcelist structure
     star_ids = sourcelist["star_id"].value
@@ -386,10 +1151,7 @@ def single_image_photometry(
     # If RA/Dec are available attempt to use them to determine the source positions
     if use_coordinates == "sky" and sourcelist.has_ra_dec:
         try:
-            imgpos = ccd_image.wcs.world_to_pixel(
-                SkyCoord(ra, dec, unit=u.deg, frame="icrs")
-            )
-            xs, ys = imgpos[0], imgpos[1]
+            xs, ys = _world_to_pixel(ccd_image.wcs, ra, dec)
         except AttributeError:
             # No WCS, skip this image
             msg = f"{logline} ccd_image must have a valid WCS to use RA/Dec!"
@@ -400,14 +1162,23 @@ def single_image_photometry(
             "use_coordinates='sky' but sourcelist does not have" "RA/Dec coordinates!"
         )
 
+    # The background mesh is made once and used for everything that needs
+    # the sky background of the image.
+    if photometry_options.sky_method == "mesh":
+        background = BackgroundMesh(ccd_image)
+        logger.info(f"{logline} Sky background from {background}")
+    else:
+        background = None
+
     if photometry_apertures.variable_aperture:
         # Get a fast, robust estimate of the FWHM of the sources for setting
         # the aperture size.
         fwhm = fast_fwhm_from_image(
-            ccd_image,
+            _mark_saturated(ccd_image, max_data_value),
             photometry_apertures.fwhm_estimate,
             noise=camera.read_noise.value,
             max_adu=camera.max_data_value.value,
+            background=background,
         )
     else:
         # Use the FWHM from the settings
@@ -474,67 +1245,63 @@ def single_image_photometry(
         f"{logline} {in_cnt} of {src_cnt} original sources to have photometry " "done."
     )
 
-    # If we are using x/y positions previously obtained from the ra/dec positions and
-    # WCS, then recentroid the sources to refine the positions. This is
-    # particularly useful is processing multiple images of the same field
-    # and just passing the same sourcelist when calling single_image_photometry
-    # on each image.
+    # Everything below -- recentroiding, the aperture and annulus sums, the
+    # saturation flag and the sky statistics -- is computed from a single
+    # stamp of the image around each source, so no copy of the whole image is
+    # needed. The image mask is applied to all of it, and the saturated and
+    # non-finite pixels are left out of each stamp using max_data_value.
+    #
+    # If we are using x/y positions previously obtained from the ra/dec
+    # positions and WCS, then recentroid the sources to refine the positions.
+    # This is particularly useful is processing multiple images of the same
+    # field and just passing the same sourcelist when calling
+    # single_image_photometry on each image. The center really shouldn't move
+    # more than about the fwhm; sources that move more than the shift
+    # tolerance (these are probably too faint for centroiding to work well),
+    # or whose centroid cannot be computed at all (e.g. because the source is
+    # completely saturated, see #592), keep their WCS-derived position.
     if use_coordinates == "sky":
-        # Apply the image mask (which includes the saturated pixels marked as
-        # NaN above) by setting the masked pixels to NaN; photutils then
-        # automatically masks the non-finite values. We deliberately do not
-        # pass the mask to centroid_sources because photutils raises an error
-        # if a cutout is completely masked, while a completely saturated
-        # source should instead produce a NaN centroid and fall back to its
-        # WCS-derived position below. See #592.
-        if ccd_image.mask is not None:
-            centroid_data = np.where(ccd_image.mask, np.nan, ccd_image.data)
-        else:
-            centroid_data = ccd_image.data
-        try:
-            with warnings.catch_warnings():
-                # photutils warns about the non-finite values it masks; that
-                # is exactly the behavior we want here, so suppress the
-                # warning.
-                warnings.filterwarnings(
-                    "ignore",
-                    message=".*Input data contains non-finite values.*",
-                    category=AstropyUserWarning,
-                )
-                xcen, ycen = centroid_sources(
-                    centroid_data,
-                    xs,
-                    ys,
-                    box_size=2 * int(photometry_apertures.radius_pixels(fwhm)) + 1,
-                )
-        except NoOverlapError:
-            logger.warning(
-                f"{logline} Determining new centroids failed ... "
-                "SKIPPING THIS IMAGE!"
-            )
-            return None, None
-        else:  # Proceed
-            # Calculate offset between centroid in this image and the positions
-            # based on input RA/Dec.
-            center_diff = np.sqrt((xs - xcen) ** 2 + (ys - ycen) ** 2)
-
-            # The center really shouldn't move more than about the fwhm, could
-            # rework this in the future to use that instead.
-            # A non-finite center_diff means centroiding failed (e.g. the
-            # cutout of a completely saturated source is all NaN), so treat
-            # it like too much shift so those sources also fall back to the
-            # WCS-derived position instead of crashing the photometry with a
-            # NaN aperture position. See #592.
-            too_much_shift = ~np.isfinite(center_diff) | (
-                center_diff
-                > photometry_settings.source_location_settings.shift_tolerance
-            )
+        centroid_box_size = 2 * int(photometry_apertures.radius_pixels(fwhm)) + 1
+    else:
+        centroid_box_size = None
+
+    if photometry_options.reject_background_outliers:
+        msg = f"{logline} Computing clipped sky stats ... "
+        sky_sigma = 5
+    else:  # Don't reject outliers (but why would you do this?)
+        logger.warning(
+            f"{logline} SUGGESTION: You are computing sky per pixel "
+            "without clipping (set reject_background_outliers=True "
+            "to perform clipping)."
+        )
+        sky_sigma = None
 
-            # If the shift is too large, use the WCS-derived positions instead
-            # (these sources are probably too faint for centroiding to work well)
-            xcen[too_much_shift] = xs[too_much_shift]
-            ycen[too_much_shift] = ys[too_much_shift]
-            xs, ys = xcen, ycen
+    # The aperture weights are cached by the offset of each source from the
+    # center of its pixel, so they are only computed once for the sources (and
+    # images) that share one.
+    try:
+        stamp_phot = stamp_photometry(
+            ccd_image.data,
+            xs,
+            ys,
+            photometry_apertures.radius_pixels(fwhm),
+            photometry_apertures.inner_annulus,
+            photometry_apertures.outer_annulus,
+            method=photometry_options.partial_pixel_method,
+            mask=ccd_image.mask,
+            max_value=max_data_value,
+            centroid_box_size=centroid_box_size,
+            shift_tolerance=photometry_settings.source_location_settings.shift_tolerance,
+            sky_sigma=sky_sigma,
+        )
+    except NoOverlapError:
+        logger.warning(
+            f"{logline} Extracting the sources from the image failed ... "
+            "SKIPPING THIS IMAGE!"
+        )
+        return None, None
+    xs = stamp_phot["xcenter"].value
+    ys = stamp_phot["ycenter"].value
 
     # Compute RA/Dec if not already provided
     if not sourcelist.has_ra_dec:
@@ -546,54 +1313,28 @@ def single_image_photometry(
             ra = [np.nan] * len(xs)
             dec = [np.nan] * len(ys)
 
-    # Define apertures and annuli for the aperture photometry
-    aper_locs = np.array([xs, ys]).T
-    apers = CircularAperture(aper_locs, r=photometry_apertures.radius_pixels(fwhm))
-    annuli = CircularAnnulus(
-        aper_locs,
-        r_in=photometry_apertures.inner_annulus,
-        r_out=photometry_apertures.outer_annulus,
+    photom = QTable(
+        [
+            xs * u.pixel,
+            ys * u.pixel,
+            stamp_phot["aperture_sum"].value * ccd_image.unit,
+            stamp_phot["annulus_sum"].value * ccd_image.unit,
+        ],
+        names=["xcenter", "ycenter", "aperture_sum", "annulus_sum"],
     )
 
-    # Flag sources whose aperture contains any saturated (or otherwise
-    # non-finite) pixels. Those pixels are excluded from the aperture sum by
-    # the mask, so the sum would silently underestimate the flux of the
-    # source. See #591.
-    if bad_pixels.any():
-        bad_pixel_photom = aperture_photometry(
-            bad_pixels.astype(float),
-            apers,
-            method=photometry_options.partial_pixel_method,
-        )
-        source_is_saturated = np.asarray(bad_pixel_photom["aperture_sum"]) > 0
-    else:
-        source_is_saturated = np.zeros(len(aper_locs), dtype=bool)
-
-    # Perform the aperture photometry
-    photom = aperture_photometry(
-        ccd_image.data,
-        (apers, annuli),
-        mask=ccd_image.mask,
-        method=photometry_options.partial_pixel_method,
-    )
-
-    # photutils 2.1.0 stopped returning pixel units for x/y center
-    # https://photutils.readthedocs.io/en/stable/changelog.html#id6
-    if photom["xcenter"].unit is None:
-        photom["xcenter"] = photom["xcenter"] * u.pixel
-        photom["ycenter"] = photom["ycenter"] * u.pixel
-
     # Add source ids to the photometry table
     photom["star_id"] = star_ids
     photom["ra"] = ra * u.deg
     photom["dec"] = dec * u.deg
 
-    # Flag the sources that have saturated pixels in their aperture (#591)
+    # Flag sources whose aperture contains any saturated (or otherwise
+    # non-finite) pixels. Those pixels are excluded from the aperture sum by
+    # the mask, so the sum would silently underestimate the flux of the
+    # source. See #591.
+    source_is_saturated = stamp_phot["bad_pixel_sum"].value > 0
     photom["saturated"] = source_is_saturated
 
-    # Drop ID column from aperture_photometry()
-    del photom["id"]
-
     # Add various CCD image parameters to the photometry table
     if fname is not None:
         photom["file"] = fname
@@ -618,51 +1359,36 @@ def single_image_photometry(
         photom["airmass"] = [np.nan] * len(photom)
 
     # Save aperture and annulus information
-    photom.rename_column("aperture_sum_0", "aperture_sum")
-    photom.rename_column("aperture_sum_1", "annulus_sum")
-    photom["aperture_sum"].unit = ccd_image.unit
-    photom["annulus_sum"].unit = ccd_image.unit
-    photom["aperture"] = apers.r * u.pixel
-    photom["annulus_inner"] = annuli.r_in * u.pixel
-    photom["annulus_outer"] = annuli.r_out * u.pixel
-    # By convention, area is in units of pixels (not pixels squared) in a digital image
-    photom["aperture_area"] = apers.area * u.pixel
-    photom["annulus_area"] = annuli.area * u.pixel
-
-    if photometry_options.reject_background_outliers:
-        msg = f"{logline} Computing clipped sky stats ... "
-        try:
-            (
-                avg_sky_per_pix,
-                med_sky_per_pix,
-                std_sky_per_pix,
-            ) = clipped_sky_per_pix_stats(ccd_image, annuli)
-        except AttributeError:
-            msg += "BAD ANNULUS ('sky_per_pix' stats set to np.nan) ... "
-            avg_sky_per_pix, med_sky_per_pix, std_sky_per_pix = np.nan, np.nan, np.nan
-        photom["sky_per_pix_avg"] = avg_sky_per_pix / u.pixel
-        photom["sky_per_pix_med"] = med_sky_per_pix / u.pixel
-        photom["sky_per_pix_std"] = std_sky_per_pix / u.pixel
-        msg += "DONE."
-        logger.info(msg)
-
-    else:  # Don't reject outliers (but why would you do this?)
-        logger.warning(
-            f"{logline} SUGGESTION: You are computing sky per pixel "
-            "without clipping (set reject_background_outliers=True "
-            "to perform clipping)."
-        )
-        # Compute the median and standard deviation from the pixels in the
-        # annulus only. These used to be computed from the rectangular
-        # bounding box of the annulus, which includes the core of the star
-        # (inside the inner radius) and the corners outside the annulus,
-        # wildly inflating the reported standard deviation. See #602.
-        # ApertureStats also respects the image mask, which includes the
-        # saturated pixels marked as NaN above (#591).
-        ap_stats = ApertureStats(ccd_image, annuli, sum_method="center")
-        photom["sky_per_pix_avg"] = photom["annulus_sum"] / photom["annulus_area"]
-        photom["sky_per_pix_med"] = ap_stats.median / u.pixel
-        photom["sky_per_pix_std"] = ap_stats.std / u.pixel
+    radius = photometry_apertures.radius_pixels(fwhm)
+    inner_radius = photometry_apertures.inner_annulus
+    outer_radius = photometry_apertures.outer_annulus
+    photom["aperture"] = radius * u.pixel
+    photom["annulus_inner"] = inner_radius * u.pixel
+    photom["annulus_outer"] = outer_radius * u.pixel
+    # By convention, area is in units of pixels (not pixels squared) in a digital
+    # image. These are the exact geometric areas, as photutils uses.
+    photom["aperture_area"] = np.pi * radius**2 * u.pixel
+    photom["annulus_area"] = np.pi * (outer_radius**2 - inner_radius**2) * u.pixel
+
+    sky_unit = ccd_image.unit / u.pixel
+    if background is not None:
+        # The mesh gives one value of the sky at each source, so the mean and
+        # median are the same.
+        sky = background.background_at(xs, ys) * sky_unit
+        photom["sky_per_pix_avg"] = sky
+        photom["sky_per_pix_med"] = sky
+        photom["sky_per_pix_std"] = background.rms_at(xs, ys) * sky_unit
+    else:
+        # The sky statistics come from the pixels in the annulus only (#602),
+        # leaving out masked pixels, including the saturated ones (#591).
+        if photometry_options.reject_background_outliers:
+            photom["sky_per_pix_avg"] = stamp_phot["sky_mean"].value * sky_unit
+            msg += "DONE."
+            logger.info(msg)
+        else:
+            photom["sky_per_pix_avg"] = photom["annulus_sum"] / photom["annulus_area"]
+        photom["sky_per_pix_med"] = stamp_phot["sky_median"].value * sky_unit
+        photom["sky_per_pix_std"] = stamp_phot["sky_std"].value * sky_unit
 
     # Compute counts using clipped stats on sky per pixel
     photom["aperture_net_cnts"] = photom["aperture_sum"].value - (
@@ -681,6 +1407,7 @@ def single_image_photometry(
             fwhm_estimate=photometry_apertures.fwhm_estimate,
             fit_method=photometry_options.fwhm_method,
             sky_per_pix_column="sky_per_pix_avg",
+            max_adu=max_data_value,
         )
         num_warnings = len(warned)
         msg += f"fitting failed on {num_warnings} of {len(photom)} sources  ... "
@@ -732,14 +1459,19 @@ def single_image_photometry(
         camera.gain.value * photom["aperture_net_cnts"].value / photom["exposure"].value
     )
 
-    # Compute and save noise
+    # Compute and save noise. The error of a sky from the background mesh
+    # depends on the pixels behind the mesh, not on the annulus.
+    if background is not None:
+        sky_area = background.equivalent_area
+    else:
+        sky_area = photom["annulus_area"].value
     msg = f"{logline} Calculating noise for all sources ... "
     noise = calculate_noise(
         camera=camera,
         counts=photom["aperture_net_cnts"].value,
         sky_per_pix=photom["sky_per_pix_avg"].value,
         aperture_area=photom["aperture_area"].value,
-        annulus_area=photom["annulus_area"].value,
+        annulus_area=sky_area,
         exposure=photom["exposure"].value,
         include_digitization=photometry_options.include_dig_noise,
     )
@@ -772,16 +1504,340 @@ def single_image_photometry(
         camera=camera,
         input_data=photom,
         passband_map=passband_map,
+        copy=False,
     )
 
     return photom_data, dropped_sources
 
 
+def _check_directory_source_list(photometry_settings):
+    """
+    Raise an error if the source list cannot be used for a directory of images.
+    """
+    sourcelist = _read_source_list(
+        photometry_settings.source_location_settings.source_list_file
+    )
+
+    # Confirm sourcelist has ra/dec coordinates
+    if not sourcelist.has_ra_dec:
+        raise ValueError(
+            "multi_image_photometry: sourcelist must have RA/Dec "
+            "coordinates to use this function."
+        )
+
+
+def _setup_directory_logging(directory_with_images, photometry_settings):
+    """
+    Set up the logging for photometry on a directory of images.
+
+    If logging to a file, the log file is redirected into
+    ``directory_with_images`` and ``photometry_settings`` is updated so that
+    `single_image_photometry` writes to the same file.
+
+    Returns
+    -------
+    logger : `logging.Logger`
+        The ``multi_image_photometry`` logger.
+
+    file_handler : `logging.FileHandler` or None
+        The file handler that was created, if any.
+    """
+    # Remove any handlers we added on a previous call but leave handlers the
+    # caller (or other libraries) installed in place.
+    multilogger = logging.getLogger("multi_image_photometry")
+    _remove_our_handlers(multilogger)
+
+    logfile = photometry_settings.logging_settings.logfile
+    console_log = photometry_settings.logging_settings.console_log
+
+    # If logging to a file, redirect the logfile into the image directory and
+    # update the settings so single_image_photometry writes to the same file.
+    if logfile is not None:
+        # Redirect the logfile (keeping just its name) to directory_with_images
+        logfile = Path(directory_with_images) / Path(logfile).name
+        # Change the settings so when they are passed to single_image_photometry
+        # the logging will be written to the same logfile
+        photometry_settings.logging_settings.logfile = str(logfile)
+
+    fh = _add_log_handlers(multilogger, logfile, console_log)
+    return multilogger, fh
+
+
+def _finish_directory_logging(directory_with_images, photometry_settings, logger, fh):
+    """
+    Log the end of photometry on a directory and remove the handlers we added.
+    """
+    logfile = photometry_settings.logging_settings.logfile
+    console_log = photometry_settings.logging_settings.console_log
+
+    logger.info(f"  DONE processing all matching images in {directory_with_images}")
+    if logfile is not None and not console_log:
+        print(f"  DONE processing all matching images in {directory_with_images}")
+
+    # Close the logfile if it is open
+    if fh is not None:
+        fh.flush()
+        fh.close()
+    # Remove only the handlers we added
+    _remove_our_handlers(logger)
+
+
+def _directory_photometry(
+    directory_with_images,
+    photometry_settings,
+    object_of_interest,
+    workers,
+    logger,
+    checkpoint_dir=None,
+    read_sections=False,
+    register_frames=False,
+    index_path=None,
+):
+    """
+    Perform photometry on each matching image in a directory, in order.
+
+    Yields the file name, photometry and dropped sources for each image on
+    which photometry succeeded. Logging must already have been set up. If
+    ``checkpoint_dir`` is not ``None``, the result for each image is stored
+    there and images that already have a stored result are not redone. If
+    ``read_sections`` is true, only the sections of each image that the
+    photometry needs are read. If ``register_frames`` is true, images without
+    a WCS are registered to the first image that has one. The headers are
+    indexed in ``index_path``; see `HeaderIndex`.
+    """
+    ##
+    ## Process all the individual files
+    ##
+
+    # Only the headers of images that are new or have changed since the last
+    # run are read.
+    with HeaderIndex(directory_with_images, index_path=index_path) as header_index:
+        header_index.update()
+        paths = header_index.files_filtered(
+            object=object_of_interest, include_path=True
+        )
+        if register_frames:
+            references = header_index.files_filtered(
+                object=object_of_interest, has_wcs=True, include_path=True
+            )
+        else:
+            references = []
+
+    n_files_processed = 0
+
+    msg = f"Starting photometry of files in {directory_with_images} ... "
+    logfile = photometry_settings.logging_settings.logfile
+    if logfile is not None:
+        msg += f"logging output to {Path(logfile).name}"
+        # If not logging to console, print message here
+        if not photometry_settings.logging_settings.console_log:
+            print(msg)
+    logger.info(msg)
+
+    # Suppress the FITSFixedWarning that is raised when reading a FITS file header
+    warnings.filterwarnings("ignore", category=FITSFixedWarning)
+
+    registration = None
+    if references:
+        reference = references[0]
+        registration = FrameRegistration(
+            fits_ccddata_reader(reference, hdu=header_index.ext)
+        )
+        logger.info(f"  Registering images without a WCS to {Path(reference).name}")
+    elif register_frames:
+        logger.warning("  No image has a WCS, so images cannot be registered")
+
+    # Only do photometry on the images that do not have a stored result
+    if checkpoint_dir is not None:
+        checkpoint = PhotometryCheckpoint(checkpoint_dir, photometry_settings)
+        done = {path for path in paths if checkpoint.is_done(path)}
+        if registration is not None:
+            # Images that were skipped for not having a WCS can now be done
+            with_wcs = set(references)
+            done = {
+                path for path in done if path in with_wcs or checkpoint.has_wcs(path)
+            }
+        logger.info(
+            f"  Using stored photometry for {len(done)} of {len(paths)} images "
+            f"from {checkpoint_dir}"
+        )
+    else:
+        checkpoint = None
+        done = set()
+    to_do = [path for path in paths if path not in done]
+
+    # Process all the files
+    if workers is not None and workers > 1:
+        frame_results = _parallel_frame_photometry(
+            to_do,
+            header_index.ext,
+            photometry_settings,
+            logger,
+            workers,
+            read_sections=read_sections,
+            registration=registration,
+        )
+    else:
+        frame_results = _serial_frame_photometry(
+            to_do,
+            header_index.ext,
+            photometry_settings,
+            logger,
+            read_sections=read_sections,
+            registration=registration,
+        )
+
+    try:
+        for full_path in paths:
+            if full_path in done:
+                this_fname, has_wcs, this_phot, this_missing_sources = checkpoint.load(
+                    full_path
+                )
+                logger.info(
+                    f"multi_image_photometry: Using stored photometry for {this_fname}"
+                )
+            else:
+                this_fname, has_wcs, this_phot, this_missing_sources = next(
+                    frame_results
+                )
+                if checkpoint is not None:
+                    checkpoint.record(
+                        full_path, has_wcs, this_phot, this_missing_sources
+                    )
+
+            if not has_wcs:
+                continue
+
+            n_files_processed += 1
+            if (this_phot is None) or (this_missing_sources is None):
+                logger.info("  single_image_photometry failed for this image.")
+            else:
+                logger.info(f"  Done with single_image_photometry for {this_fname}\n\n")
+                yield this_fname, this_phot, this_missing_sources
+    finally:
+        # Make sure a pool of workers is shut down if the consumer stops early
+        frame_results.close()
+
+    if n_files_processed == 0:
+        raise RuntimeError("No images were processed!")
+
+
+def iter_image_photometry(
+    directory_with_images,
+    photometry_settings,
+    object_of_interest=None,
+    workers=None,
+    checkpoint_dir=None,
+    read_sections=False,
+    register_frames=False,
+    index_path=None,
+):
+    """
+    Perform aperture photometry on a directory of images, one image at a time.
+
+    This is a generator that yields the photometry for each image as soon as
+    it is done, so that the results can be used (e.g. written to disk, plotted
+    or used for differential photometry) while the rest of the images are
+    processed, without holding the photometry of every image in memory.
+
+    Parameters
+    ----------
+
+    directory_with_images : str
+        Folder containing the images on which to do photometry. See
+        `multi_image_photometry` for the requirements on the images.
+
+    photometry_settings : `stellarphot.settings.PhotometrySettings`
+        Photometry settings to use for the photometry.
+
+    object_of_interest : str, optional (Default: None)
+        Name of the object of interest. The only files on which photometry
+        will be done are those whose header contains the keyword ``OBJECT``
+        whose value is ``object_of_interest``.
+
+    workers : int, optional (Default: None)
+        Number of worker processes to use. See `multi_image_photometry` for
+        details. The images are yielded in the same order regardless of the
+        number of workers.
+
+    checkpoint_dir : str or Path, optional (Default: None)
+        Directory in which to store the photometry of each image as it is
+        done. See `multi_image_photometry` for details.
+
+    read_sections : bool, optional (Default: False)
+        If ``True``, only read the parts of each image that the photometry
+        needs. See `multi_image_photometry` for details.
+
+    register_frames : bool, optional (Default: False)
+        If ``True``, images without a WCS are registered to an image that has
+        one instead of being skipped. See `multi_image_photometry` for
+        details.
+
+    index_path : str or Path, optional (Default: None)
+        Where to keep the index of the image headers. See
+        `multi_image_photometry` for details.
+
+    Yields
+    ------
+
+    fname : str
+        Name of the image file.
+
+    phot_table : `stellarphot.PhotometryData`
+        Photometry data for the sources in this image.
+
+    dropped_sources : list
+        The star_ids of the sources that did not have photometry done on this
+        image.
+
+    Raises
+    ------
+
+    ValueError
+        If the source list does not have RA/Dec coordinates.
+
+    RuntimeError
+        If there were no images on which photometry could be done.
+
+    Notes
+    -----
+    Images on which photometry fails are logged and skipped. Sources are never
+    rejected for being missing from other images (the ``reject_unmatched``
+    option of `multi_image_photometry`), because that requires all of the
+    images; use the ``dropped_sources`` from each image to do that if needed.
+    """
+    _check_directory_source_list(photometry_settings)
+    multilogger, fh = _setup_directory_logging(
+        directory_with_images, photometry_settings
+    )
+    try:
+        yield from _directory_photometry(
+            directory_with_images,
+            photometry_settings,
+            object_of_interest,
+            workers,
+            multilogger,
+            checkpoint_dir=checkpoint_dir,
+            read_sections=read_sections,
+            register_frames=register_frames,
+            index_path=index_path,
+        )
+    finally:
+        _finish_directory_logging(
+            directory_with_images, photometry_settings, multilogger, fh
+        )
+
+
 def multi_image_photometry(
     directory_with_images,
     photometry_settings,
     reject_unmatched=True,
     object_of_interest=None,
+    workers=None,
+    checkpoint_dir=None,
+    read_sections=False,
+    register_frames=False,
+    index_path=None,
 ):
     """
     Perform aperture photometry on a directory of images.
@@ -792,7 +1848,8 @@ def multi_image_photometry(
     directory_with_images : str
         Folder containing the images on which to do photometry. Photometry
         will only be done on images that contain the ``object_of_interest``.
-        All images *must* have WCS headers and the following headers: OBJECT,
+        All images *must* have WCS headers, unless ``register_frames`` is
+        ``True``, and the following headers: OBJECT,
         DATE-OBS, an exposure time header (which can be any of the following: EXPOSURE,
         EXPTIME, TELAPSE, ELAPTIME, ONTIME, or LIVETIME), and FILTER.  If AIRMASS is
         available it will be added to `phot_table`.
@@ -815,6 +1872,45 @@ def multi_image_photometry(
         whose value is ``object_of_interest``. *Only used for multi-image
         photometry* to select which files to perform photometry on.
 
+    workers : int, optional (Default: None)
+        Number of worker processes to use. If ``None`` or 1, the images are
+        processed one at a time in this process. Otherwise photometry is done
+        on up to ``workers`` images at once in a pool of processes. The result
+        is the same as when the images are processed one at a time: the rows
+        are in the same order, and the messages logged for each image are
+        written by this process, in image order.
+
+    checkpoint_dir : str or Path, optional (Default: None)
+        Directory in which to store the photometry of each image as it is
+        done, using `~stellarphot.photometry.PhotometryCheckpoint`. Images
+        that already have a result stored there, and that have not changed
+        since, are not redone, so an interrupted run can be resumed and new
+        images added to ``directory_with_images`` only need photometry on the
+        new images. Stored results are discarded if the photometry settings or
+        the source list change.
+
+    read_sections : bool, optional (Default: False)
+        If ``True``, each image is memory-mapped and only the sections around
+        the sources are read, using `read_image_sections`, which keeps the
+        memory used by each worker small for large images. The photometry is
+        the same.
+
+    register_frames : bool, optional (Default: False)
+        If ``True``, images without a WCS are not skipped. Instead the shift,
+        found with `~stellarphot.photometry.FrameRegistration`, between each
+        of them and the first matching image that has a WCS is used to move
+        that WCS to match the image. This takes a fraction of a second per
+        image, much less than solving the image. Images that cannot be
+        registered, e.g. because they are of a different field, are skipped.
+
+    index_path : str or Path, optional (Default: None)
+        Path of the `~stellarphot.photometry.HeaderIndex` database used to
+        select the images, so that only the headers of new or changed images
+        are read on later runs. By default it is the file
+        ``.stellarphot_headers.sqlite`` in ``directory_with_images``. Use
+        ``":memory:"`` to keep the index in memory and write nothing to the
+        image directory.
+
     Returns
     -------
 
@@ -825,94 +1921,39 @@ def multi_image_photometry(
         or to each other for successful aperture photometry.
 
     """
-    sourcelist = SourceListData.read(
-        photometry_settings.source_location_settings.source_list_file
-    )
+    _check_directory_source_list(photometry_settings)
 
     # Initialize lists to track all PhotometryData objects and all dropped sources
     phots = []
     missing_sources = []
 
-    # Confirm sourcelist has ra/dec coordinates
-    if not sourcelist.has_ra_dec:
-        raise ValueError(
-            "multi_image_photometry: sourcelist must have RA/Dec "
-            "coordinates to use this function."
-        )
-
-    # Set up logging. Remove any handlers we added on a previous call but leave
-    # handlers the caller (or other libraries) installed in place.
-    multilogger = logging.getLogger("multi_image_photometry")
-    _remove_our_handlers(multilogger)
-
-    logfile = photometry_settings.logging_settings.logfile
-    console_log = photometry_settings.logging_settings.console_log
-
-    # If logging to a file, redirect the logfile into the image directory and
-    # update the settings so single_image_photometry writes to the same file.
-    logfile_name = None
-    if logfile is not None:
-        # Redirect the logfile (keeping just its name) to directory_with_images
-        logfile = Path(directory_with_images) / Path(logfile).name
-        # Change the settings so when they are passed to single_image_photometry
-        # the logging will be written to the same logfile
-        photometry_settings.logging_settings.logfile = str(logfile)
-        # Keep original name without path
-        logfile_name = str(Path(logfile).name)
-
-    fh = _add_log_handlers(multilogger, logfile, console_log)
-
-    ##
-    ## Process all the individual files
-    ##
-
-    # Build image file collection
-    ifc = ImageFileCollection(directory_with_images)
-
-    n_files_processed = 0
-
-    msg = f"Starting photometry of files in {directory_with_images} ... "
-    if logfile is not None:
-        msg += f"logging output to {logfile_name}"
-        # If not logging to console, print message here
-        if not console_log:
-            print(msg)
-    multilogger.info(msg)
-
-    # Suppress the FITSFixedWarning that is raised when reading a FITS file header
-    warnings.filterwarnings("ignore", category=FITSFixedWarning)
-
-    # Process all the files
-    for this_ccd, this_fname in ifc.ccds(object=object_of_interest, return_fname=True):
-        multilogger.info(f"multi_image_photometry: Processing image {this_fname}")
-        if this_ccd.wcs is None:
-            multilogger.warning("                   .... SKIPPING THIS IMAGE (NO WCS)")
-            continue
+    multilogger, fh = _setup_directory_logging(
+        directory_with_images, photometry_settings
+    )
 
-        # Call single_image_photometry on each image
-        n_files_processed += 1
-        multilogger.info("  Calling single_image_photometry ...")
-        this_phot, this_missing_sources = single_image_photometry(
-            this_ccd,
+    try:
+        for _, this_phot, this_missing_sources in _directory_photometry(
+            directory_with_images,
             photometry_settings,
-            fname=this_fname,
-            logline="    >",
-        )
-        if (this_phot is None) or (this_missing_sources is None):
-            multilogger.info("  single_image_photometry failed for this image.")
-        else:
-            multilogger.info(
-                f"  Done with single_image_photometry for {this_fname}\n\n"
-            )
-
+            object_of_interest,
+            workers,
+            multilogger,
+            checkpoint_dir=checkpoint_dir,
+            read_sections=read_sections,
+            register_frames=register_frames,
+            index_path=index_path,
+        ):
             # Extend the list of missing stars
             missing_sources.extend(this_missing_sources)
 
             # And add the final table to the list of tables
             phots.append(this_phot)
-
-    if n_files_processed == 0:
-        raise RuntimeError("No images were processed!")
+    except Exception:
+        # Do not leave our handlers (and the log file) open on failure
+        if fh is not None:
+            fh.close()
+        _remove_our_handlers(multilogger)
+        raise
 
     ##
     ## Done processing individual images, now combine them into one table
@@ -947,22 +1988,39 @@ def multi_image_photometry(
         msg += "DONE."
         multilogger.info(msg)
 
-    multilogger.info(
-        f"  DONE processing all matching images in {directory_with_images}"
+    _finish_directory_logging(
+        directory_with_images, photometry_settings, multilogger, fh
     )
-    if logfile is not None and not console_log:
-        print(f"  DONE processing all matching images in {directory_with_images}")
-
-    # Close the logfile if it is open
-    if logfile is not None:
-        fh.flush()
-        fh.close()
-    # Remove only the handlers we added
-    _remove_our_handlers(multilogger)
 
     return all_phot
 
 
+@lru_cache(maxsize=4)
+def _nearest_neighbor_distances(positions_bytes):
+    """
+    Distance from each position to its nearest neighbor.
+
+    The positions are passed as the bytes of a (2, N) float array so that the
+    result can be cached: photometry on a sequence of images calls
+    `find_too_close` with the same source list for every image.
+
+    A KD-tree is used so that this takes O(N log N) time and O(N) memory
+    rather than building the full N x N matrix of distances. Sources whose
+    position is not finite, and sources with no neighbor, have a distance of
+    ``inf``.
+    """
+    positions = np.frombuffer(positions_bytes, dtype=float).reshape(2, -1).T
+    nearest = np.full(len(positions), np.inf)
+    finite = np.isfinite(positions).all(axis=1)
+    if finite.sum() > 1:
+        distances, _ = KDTree(positions[finite]).query(positions[finite], k=2)
+        # The nearest point to each position is the position itself
+        nearest[finite] = distances[:, 1]
+    # This is cached, so make sure it is not modified by the caller
+    nearest.flags.writeable = False
+    return nearest
+
+
 def find_too_close(sourcelist, aperture_rad, pixel_scale=None):
     """
     Identify sources that are closer together than twice the aperture radius.
@@ -991,6 +2049,12 @@ def find_too_close(sourcelist, aperture_rad, pixel_scale=None):
     numpy array of bool
         Array the same length as the RA/Dec that is ``True`` where the sources
         are closer than two aperture radii, ``False`` otherwise.
+
+    Notes
+    -----
+    When x/y positions are used, sources whose position is not finite are
+    never flagged and are ignored when finding the neighbors of the other
+    sources.
     """
     if not isinstance(sourcelist, SourceListData):
         raise TypeError(
@@ -1001,13 +2065,17 @@ def find_too_close(sourcelist, aperture_rad, pixel_scale=None):
         raise TypeError(f"pixel_scale must be a float not '{type(pixel_scale)}'")
 
     if sourcelist.has_x_y:
-        x, y = sourcelist["xcenter"], sourcelist["ycenter"]
+        positions = np.array(
+            [
+                np.asarray(sourcelist["xcenter"], dtype=float),
+                np.asarray(sourcelist["ycenter"], dtype=float),
+            ]
+        )
         # Find the pixel distance to the nearest neighbor for each source
-        dist_mat = cdist(np.array([x, y]).T, np.array([x, y]).T, metric="euclidean")
-        np.fill_diagonal(dist_mat, np.inf)
+        nearest = _nearest_neighbor_distances(positions.tobytes())
         # Return array with True where the distance is less than twice the aperture
         # radius
-        return dist_mat.min(0) < 2 * aperture_rad
+        return nearest < 2 * aperture_rad
     elif sourcelist.has_ra_dec:
         if pixel_scale is None:
             raise ValueError(
@@ -1031,7 +2099,7 @@ def clipped_sky_per_pix_stats(data, annulus, sigma=5, iters=5):
     ----------
 
     data : `astropy.nddata.CCDData`
-        CCD image on which the annuli are defined.
+        CCD image on which the annuli are defined. Its mask, if any, is used.
 
     annulus : `photutils.CircularAnnulus`
         One or more annulus (of any shape) from photutils.
@@ -1050,16 +2118,40 @@ def clipped_sky_per_pix_stats(data, annulus, sigma=5, iters=5):
     avg_sky_per_pix, med_sky_per_pix, std_sky_per_pix : `astropy.units.Quantity`
         Average, median and standard deviation of the sky per pixel.
 
+    Notes
+    -----
+    The pixels used are those whose center is in the annulus, leaving out
+    masked and non-finite pixels, as in `photutils.aperture.ApertureStats`.
+    The clipping is done for all of the annuli at once rather than one at a
+    time.
     """
-    # Use ApertureStats from photutils to get what we need.
-    sigclip = SigmaClip(sigma=sigma, maxiters=iters)
-    ap_stats = ApertureStats(data, annulus, sigma_clip=sigclip, sum_method="center")
-
-    return (
-        ap_stats.mean,
-        ap_stats.median,
-        ap_stats.std,
-    )
+    if isinstance(data, NDData):
+        mask, wcs, unit = data.mask, data.wcs, data.unit
+        data = data.data
+    else:
+        mask, wcs, unit = None, None, getattr(data, "unit", None)
+        data = u.Quantity(data).value
+    if unit is None:
+        unit = 1
+    if isinstance(annulus, SkyAperture):
+        annulus = annulus.to_pixel(wcs)
+
+    aperture_masks = annulus.to_mask(method="center")
+    if annulus.isscalar:
+        aperture_masks = [aperture_masks]
+    pixels = [
+        aperture_mask.get_values(data, mask=mask) for aperture_mask in aperture_masks
+    ]
+
+    # Put the pixels of each annulus in a row, padded with NaN
+    lengths = np.array([len(annulus_pixels) for annulus_pixels in pixels])
+    sky = np.full((len(pixels), lengths.max()), np.nan)
+    sky[np.arange(lengths.max()) < lengths[:, np.newaxis]] = np.concatenate(pixels)
+
+    stats = clipped_statistics(sky, sigma=sigma, iters=iters)
+    if annulus.isscalar:
+        stats = [stat[0] for stat in stats]
+    return tuple(stat * unit for stat in stats)
 
 
 def calculate_noise(
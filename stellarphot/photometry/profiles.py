@@ -3,13 +3,14 @@ import warnings
 import numpy as np
 from astropy.nddata import Cutout2D
 from astropy.nddata.utils import NoOverlapError
-from astropy.stats import sigma_clipped_stats
 from astropy.utils import lazyproperty
 from photutils.centroids import centroid_2dg, centroid_com
 from photutils.profiles import CurveOfGrowth, RadialProfile
 
 from stellarphot.photometry import calculate_noise
 
+from .image_statistics import fast_sigma_clipped_stats
+
 __all__ = ["find_center", "CenterAndProfile"]
 
 
@@ -83,7 +84,7 @@ def find_center(image, center_guess, cutout_size=30, max_iters=10, match_limit=3
     # Grab the cutout...
     sub_data = Cutout2D(image, center_guess, (cutout_size, cutout_size), mode="trim")
     # ...do stats on it...
-    _, sub_med, _ = sigma_clipped_stats(sub_data.data)
+    _, sub_med, _ = fast_sigma_clipped_stats(sub_data.data)
     # ...and centroid.
 
     # Exclude negative pixels from initial centroid. If there is a dim star this helps
@@ -109,7 +110,7 @@ def find_center(image, center_guess, cutout_size=30, max_iters=10, match_limit=3
             raise RuntimeError(
                 f"Centroid finding failed, previous was {ceno}, current is {cen}"
             ) from err
-        _, sub_med, _ = sigma_clipped_stats(sub_data.data)
+        _, sub_med, _ = fast_sigma_clipped_stats(sub_data.data)
 
         mask = (sub_data.data - sub_med) < 0
         x_cm, y_cm = centroid_com(sub_data.data - sub_med, mask=mask)
@@ -204,7 +205,7 @@ class CenterAndProfile:
         radii = np.linspace(0, profile_radius, profile_radius + 1)
         # Get a rough profile with rough background subtraction -- note that
         # NO background subtraction does not work.
-        background = sigma_clipped_stats(self.profile_cutout.data)[1]
+        background = fast_sigma_clipped_stats(self.profile_cutout.data)[1]
         self._radial_profile = RadialProfile(
             self.profile_cutout.data - background, self.cutout_center, radii
         )
@@ -333,7 +334,7 @@ class CenterAndProfile:
         dist_from_star = np.sqrt((grid_x - x_s) ** 2 + (grid_y - y_s) ** 2)
         mask = dist_from_star > self.FWHM * 3
         self._sky_area = mask.sum()
-        _, median, _ = sigma_clipped_stats(self.profile_cutout.data[mask])
+        _, median, _ = fast_sigma_clipped_stats(self.profile_cutout.data[mask])
         return median
 
     @lazyproperty
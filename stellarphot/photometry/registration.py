@@ -0,0 +1,429 @@
+import numpy as np
+from astropy.nddata import NDData
+
+from .image_statistics import fast_sigma_clipped_stats
+
+__all__ = ["FrameRegistration", "FrameTransform"]
+
+
+def _image_arrays(image):
+    """
+    The data and mask of an image, and the median and standard deviation of
+    its sky.
+    """
+    if isinstance(image, NDData):
+        data, mask = image.data, image.mask
+    else:
+        data, mask = np.ma.getdata(image), np.ma.getmask(image)
+    if mask is np.ma.nomask:
+        mask = None
+    _, median, std = fast_sigma_clipped_stats(image)
+    if not std > 0:
+        std = 1
+    # Python floats keep the scaled images in single precision
+    return data, mask, float(median), float(std)
+
+
+def _prepared(data, mask, median, std):
+    """
+    Part of an image scaled for cross-correlation: the sky is zero, the noise
+    is one, and pixels that are masked, not finite or far above the noise are
+    limited so that the brightest stars do not dominate.
+    """
+    prepared = (np.asarray(data, dtype=np.float32) - median) / std
+    bad = ~np.isfinite(prepared)
+    if mask is not None:
+        bad |= mask
+    prepared[bad] = 0
+    return np.clip(prepared, 0, 50, out=prepared)
+
+
+def _block_mean(data, block_size):
+    """
+    The mean of each block of an image, leaving out the partial blocks at the
+    edges. Blocks with a pixel that is not finite are not finite.
+    """
+    n_y, n_x = (size // block_size for size in data.shape)
+    data = data[: n_y * block_size, : n_x * block_size]
+    # Adding up strided views is faster than reducing a reshaped image
+    total = np.zeros((n_y, n_x), dtype=np.float32)
+    for y in range(block_size):
+        for x in range(block_size):
+            total += data[y::block_size, x::block_size]
+    return total / block_size**2
+
+
+def _reduced(image_arrays, block_size):
+    """
+    A block-reduced copy of an image scaled for cross-correlation.
+
+    Reducing the image before scaling it means that only the reduced image
+    is scaled, which is much faster for a large image.
+    """
+    data, mask, median, std = image_arrays
+    reduced = _block_mean(data, block_size)
+    if mask is not None:
+        reduced_mask = _block_mean(mask, block_size) > 0
+    else:
+        reduced_mask = None
+    # The noise of the mean of a block is smaller than that of a pixel
+    return _prepared(reduced, reduced_mask, median, std / block_size)
+
+
+def _correlation_peak(reference, image):
+    """
+    The shift of ``image`` relative to ``reference`` (both the same shape),
+    found from the peak of their phase correlation, and the significance of
+    the peak.
+
+    The shift is ``(dy, dx)`` such that a feature at ``(y, x)`` in the
+    reference is at ``(y + dy, x + dx)`` in the image. It is refined to a
+    fraction of a pixel by fitting a parabola to the peak along each axis.
+    """
+    cross_power = np.conj(np.fft.rfft2(reference)) * np.fft.rfft2(image)
+    # Whitening the cross power spectrum makes the peak sharp
+    cross_power /= np.abs(cross_power) + 1e-12 * np.abs(cross_power).max()
+    correlation = np.fft.irfft2(cross_power, s=reference.shape)
+
+    peak = np.unravel_index(np.argmax(correlation), correlation.shape)
+    significance = (correlation[peak] - correlation.mean()) / correlation.std()
+
+    shift = []
+    for axis, (index, size) in enumerate(zip(peak, correlation.shape, strict=True)):
+        neighbors = list(peak)
+        values = []
+        for offset in (-1, 0, 1):
+            neighbors[axis] = (index + offset) % size
+            values.append(correlation[tuple(neighbors)])
+        below, center, above = values
+        curvature = below - 2 * center + above
+        offset = 0.5 * (below - above) / curvature if curvature < 0 else 0
+        # Shifts of more than half the size wrap around
+        shift.append((index + offset + size / 2) % size - size / 2)
+    return np.array(shift), significance
+
+
+def _window(image_arrays, y, x, half):
+    """
+    The square window of an image centered on ``(y, x)``, scaled for
+    cross-correlation.
+    """
+    data, mask, median, std = image_arrays
+    window = np.s_[y - half : y + half, x - half : x + half]
+    return _prepared(data[window], None if mask is None else mask[window], median, std)
+
+
+def _fit_rigid(positions, moved):
+    """
+    The rotation and translation that best take ``positions`` to ``moved``,
+    both arrays of ``(x, y)``, in the least squares sense.
+    """
+    positions_mean = positions.mean(axis=0)
+    moved_mean = moved.mean(axis=0)
+    p = positions - positions_mean
+    q = moved - moved_mean
+    rotation = np.arctan2((p[:, 0] * q[:, 1] - p[:, 1] * q[:, 0]).sum(), (p * q).sum())
+    transform = FrameTransform(0, 0, rotation)
+    transform.dx, transform.dy = moved_mean - np.array(
+        transform.to_frame(*positions_mean)
+    )
+    return transform
+
+
+class FrameTransform:
+    """
+    A translation and rotation that takes pixel positions in a reference
+    frame to pixel positions in another frame of the same field.
+
+    A position ``(x, y)`` in the reference frame is at
+    ``R @ (x, y) + (dx, dy)`` in the other frame, where ``R`` is the rotation
+    by ``rotation`` (counterclockwise, i.e. from the x axis towards the y
+    axis) about pixel ``(0, 0)``.
+
+    Parameters
+    ----------
+
+    dx, dy : float
+        The translation, in pixels.
+
+    rotation : float, optional (default=0)
+        The rotation, in radians.
+
+    Attributes
+    ----------
+
+    dx, dy : float
+        The translation, in pixels.
+
+    rotation : float
+        The rotation, in radians.
+    """
+
+    def __init__(self, dx, dy, rotation=0.0):
+        self.dx = float(dx)
+        self.dy = float(dy)
+        self.rotation = float(rotation)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(dx={self.dx:.3f}, dy={self.dy:.3f}, "
+            f"rotation={self.rotation:.3g})"
+        )
+
+    @property
+    def matrix(self):
+        """
+        The rotation matrix ``R``.
+        """
+        cos, sin = np.cos(self.rotation), np.sin(self.rotation)
+        return np.array([[cos, -sin], [sin, cos]])
+
+    def to_frame(self, x, y):
+        """
+        The positions in the frame of positions in the reference frame.
+
+        Parameters
+        ----------
+
+        x, y : float or array-like
+            Positions in the reference frame, in pixels.
+
+        Returns
+        -------
+
+        x, y : `numpy.ndarray`
+            The positions in the frame.
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        (a, b), (c, d) = self.matrix
+        return a * x + b * y + self.dx, c * x + d * y + self.dy
+
+    def to_reference(self, x, y):
+        """
+        The positions in the reference frame of positions in the frame.
+
+        Parameters
+        ----------
+
+        x, y : float or array-like
+            Positions in the frame, in pixels.
+
+        Returns
+        -------
+
+        x, y : `numpy.ndarray`
+            The positions in the reference frame.
+        """
+        x = np.asarray(x, dtype=float) - self.dx
+        y = np.asarray(y, dtype=float) - self.dy
+        # The inverse of a rotation is its transpose
+        (a, b), (c, d) = self.matrix
+        return a * x + c * y, b * x + d * y
+
+    def transform_wcs(self, wcs):
+        """
+        The WCS of the frame, given the WCS of the reference frame.
+
+        Parameters
+        ----------
+
+        wcs : `astropy.wcs.WCS`
+            The WCS of the reference frame.
+
+        Returns
+        -------
+
+        `astropy.wcs.WCS`
+            A copy of ``wcs`` with its reference pixel moved and, if there is
+            a rotation, its linear transformation rotated, so that it gives
+            the sky position of each pixel of the frame.
+
+        Notes
+        -----
+        Distortions, e.g. SIP polynomials, are kept as they are. That is
+        exact for a translation and a good approximation for the small
+        rotations between frames of a sequence.
+        """
+        wcs = wcs.deepcopy()
+        # CRPIX counts pixels from 1
+        crpix_x, crpix_y = self.to_frame(*(wcs.wcs.crpix - 1))
+        wcs.wcs.crpix = [crpix_x + 1, crpix_y + 1]
+        if self.rotation:
+            if wcs.wcs.has_cd():
+                wcs.wcs.cd = wcs.wcs.cd @ self.matrix.T
+            else:
+                wcs.wcs.pc = wcs.wcs.get_pc() @ self.matrix.T
+        wcs.wcs.set()
+        return wcs
+
+
+class FrameRegistration:
+    """
+    Find the translation, and optionally the rotation, between a reference
+    frame and other frames of the same field by cross-correlation.
+
+    The shift is first found roughly, to within a few pixels, by phase
+    correlation of block-reduced copies of the whole frames. It is then
+    refined to a fraction of a pixel by phase correlation of full resolution
+    windows at a grid of places in the frames. The translation is the median
+    of the shifts of the windows, or, if ``fit_rotation`` is ``True``, the
+    translation and rotation are fit to them. Only the block-reduced
+    reference frame and the windows of it are kept, so this is small enough to
+    send to other processes.
+
+    Parameters
+    ----------
+
+    reference : `numpy.ndarray` or `astropy.nddata.CCDData`
+        The reference frame. If it is a `~astropy.nddata.CCDData` with a WCS,
+        the WCS is kept so that the WCS of other frames can be found.
+
+    block_size : int, optional (default=4)
+        The factor by which the frames are block-reduced to find the rough
+        shift.
+
+    window_size : int, optional (default=256)
+        Size, in pixels, of the windows used to refine the shift. It is
+        reduced for small frames so that the windows fit.
+
+    fit_rotation : bool, optional (default=False)
+        If ``True``, fit a rotation as well as a translation.
+
+    min_significance : float, optional (default=8)
+        The number of standard deviations above the mean that the peak of a
+        correlation must be for its shift to be used. The highest peak of
+        the correlation of unrelated images is typically 4 or 5.
+
+    Attributes
+    ----------
+
+    wcs : `astropy.wcs.WCS` or None
+        The WCS of the reference frame.
+
+    shape : tuple of int
+        The shape of the reference frame.
+
+    Examples
+    --------
+
+    Give an image without a WCS the WCS of a reference image of the same
+    field::
+
+        registration = FrameRegistration(reference_ccd)
+        transform = registration.register(ccd)
+        ccd.wcs = transform.transform_wcs(registration.wcs)
+    """
+
+    def __init__(
+        self,
+        reference,
+        block_size=4,
+        window_size=256,
+        fit_rotation=False,
+        min_significance=8,
+    ):
+        self.wcs = getattr(reference, "wcs", None)
+        self.shape = reference.shape
+        self.block_size = int(block_size)
+        self.fit_rotation = fit_rotation
+        self.min_significance = min_significance
+
+        arrays = _image_arrays(reference)
+        self._reduced = _reduced(arrays, self.block_size)
+
+        # A 3 x 3 grid of windows, spread over the frame but far enough from
+        # the edges that the matching window of a frame that is shifted by a
+        # small fraction of its size is still inside it.
+        self.window_size = int(min(window_size, min(self.shape) // 4))
+        half = self.window_size // 2
+        self._centers = [
+            (int(y), int(x))
+            for y in np.linspace(half, self.shape[0] - half, 5)[1:-1]
+            for x in np.linspace(half, self.shape[1] - half, 5)[1:-1]
+        ]
+        self._windows = [_window(arrays, y, x, half) for y, x in self._centers]
+
+    def register(self, image):
+        """
+        Find the transformation from the reference frame to an image.
+
+        Parameters
+        ----------
+
+        image : `numpy.ndarray` or `astropy.nddata.CCDData`
+            A frame of the same field with the same shape as the reference
+            frame.
+
+        Returns
+        -------
+
+        `FrameTransform`
+            The transformation of pixel positions in the reference frame to
+            pixel positions in the image.
+
+        Raises
+        ------
+
+        ValueError
+            If the image has a different shape than the reference frame, or
+            if the shift cannot be found, e.g. because the frames do not
+            overlap enough.
+        """
+        if image.shape != self.shape:
+            raise ValueError(
+                f"The image has shape {image.shape}, but the reference frame "
+                f"has shape {self.shape}."
+            )
+        arrays = _image_arrays(image)
+
+        # The rough shift, to within about a block
+        rough_shift, significance = _correlation_peak(
+            self._reduced, _reduced(arrays, self.block_size)
+        )
+        if significance < self.min_significance:
+            raise ValueError(
+                "Could not find the shift between the image and the reference frame."
+            )
+        rough_dy, rough_dx = np.round(rough_shift * self.block_size).astype(int)
+
+        # The shift of each window, to a fraction of a pixel
+        half = self.window_size // 2
+        centers = []
+        shifts = []
+        for (y, x), window in zip(self._centers, self._windows, strict=True):
+            y_image, x_image = y + rough_dy, x + rough_dx
+            if not (
+                half <= y_image <= self.shape[0] - half
+                and half <= x_image <= self.shape[1] - half
+            ):
+                continue
+            shift, significance = _correlation_peak(
+                window, _window(arrays, y_image, x_image, half)
+            )
+            if (
+                significance >= self.min_significance
+                and np.abs(shift).max() <= self.window_size / 4
+            ):
+                centers.append((x, y))
+                shifts.append((shift[1] + rough_dx, shift[0] + rough_dy))
+
+        if len(shifts) < (3 if self.fit_rotation else 1):
+            raise ValueError(
+                "Could not find the shift between the image and the reference "
+                "frame in enough places to register it."
+            )
+        centers = np.array(centers, dtype=float)
+        shifts = np.array(shifts)
+        if not self.fit_rotation:
+            dx, dy = np.median(shifts, axis=0)
+            return FrameTransform(dx, dy)
+
+        moved = centers + shifts
+        transform = _fit_rigid(centers, moved)
+        # Fit again without the windows whose shift does not fit, e.g.
+        # because a satellite trail or cosmic ray was in them
+        residuals = np.hypot(*(np.array(transform.to_frame(*centers.T)) - moved.T))
+        good = residuals < 1
+        if 3 <= good.sum() < len(good):
+            transform = _fit_rigid(centers[good], moved[good])
+        return transform
@@ -1,21 +1,21 @@
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from astropy import units as u
 from astropy.nddata import CCDData, block_reduce
-from astropy.nddata.utils import Cutout2D
-from astropy.stats import sigma_clipped_stats
-from astropy.table import Table
+from astropy.table import Table, vstack
 from astropy.utils.exceptions import AstropyUserWarning
-from numpy.exceptions import ComplexWarning
 from photutils.detection import DAOStarFinder
-from photutils.morphology import data_properties
-from photutils.profiles import RadialProfile
 from photutils.psf import fit_2dgaussian, fit_fwhm
+from photutils.utils import NoDetectionsWarning
 
 from stellarphot.core import SourceListData
 from stellarphot.settings.models import FwhmMethods
 
+from .image_statistics import fast_sigma_clipped_stats
+from .stamps import StampCube, gaussian_fwhm, moments_fwhm, radial_profiles
+
 __all__ = ["source_detection", "compute_fwhm", "fast_fwhm_from_image"]
 
 
@@ -28,6 +28,8 @@ def compute_fwhm(
     fit_method=FwhmMethods.FIT,  # This matches the old default
     sky_per_pix_avg=None,
     sky_per_pix_column=None,
+    max_adu=None,
+    background=None,
 ):
     """
     Computes the FWHM in both x and y directions of sources in an image.
@@ -67,6 +69,15 @@ def compute_fwhm(
         sky background from the cutout before computing the FWHM. Cannot
         specify both `sky_per_pix_avg` and `sky_per_pix_column`.
 
+    max_adu : float, optional
+        Pixels above this value are treated as saturated and, like NaN pixels,
+        are left out when measuring the FWHM.
+
+    background : `stellarphot.photometry.BackgroundMesh`, optional
+        Model of the sky background of the image. If given, the background at
+        the position of each source is subtracted. Cannot be given with
+        `sky_per_pix_avg` or `sky_per_pix_column`.
+
     Returns
     -------
 
@@ -80,50 +91,95 @@ def compute_fwhm(
         raise ValueError(
             "Cannot specify both `sky_per_pix_avg` and `sky_per_pix_column`."
         )
+    if background is not None and (
+        sky_per_pix_avg is not None or sky_per_pix_column is not None
+    ):
+        raise ValueError(
+            "Cannot specify `background` with `sky_per_pix_avg` or "
+            "`sky_per_pix_column`."
+        )
 
     if sky_per_pix_column is not None:
         if sky_per_pix_column not in sources.colnames:
             raise ValueError(f"Column {sky_per_pix_column} not found in sources table.")
         sky_values = sources[sky_per_pix_column]
 
+    # Strip units from the positions if they have them
+    xs = np.asarray(u.Quantity(sources[x_column]).value, dtype=float)
+    ys = np.asarray(u.Quantity(sources[y_column]).value, dtype=float)
+
     if sky_per_pix_avg is not None:
         # User gave a value for the sky background to subtract
         sky_values = [sky_per_pix_avg] * len(sources)
+    elif background is not None:
+        sky_values = background.background_at(xs, ys)
     elif sky_per_pix_column is None:
         # User didn't give a value for the sky background to subtract
         # so try an of estimate it from the image
 
-        sky_values = [np.nanmedian(ccd.data)] * len(sources)
+        sky_values = [fast_sigma_clipped_stats(ccd, sigma=None)[1]] * len(sources)
+
+    # Strip units from the sky values if they have them
+    sky_values = [getattr(sky, "value", sky) for sky in sky_values]
+
+    # Extract the cutouts around all of the sources at once rather than
+    # making a sky-subtracted copy of the whole image for each source.
+    stamps = StampCube(data, xs, ys, 5 * fwhm_estimate, mask=getattr(ccd, "mask", None))
+    if max_adu is not None:
+        stamps.data[stamps.data > max_adu] = np.nan
+
+    match fit_method:
+        case FwhmMethods.FIT:
+            return _fit_fwhm_of_stamps(stamps, sky_values, fwhm_estimate)
+        case FwhmMethods.MOMENTS | FwhmMethods.PROFILE:
+            pass
+        case _:
+            raise ValueError(f"Unknown fit method: {fit_method}")
+
+    # The moments and profiles are computed for all of the stamps at once
+    sky_subtracted = (
+        stamps.data - np.asarray(sky_values, dtype=float)[:, np.newaxis, np.newaxis]
+    )
+    if fit_method == FwhmMethods.MOMENTS:
+        fwhm = moments_fwhm(sky_subtracted)
+    else:
+        radius, profiles = radial_profiles(
+            sky_subtracted,
+            stamps.xs - stamps.x_min,
+            stamps.ys - stamps.y_min,
+            np.arange(int(3 * fwhm_estimate)),
+        )
+        fwhm = gaussian_fwhm(radius, profiles)
+
+    # A completely masked cutout (e.g. a fully saturated source, see
+    # #591/#592) has no data to measure a FWHM from, so record NaN.
+    masked = np.isnan(sky_subtracted)
+    if stamps.mask is not None:
+        masked |= stamps.mask
+    fwhm[masked.all(axis=(1, 2))] = np.nan
 
+    return fwhm, fwhm.copy()
+
+
+def _fit_fwhm_of_stamps(stamps, sky_values, fwhm_estimate):
+    """
+    Fit a 2D Gaussian to each stamp to find the FWHM of each source.
+    """
     fwhm_x = []
     fwhm_y = []
-    for source, sky in zip(sources, sky_values, strict=True):
-        x = source[x_column]
-        y = source[y_column]
-
-        # Cutout2D needs no units on the center position, so remove unit
-        # if it is present.
-        try:
-            x = x.value
-            y = y.value
-            sky = sky.value
-        except AttributeError:
-            pass
+    for index, sky in enumerate(sky_values):
+        stamp, inp_mask, cutout_xy = stamps.trimmed(index)
 
         # SKY SUBTRACT STUFF!!
-        cutout = Cutout2D(data - sky, (x, y), 5 * fwhm_estimate)
+        cutout_data = stamp - sky
 
         # Mask any NaNs in the data
-        nan_mask = np.isnan(cutout.data)
-        inp_mask = getattr(ccd, "mask", None)
+        nan_mask = np.isnan(cutout_data)
         if inp_mask is not None:
-            inp_mask = inp_mask[cutout.slices_original]
             mask = inp_mask | nan_mask
         else:
             mask = nan_mask
 
-        cutout_xy = cutout.to_cutout_position((x, y))
-
         # A completely masked cutout (e.g. a fully saturated source, see
         # #591/#592) has no data to measure a FWHM from, and photutils
         # raises an error when asked to fit it, so record NaN instead.
@@ -132,53 +188,177 @@ def compute_fwhm(
             fwhm_y.append(np.nan)
             continue
 
-        match fit_method:
-            case FwhmMethods.FIT:
-                # Make sure we get an odd fits shape
-                fit_shape = int(2 * ((5 * fwhm_estimate) // 2) + 1)
-
-                # fit_fwhm is supposed to handle NaNs automatically but it doesn't
-                # as of photutils 2.2.0
-                # see https://github.com/astropy/photutils/issues/2029
-                # For now replace any NaN with zero and hope for the best.
-                cutout.data[nan_mask] = 0
-                fit = fit_fwhm(
-                    cutout.data,
-                    xypos=cutout_xy,
-                    fwhm=fwhm_estimate,
-                    fit_shape=fit_shape,
-                    mask=mask,
-                )
-                fit = fit[0]
-
-                fwhm_x.append(fit)  # gaussian_sigma_to_fwhm * fit.x_stddev_1)
-                fwhm_y.append(fit)  # gaussian_sigma_to_fwhm * fit.y_stddev_1)
-                # print('Still fitting!!')
-            case FwhmMethods.MOMENTS:
-                sc = data_properties(cutout.data)
-
-                with warnings.catch_warnings():
-                    # photutils' covariance_eigvals casts complex (zero-imaginary)
-                    # eigenvalues to real; numpy >= 2.5 returns complex eigvals
-                    # even for a real symmetric covariance matrix, which triggers
-                    # a (benign) ComplexWarning here.
-                    warnings.simplefilter("ignore", ComplexWarning)
-                    fwhm_xm = sc.fwhm.value
-                fwhm_ym = fwhm_xm
-                fwhm_x.append(fwhm_xm)
-                fwhm_y.append(fwhm_ym)
-            case FwhmMethods.PROFILE:
-                radii = np.arange(int(3 * fwhm_estimate))
-                profile = RadialProfile(cutout.data, cutout_xy, radii)
-                fwhm = profile.gaussian_fwhm
-                fwhm_x.append(fwhm)
-                fwhm_y.append(fwhm)
-            case _:
-                raise ValueError(f"Unknown fit method: {fit_method}")
+        # Make sure we get an odd fits shape
+        fit_shape = int(2 * ((5 * fwhm_estimate) // 2) + 1)
+
+        # fit_fwhm is supposed to handle NaNs automatically but it doesn't
+        # as of photutils 2.2.0
+        # see https://github.com/astropy/photutils/issues/2029
+        # For now replace any NaN with zero and hope for the best.
+        cutout_data[nan_mask] = 0
+        fit = fit_fwhm(
+            cutout_data,
+            xypos=cutout_xy,
+            fwhm=fwhm_estimate,
+            fit_shape=fit_shape,
+            mask=mask,
+        )
+        fit = fit[0]
+
+        fwhm_x.append(fit)  # gaussian_sigma_to_fwhm * fit.x_stddev_1)
+        fwhm_y.append(fit)  # gaussian_sigma_to_fwhm * fit.y_stddev_1)
 
     return np.array(fwhm_x), np.array(fwhm_y)
 
 
+def _find_sources(
+    ccd, fwhm, sigma, iters, threshold, stddev, sky_per_pix_avg, verbose=False
+):
+    """
+    Find the sources in an image with `photutils.detection.DAOStarFinder`; see
+    `source_detection` for a description of the arguments.
+
+    Returns the sources and the sky background that was subtracted from the
+    image. The sky background can also be an array with a value for each
+    pixel of the image.
+    """
+    # Get statistics of the input image (and use them to estimate the sky background
+    # if not provided).  Using clipped stats should hopefully get rid of any
+    # bright stars that might be in the image. Only do this if stddev is not provided.
+    if stddev is None:
+        mean, median, stddev = fast_sigma_clipped_stats(
+            ccd, sigma=sigma, maxiters=iters
+        )
+    else:
+        # Set median to None to indicate sigma clipped stats were not
+        # calculated.
+        median = None
+
+    if sky_per_pix_avg is None:
+        if median is not None:
+            # We calculated sigma clipped stats, so use them
+            sky_per_pix_avg = median
+        else:
+            # A median is a pretty good estimate of the sky background, so use it
+            # for detection. For *photometry* a better estimate is needed, but for
+            # detection, the median is good enough and much faster than sigma clipping.
+            sky_per_pix_avg = fast_sigma_clipped_stats(ccd, sigma=None)[1]
+        if verbose:
+            print(f"source_detection: sky_per_pix_avg set to {sky_per_pix_avg:.4f}")
+
+    # Identify sources applying DAOStarFinder to a "sky subtracted"
+    # image.
+    if verbose:
+        print(
+            f"source_detection: threshold set to {threshold}* standard deviation "
+            f"({stddev:.4f})"
+        )
+        print(f"source_detection: Assuming fwhm of {fwhm} for DAOStarFinder")
+
+    # daofind should be run on background subtracted image
+    # (fails, or at least returns garbage, if sky_per_pix_avg is too low)
+    daofind = DAOStarFinder(fwhm=fwhm, threshold=threshold * stddev)
+    if isinstance(ccd, CCDData):
+        sources = daofind(ccd.data - sky_per_pix_avg)
+    else:
+        sources = daofind(ccd - sky_per_pix_avg)
+    return sources, sky_per_pix_avg
+
+
+def _find_sources_in_tiles(
+    data,
+    fwhm,
+    sigma,
+    iters,
+    threshold,
+    stddev,
+    sky_per_pix_avg,
+    tile_size,
+    workers=None,
+):
+    """
+    Find the sources in an image one tile at a time; see `source_detection`
+    for a description of the arguments.
+    """
+    # Sources near the edge of a tile are not found the same way they are in
+    # the whole image, because the kernel that DAOStarFinder convolves the
+    # image with, and the region it looks for the peak in, extend past the
+    # edge. Each of those extends about 0.64 FWHM, but at least two pixels,
+    # from the center of a source, so this overlap is plenty.
+    overlap = 2 * max(2, int(np.ceil(fwhm))) + 2
+    y_size, x_size = data.shape
+
+    def find_in_tile(corner):
+        # The tile owns the sources with centers in
+        # [x_start, x_stop) x [y_start, y_stop), but looks for them in the
+        # tile extended by the overlap on every side.
+        y_start, x_start = corner
+        y_stop = min(y_start + tile_size, y_size)
+        x_stop = min(x_start + tile_size, x_size)
+        y_low = max(y_start - overlap, 0)
+        x_low = max(x_start - overlap, 0)
+        tile_slices = (
+            slice(y_low, y_stop + overlap),
+            slice(x_low, x_stop + overlap),
+        )
+        tile_sky = sky_per_pix_avg
+        if np.ndim(sky_per_pix_avg) == 2:
+            tile_sky = sky_per_pix_avg[tile_slices]
+        sources, _ = _find_sources(
+            data[tile_slices],
+            fwhm=fwhm,
+            sigma=sigma,
+            iters=iters,
+            threshold=threshold,
+            stddev=stddev,
+            sky_per_pix_avg=tile_sky,
+        )
+        if sources is None:
+            return None
+        sources["xcentroid"] += x_low
+        sources["ycentroid"] += y_low
+        # Sources outside of the image belong to the tile at that edge
+        x = sources["xcentroid"]
+        y = sources["ycentroid"]
+        owned = (
+            ((x >= x_start) | (x_start == 0))
+            & ((x < x_stop) | (x_stop == x_size))
+            & ((y >= y_start) | (y_start == 0))
+            & ((y < y_stop) | (y_stop == y_size))
+        )
+        return sources[owned]
+
+    corners = [
+        (y_start, x_start)
+        for y_start in range(0, y_size, tile_size)
+        for x_start in range(0, x_size, tile_size)
+    ]
+    with warnings.catch_warnings():
+        # Plenty of tiles may have no sources; that is only worth a warning
+        # if none of them do.
+        warnings.filterwarnings("ignore", category=NoDetectionsWarning)
+        if workers is None or workers == 1:
+            tile_sources = [find_in_tile(corner) for corner in corners]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                tile_sources = list(executor.map(find_in_tile, corners))
+
+    tile_sources = [sources for sources in tile_sources if sources is not None]
+    if not tile_sources:
+        warnings.warn("No sources were found.", NoDetectionsWarning, stacklevel=3)
+        return None
+    # The metadata of each tile records the time the tile was done, so keep
+    # the first one
+    sources = vstack(tile_sources, metadata_conflicts="silent")
+    # Number the sources in order of their position so that the result does
+    # not depend on the size of the tiles.
+    sources = sources[
+        np.lexsort((sources["xcentroid"].value, sources["ycentroid"].value))
+    ]
+    sources["id"] = np.arange(1, len(sources) + 1)
+    return sources
+
+
 def source_detection(
     ccd,
     fwhm=8,
@@ -190,6 +370,9 @@ def source_detection(
     sky_per_pix_avg=0,
     padding=0,
     verbose=False,
+    tile_size=None,
+    workers=None,
+    background=None,
 ):
     """
     Returns an SourceListData object containing the position of sources
@@ -221,7 +404,7 @@ def source_detection(
     stddev : float, optional
         If provided, this value will be used as the standard deviation
         of the image.  If not provided, the standard deviation will be
-        calculated using `sigma_clipped_stats` on the image.
+        calculated using `fast_sigma_clipped_stats` on the image.
 
     find_fwhm : bool, optional (default=True)
         If ``True``, estimate the FWHM of each source by fitting a 2D Gaussian
@@ -231,7 +414,7 @@ def source_detection(
     sky_per_pix_avg : float or None, optional (default=None)
         Sky background to subtract before centroiding. If set to ``None``,
         it will be estimated using the mean of the sigma_clipped_stats
-        of the image.
+        of the image. Ignored if `background` is given.
 
     padding : int, optional (default=0)
         Distance from the edge of the image to ignore when searching for
@@ -241,6 +424,29 @@ def source_detection(
         If ``True``, print additional information about the source
         detection process.
 
+    tile_size : int, optional (default=None)
+        If given, look for sources in square tiles of the image with sides of
+        this many pixels instead of in the whole image at once, which uses
+        much less memory for large images. Each tile is extended into its
+        neighbors by a few times the FWHM so that sources near the edges of
+        a tile are found just as they are in the whole image, and each source
+        is kept only by the tile that its center is in. If `stddev` or
+        `sky_per_pix_avg` is ``None`` it is calculated for each tile, as
+        described above, so that the local background and noise are used;
+        otherwise the sources are the same as for the whole image, though
+        they may be in a different order.
+
+    workers : int, optional (default=None)
+        Number of threads to use to look for sources in the tiles. If
+        ``None`` or 1, the tiles are done one at a time. Ignored unless
+        `tile_size` is given.
+
+    background : `stellarphot.photometry.BackgroundMesh`, optional
+        Model of the sky background of the image. If given, the background at
+        each pixel is subtracted instead of `sky_per_pix_avg`, and the median
+        of its standard deviation is used if `stddev` is not given. This is
+        the way to find sources in images whose background is not flat.
+
     Returns
     -------
 
@@ -267,44 +473,44 @@ def source_detection(
             "ignored."
         )
 
-    # Get statistics of the input image (and use them to estimate the sky background
-    # if not provided).  Using clipped stats should hopefully get rid of any
-    # bright stars that might be in the image. Only do this if stddev is not provided.
-    if stddev is None:
-        mean, median, stddev = sigma_clipped_stats(ccd, sigma=sigma, maxiters=iters)
-    else:
-        # Set median to None to indicate sigma clipped stats were not
-        # calculated.
-        median = None
-
-    if sky_per_pix_avg is None:
-        if median is not None:
-            # We calculated sigma clipped stats, so use them
-            sky_per_pix_avg = median
-        else:
-            # A median is a pretty good estimate of the sky background, so use it
-            # for detection. For *photometry* a better estimate is needed, but for
-            # detection, the median is good enough and much faster than sigma clipping.
-            sky_per_pix_avg = np.nanmedian(ccd.data)
+    if background is not None:
+        sky_per_pix_avg = background.background
+        if stddev is None:
+            stddev = background.median_rms
         if verbose:
-            print(f"source_detection: sky_per_pix_avg set to {sky_per_pix_avg:.4f}")
+            print(f"source_detection: using the sky background of {background}")
 
-    # Identify sources applying DAOStarFinder to a "sky subtracted"
-    # image.
-    if verbose:
-        print(
-            f"source_detection: threshold set to {threshold}* standard deviation "
-            f"({stddev:.4f})"
+    if tile_size is None:
+        sources, sky_per_pix_avg = _find_sources(
+            ccd,
+            fwhm=fwhm,
+            sigma=sigma,
+            iters=iters,
+            threshold=threshold,
+            stddev=stddev,
+            sky_per_pix_avg=sky_per_pix_avg,
+            verbose=verbose,
         )
-        print(f"source_detection: Assuming fwhm of {fwhm} for DAOStarFinder")
-
-    # daofind should be run on background subtracted image
-    # (fails, or at least returns garbage, if sky_per_pix_avg is too low)
-    daofind = DAOStarFinder(fwhm=fwhm, threshold=threshold * stddev)
-    if isinstance(ccd, CCDData):
-        sources = daofind(ccd.data - sky_per_pix_avg)
     else:
-        sources = daofind(ccd - sky_per_pix_avg)
+        sources = _find_sources_in_tiles(
+            ccd.data if isinstance(ccd, CCDData) else ccd,
+            fwhm=fwhm,
+            sigma=sigma,
+            iters=iters,
+            threshold=threshold,
+            stddev=stddev,
+            sky_per_pix_avg=sky_per_pix_avg,
+            tile_size=tile_size,
+            workers=workers,
+        )
+        if verbose:
+            print(
+                f"source_detection: looked for sources in tiles of {tile_size} "
+                "pixels using the sky background and noise of each tile"
+            )
+        if sky_per_pix_avg is None:
+            # The FWHM below is measured using one sky value for all sources
+            sky_per_pix_avg = fast_sigma_clipped_stats(ccd, sigma=None)[1]
 
     # Identify sources near the edge of the image and remove them
     # from the source list.
@@ -345,7 +551,8 @@ def source_detection(
             fwhm_estimate=fwhm,
             x_column="xcentroid",
             y_column="ycentroid",
-            sky_per_pix_avg=sky_per_pix_avg,
+            sky_per_pix_avg=sky_per_pix_avg if background is None else None,
+            background=background,
         )
         sources["fwhm_x"] = x
         sources["fwhm_y"] = y
@@ -378,7 +585,7 @@ def source_detection(
     # Rename columns to match SourceListData
     colnamemap = {"id": "star_id", "xcentroid": "xcenter", "ycentroid": "ycenter"}
 
-    sl_data = SourceListData(input_data=sources, colname_map=colnamemap)
+    sl_data = SourceListData(input_data=sources, colname_map=colnamemap, copy=False)
     return sl_data
 
 
@@ -391,6 +598,7 @@ def fast_fwhm_from_image(
     block_size=8,
     min_block_fwhm=1,
     aggregate_by="mean",
+    background=None,
 ):
     """
     Compute the FWHM of a CCD image by block reducing it, running source detection
@@ -420,6 +628,9 @@ def fast_fwhm_from_image(
     aggregate_by : str, optional
         The method to use for aggregating the FWHM estimates. Can be 'mean' or
         'median'. If None, the FWHM estimates will not be aggregated.
+    background : `stellarphot.photometry.BackgroundMesh`, optional
+        Model of the sky background of the image to subtract. If not given, the
+        median of the image is subtracted.
 
     Returns
     -------
@@ -451,6 +662,11 @@ def fast_fwhm_from_image(
         data = ccd
         mask = None
 
+    if background is None:
+        sky = fast_sigma_clipped_stats(data, sigma=None)[1]
+    else:
+        sky = background.background
+
     with warnings.catch_warnings():
         # block_reduce generates some warnings about things like unit, wcs, etc
         # that are set on ccd but not preserved in the reduced image.
@@ -460,7 +676,10 @@ def fast_fwhm_from_image(
             message="The following attributes were set on the data object",
             category=AstropyUserWarning,
         )
-        reduced_data = block_reduce(data, block_size=block_size)
+        if background is None:
+            reduced_data = block_reduce(data, block_size=block_size)
+        else:
+            reduced_data = block_reduce(data - sky, block_size=block_size)
 
     # Pick a padding that is about 1% of the block reduced image size
     padding = int(0.01 * reduced_data.shape[0])
@@ -469,7 +688,8 @@ def fast_fwhm_from_image(
         reduced_data,
         fwhm=fwhm_estimate / block_size,
         stddev=noise * block_size,  # noise adds in quadrature
-        sky_per_pix_avg=None,  # make source_detection do the sky subtraction
+        # make source_detection do the sky subtraction unless it is done already
+        sky_per_pix_avg=None if background is None else 0,
         find_fwhm=False,
         threshold=20,
         padding=padding,
@@ -517,7 +737,7 @@ def fast_fwhm_from_image(
         )
         # This is faster than calling our own compute_fwhm, so do this.
         fit = fit_2dgaussian(
-            data - np.nanmedian(data),
+            data - sky,
             xypos=list(
                 zip(
                     fwhm_est_sources["xcenter"],
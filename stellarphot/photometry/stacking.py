@@ -0,0 +1,222 @@
+from contextlib import ExitStack
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+from astropy.nddata import CCDData
+
+from .header_index import _wcs_from_header
+from .photometry import _image_hdu, _scaled, _scaled_dtype, _unit_from_header
+from .source_detection import source_detection
+from .stamps import clipped_statistics
+
+__all__ = ["stack_images", "reference_source_list"]
+
+
+class _FileFrame:
+    """
+    An image in a FITS file from which a section can be read without reading
+    the rest of the image.
+    """
+
+    def __init__(self, hdus, hdu):
+        image_hdu, self.header = _image_hdu(hdus, hdu)
+        # The section of an HDU only reads, or for a compressed image only
+        # decompresses, the part of the image that is asked for.
+        self._section = image_hdu.section
+        self._mask = hdus["MASK"].section if "MASK" in hdus else None
+        self.shape = image_hdu.shape
+        self.unit = _unit_from_header(self.header)
+        self.wcs = _wcs_from_header(self.header)
+
+    def read(self, rows, columns):
+        raw = self._section[rows, columns]
+        if _scaled_dtype(raw, self.header) is None:
+            values = raw.astype(float)
+        else:
+            values = _scaled(raw, self.header, float)
+        if self._mask is not None:
+            values[self._mask[rows, columns].astype(bool)] = np.nan
+        return values
+
+
+class _ArrayFrame:
+    """
+    An image that is already in memory.
+    """
+
+    def __init__(self, image):
+        self._data = np.asarray(getattr(image, "data", image))
+        self._mask = getattr(image, "mask", None)
+        self.shape = self._data.shape
+        self.header = getattr(image, "header", None)
+        self.unit = getattr(image, "unit", None)
+        self.wcs = getattr(image, "wcs", None)
+
+    def read(self, rows, columns):
+        values = self._data[rows, columns].astype(float)
+        if self._mask is not None:
+            values[self._mask[rows, columns]] = np.nan
+        return values
+
+
+def _chunks(shape, n_frames, mem_limit):
+    """
+    Blocks of rows, and if a single row of every frame does not fit in the
+    memory limit then blocks of columns of each row, to combine at once.
+    """
+    n_rows, n_columns = shape
+    # The values from all of the frames, and the copies of them made while
+    # combining them
+    bytes_per_pixel = 5 * n_frames * np.dtype(float).itemsize
+    pixels_per_chunk = max(1, int(mem_limit // bytes_per_pixel))
+    rows_per_chunk = max(1, pixels_per_chunk // n_columns)
+    columns_per_chunk = min(n_columns, pixels_per_chunk)
+    for row in range(0, n_rows, rows_per_chunk):
+        for column in range(0, n_columns, columns_per_chunk):
+            yield (
+                slice(row, min(row + rows_per_chunk, n_rows)),
+                slice(column, min(column + columns_per_chunk, n_columns)),
+            )
+
+
+def stack_images(images, method="median", sigma=3.0, iters=5, mem_limit=256e6, hdu=0):
+    """
+    Combine registered images of a field into a single deep image, a chunk of
+    the images at a time.
+
+    Only one chunk of each image, a block of rows or, for very many images, a
+    part of a row, is in memory at any time. Images in files are
+    memory-mapped and only the chunk being combined is read, so the memory
+    used is set by ``mem_limit`` rather than by the size or number of the
+    images.
+
+    Parameters
+    ----------
+
+    images : list of str, `pathlib.Path`, `astropy.nddata.CCDData` or `numpy.ndarray`
+        The images, or the FITS files that hold them. All of them must have
+        the same shape and be registered, i.e. a star must be at the same
+        pixel in each of them. Masked pixels, and pixels that are not finite,
+        are left out of the combination.
+
+    method : {"median", "mean"}, optional (default="median")
+        How to combine the images at each pixel: the median, or the mean
+        after sigma clipping.
+
+    sigma : float, optional (default=3.0)
+        The number of standard deviations from the median at which values
+        are clipped when ``method`` is ``"mean"``.
+
+    iters : int, optional (default=5)
+        The maximum number of clipping iterations when ``method`` is
+        ``"mean"``.
+
+    mem_limit : float, optional (default=256e6)
+        Approximate limit, in bytes, on the memory used to combine a chunk
+        of the images. The combined image itself is not included.
+
+    hdu : int or str, optional (default=0)
+        The HDU with the image in each file. If it is the primary HDU and
+        that has no data, the first extension with data is used.
+
+    Returns
+    -------
+
+    `astropy.nddata.CCDData`
+        The combined image, with the header, WCS and unit of the first image
+        and a mask of the pixels for which every image was masked. The
+        header records the number of images in ``NCOMBINE`` and the method
+        in ``COMBINE``.
+    """
+    if method not in ["median", "mean"]:
+        raise ValueError(f"method must be 'median' or 'mean', not '{method}'.")
+    if len(images) == 0:
+        raise ValueError("There are no images to stack.")
+
+    with ExitStack() as open_files:
+        frames = []
+        for image in images:
+            if isinstance(image, str | Path):
+                hdus = open_files.enter_context(
+                    fits.open(image, memmap=True, do_not_scale_image_data=True)
+                )
+                frames.append(_FileFrame(hdus, hdu))
+            else:
+                frames.append(_ArrayFrame(image))
+
+        shape = frames[0].shape
+        for image, frame in zip(images, frames, strict=True):
+            if frame.shape != shape:
+                raise ValueError(
+                    f"All of the images must have the same shape, but {image} "
+                    f"has shape {frame.shape} instead of {shape}."
+                )
+
+        stacked = np.empty(shape)
+        for rows, columns in _chunks(shape, len(frames), mem_limit):
+            values = np.array([frame.read(rows, columns) for frame in frames])
+            chunk_shape = values.shape[1:]
+            # One row for each pixel, with its value in each image
+            values = values.reshape(len(frames), -1).T
+            if method == "median":
+                _, combined, _ = clipped_statistics(values, sigma=None)
+            else:
+                combined, _, _ = clipped_statistics(values, sigma=sigma, iters=iters)
+            stacked[rows, columns] = combined.reshape(chunk_shape)
+
+    first = frames[0]
+    header = fits.Header() if first.header is None else first.header.copy()
+    header["NCOMBINE"] = (len(frames), "Number of images combined")
+    header["COMBINE"] = (method, "How the images were combined")
+    return CCDData(
+        stacked,
+        unit=first.unit if first.unit is not None else "adu",
+        mask=np.isnan(stacked),
+        wcs=first.wcs,
+        meta=header,
+    )
+
+
+def reference_source_list(
+    images,
+    method="median",
+    sigma=3.0,
+    iters=5,
+    mem_limit=256e6,
+    hdu=0,
+    **detection_kwargs,
+):
+    """
+    Find the sources in a deep stack of registered images of a field, for use
+    as the source list for photometry of the images.
+
+    A stack finds fainter stars than any one of the images does, and stars
+    rather than cosmic rays, which are only in one image.
+
+    Parameters
+    ----------
+
+    images : list of str, `pathlib.Path`, `astropy.nddata.CCDData` or `numpy.ndarray`
+        The images, or the FITS files that hold them; see `stack_images`.
+
+    method, sigma, iters, mem_limit, hdu
+        How to combine the images; see `stack_images`.
+
+    **detection_kwargs
+        Passed on to `~stellarphot.photometry.source_detection`. Unless
+        ``sky_per_pix_avg`` is given, the sky background of the stack is
+        estimated and subtracted.
+
+    Returns
+    -------
+
+    `stellarphot.SourceListData`
+        The sources, with ``ra`` and ``dec`` from the WCS of the first image
+        if it has one.
+    """
+    stacked = stack_images(
+        images, method=method, sigma=sigma, iters=iters, mem_limit=mem_limit, hdu=hdu
+    )
+    detection_kwargs.setdefault("sky_per_pix_avg", None)
+    return source_detection(stacked, **detection_kwargs)
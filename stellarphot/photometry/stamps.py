@@ -0,0 +1,790 @@
+from collections import OrderedDict
+
+import numpy as np
+from astropy.nddata import NoOverlapError
+from astropy.stats import gaussian_sigma_to_fwhm
+from astropy.table import Table
+from photutils.geometry import circular_overlap_grid
+
+__all__ = []
+
+
+class StampCube:
+    """
+    Square cutouts ("stamps") of an image around a list of positions,
+    extracted all at once into a single ``(N, size, size)`` array.
+
+    Each stamp covers the same pixels that `~astropy.nddata.Cutout2D` would
+    for a cutout of shape ``(size, size)`` centered on the position. Parts of a
+    stamp that fall outside of the image are filled with ``fill_value`` and
+    marked in `outside`; `trimmed` gives the part of a stamp that is inside
+    the image, which is exactly the data of a ``Cutout2D`` in the default
+    ``"trim"`` mode.
+
+    Parameters
+    ----------
+    data : `numpy.ndarray` or array-like
+        The 2D image. Anything other than an array that has a ``take`` method
+        that works like `numpy.ndarray.take` is used through that method.
+
+    xs, ys : array-like
+        The positions of the centers of the stamps, in pixels.
+
+    size : float
+        The size of the stamps, which is rounded to the nearest integer like
+        ``Cutout2D`` does.
+
+    mask : `numpy.ndarray` of bool, optional
+        A mask for the image; stamps of it are extracted along with the data.
+
+    fill_value : float, optional
+        Value of the stamp pixels that are outside of the image.
+
+    Attributes
+    ----------
+    data : `numpy.ndarray`
+        The ``(N, size, size)`` stamps. The dtype is that of the image if it is
+        floating point, otherwise float64.
+
+    mask : `numpy.ndarray` of bool or None
+        The ``(N, size, size)`` stamps of the input mask, if one was given.
+        Pixels outside of the image are ``True``.
+
+    outside : `numpy.ndarray` of bool
+        The ``(N, size, size)`` array that is ``True`` for the stamp pixels
+        outside of the image.
+
+    x_min, y_min : `numpy.ndarray` of int
+        Position in the image of the first pixel of each stamp. These can be
+        negative for stamps that extend past the edge of the image.
+
+    Raises
+    ------
+    ValueError
+        If any position is not finite.
+
+    NoOverlapError
+        If any stamp does not overlap the image at all.
+    """
+
+    def __init__(self, data, xs, ys, size, mask=None, fill_value=np.nan):
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        if not (np.isfinite(xs).all() and np.isfinite(ys).all()):
+            raise ValueError("Input position contains invalid values (NaNs or infs).")
+
+        self.size = int(np.round(size))
+        self.image_shape = data.shape
+        self.xs = xs
+        self.ys = ys
+
+        # This is the same rounding that overlap_slices does, so the stamps
+        # cover the same pixels as the equivalent Cutout2D
+        self.x_min = np.ceil(xs - self.size / 2.0).astype(int)
+        self.y_min = np.ceil(ys - self.size / 2.0).astype(int)
+
+        offsets = np.arange(self.size)
+        rows = self.y_min[:, np.newaxis] + offsets
+        cols = self.x_min[:, np.newaxis] + offsets
+        row_inside = (rows >= 0) & (rows < data.shape[0])
+        col_inside = (cols >= 0) & (cols < data.shape[1])
+        if len(xs) and not (row_inside.any(axis=1) & col_inside.any(axis=1)).all():
+            raise NoOverlapError("Arrays do not overlap.")
+
+        self.outside = ~(row_inside[:, :, np.newaxis] & col_inside[:, np.newaxis, :])
+        rows = np.clip(rows, 0, data.shape[0] - 1)[:, :, np.newaxis]
+        cols = np.clip(cols, 0, data.shape[1] - 1)[:, np.newaxis, :]
+        # Gathering with flat indices is quite a bit faster than indexing
+        # with the rows and columns
+        indices = rows * data.shape[1] + cols
+
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else float
+        if not isinstance(data, np.ndarray) and hasattr(data, "take"):
+            # An image that is not an array, like the scaled images from
+            # read_image_sections, reads only the pixels that are taken
+            pixels = data.take(indices)
+        else:
+            pixels = np.ravel(data).take(indices)
+        self.data = pixels.astype(dtype, copy=False)
+        self.data[self.outside] = fill_value
+
+        if mask is not None:
+            self.mask = np.ravel(mask).take(indices) | self.outside
+        else:
+            self.mask = None
+
+    def __len__(self):
+        return len(self.data)
+
+    def trimmed_slices(self, index):
+        """
+        The slices of stamp ``index`` that select the part inside the image.
+        """
+        ny, nx = self.image_shape
+        y_min, x_min = self.y_min[index], self.x_min[index]
+        return (
+            slice(max(0, -y_min), min(ny - y_min, self.size)),
+            slice(max(0, -x_min), min(nx - x_min, self.size)),
+        )
+
+    def trimmed(self, index):
+        """
+        The part of stamp ``index`` that is inside the image.
+
+        Returns
+        -------
+        data : `numpy.ndarray`
+            View of the stamp data inside the image.
+
+        mask : `numpy.ndarray` of bool or None
+            View of the stamp of the input mask, if there is one.
+
+        position : tuple of float
+            The ``(x, y)`` position of the center of the stamp in ``data``.
+        """
+        slices = self.trimmed_slices(index)
+        mask = self.mask[index][slices] if self.mask is not None else None
+        position = (
+            self.xs[index] - max(0, self.x_min[index]),
+            self.ys[index] - max(0, self.y_min[index]),
+        )
+        return self.data[index][slices], mask, position
+
+
+def moments_fwhm(stamps):
+    """
+    The FWHM of each stamp from its second moments.
+
+    This is the same calculation as the ``fwhm`` of
+    `photutils.morphology.data_properties` for each stamp, done for all of the
+    stamps at once: negative and non-finite pixels are ignored, the covariance
+    matrix of each stamp is computed from its central second moments (and
+    broadened like photutils does for sources that are too narrow) and the
+    FWHM is that of the circularized Gaussian with the same second moments.
+
+    Parameters
+    ----------
+    stamps : `numpy.ndarray`
+        The ``(N, size, size)`` sky-subtracted stamps.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        The FWHM of each stamp, in pixels.
+    """
+    weights = np.where(np.isfinite(stamps) & (stamps > 0), stamps, 0.0)
+    y, x = np.indices(stamps.shape[1:], dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = weights.sum(axis=(1, 2))
+        x_cen = (weights * x).sum(axis=(1, 2)) / total
+        y_cen = (weights * y).sum(axis=(1, 2)) / total
+        dx = x - x_cen[:, np.newaxis, np.newaxis]
+        dy = y - y_cen[:, np.newaxis, np.newaxis]
+        covariance = np.empty((len(stamps), 2, 2))
+        covariance[:, 0, 0] = (weights * dx**2).sum(axis=(1, 2)) / total
+        covariance[:, 0, 1] = (weights * dx * dy).sum(axis=(1, 2)) / total
+        covariance[:, 1, 0] = covariance[:, 0, 1]
+        covariance[:, 1, 1] = (weights * dy**2).sum(axis=(1, 2)) / total
+
+        # Same treatment of "infinitely" thin sources as photutils (which
+        # follows SourceExtractor): increase the diagonal until the
+        # determinant is large enough.
+        delta = 1.0 / 12
+        determinant = np.linalg.det(covariance)
+        covariance[determinant < 0] = np.nan
+        too_thin = determinant < delta**2
+        while too_thin.any():
+            covariance[too_thin, 0, 0] += delta
+            covariance[too_thin, 1, 1] += delta
+            too_thin = np.linalg.det(covariance) < delta**2
+
+    eigenvalues = np.full((len(stamps), 2), np.nan)
+    finite = np.isfinite(covariance).all(axis=(1, 2))
+    eigenvalues[finite] = np.linalg.eigvalsh(covariance[finite])
+    eigenvalues[(eigenvalues < 0).any(axis=1)] = np.nan
+
+    return 2.0 * np.sqrt(np.log(2.0) * eigenvalues.sum(axis=1))
+
+
+def radial_profiles(stamps, xs, ys, radii):
+    """
+    Radial profiles of the stamps.
+
+    The profiles are the same as those of `photutils.profiles.RadialProfile`
+    with the default ``"exact"`` method: the flux in each annulus is the
+    difference of the fluxes in circular apertures with radii given by
+    consecutive ``radii``, and is divided by the area of the annulus that
+    is not masked. Non-finite pixels are masked.
+
+    Parameters
+    ----------
+    stamps : `numpy.ndarray`
+        The ``(N, size, size)`` stamps.
+
+    xs, ys : `numpy.ndarray`
+        Center of each profile, in pixels relative to the first pixel of its
+        stamp.
+
+    radii : `numpy.ndarray`
+        The edges of the radial bins.
+
+    Returns
+    -------
+    radius : `numpy.ndarray`
+        The centers of the radial bins.
+
+    profiles : `numpy.ndarray`
+        The ``(N, len(radii) - 1)`` profiles.
+    """
+    good = np.isfinite(stamps)
+    data = np.where(good, stamps, 0.0).reshape(len(stamps), -1)
+    good = good.reshape(len(stamps), -1)
+    size = stamps.shape[1]
+
+    # Flux and unmasked area inside each circle, using the fraction of each
+    # pixel that is inside the circle, which is what photutils uses for the
+    # "exact" method. Only computing those fractions is done per source.
+    flux = np.zeros((len(stamps), len(radii)))
+    area = np.zeros((len(stamps), len(radii)))
+    fractions = np.zeros((len(radii), size * size))
+    for index, (x, y) in enumerate(zip(xs, ys, strict=True)):
+        x_min, y_min = -x - 0.5, -y - 0.5
+        for radius_index, radius in enumerate(radii):
+            if radius > 0:
+                fractions[radius_index] = circular_overlap_grid(
+                    x_min,
+                    x_min + size,
+                    y_min,
+                    y_min + size,
+                    size,
+                    size,
+                    radius,
+                    1,
+                    1,
+                ).ravel()
+        flux[index] = fractions @ data[index]
+        area[index] = fractions @ good[index]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        profiles = np.diff(flux, axis=1) / np.diff(area, axis=1)
+
+    return (radii[:-1] + radii[1:]) / 2, profiles
+
+
+def gaussian_fwhm(radius, profiles):
+    """
+    FWHM of the Gaussian, centered at zero, that best fits each profile.
+
+    This gives the same result as the least-squares fit of a
+    `~astropy.modeling.functional_models.Gaussian1D` with its mean fixed at
+    zero done by `photutils.profiles.RadialProfile`, but for all profiles at
+    once. For a given width the best amplitude has a closed form, so only the
+    width needs to be searched for: it is bracketed on a grid and then refined
+    with a golden-section search. Non-finite profile values are ignored.
+
+    Parameters
+    ----------
+    radius : `numpy.ndarray`
+        The radii at which the profiles are given.
+
+    profiles : `numpy.ndarray`
+        The ``(N, len(radius))`` profiles.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        The FWHM of the best-fit Gaussian of each profile.
+    """
+    good = np.isfinite(profiles)
+    profiles = np.where(good, profiles, 0.0)
+
+    def residual(sigma):
+        # Sum of squared residuals for the best amplitude at each sigma
+        gaussian = np.exp(-0.5 * (radius / sigma[..., np.newaxis]) ** 2) * good
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (profiles**2).sum(axis=-1) - (profiles * gaussian).sum(
+                axis=-1
+            ) ** 2 / (gaussian**2).sum(axis=-1)
+
+    # Bracket the minimum on a coarse grid...
+    grid = np.geomspace(0.05, 100 * radius.max(), 300)
+    on_grid = residual(np.broadcast_to(grid, (len(profiles), len(grid))).T)
+    best = np.nanargmin(np.where(np.isfinite(on_grid), on_grid, np.inf), axis=0)
+    low = grid[np.maximum(best - 1, 0)]
+    high = grid[np.minimum(best + 1, len(grid) - 1)]
+
+    # ...and refine it with a golden-section search
+    ratio = (np.sqrt(5) - 1) / 2
+    left = high - ratio * (high - low)
+    right = low + ratio * (high - low)
+    for _ in range(60):
+        go_left = residual(left) < residual(right)
+        high = np.where(go_left, right, high)
+        low = np.where(go_left, low, left)
+        left = high - ratio * (high - low)
+        right = low + ratio * (high - low)
+
+    fwhm = (low + high) / 2 * gaussian_sigma_to_fwhm
+    # A profile needs at least two points to fit a width and an amplitude
+    fwhm[good.sum(axis=1) < 2] = np.nan
+    return fwhm
+
+
+# The values of use_exact and subpixels that the photutils.geometry functions
+# need for each aperture photometry method.
+_OVERLAP_MODES = {
+    "exact": (1, 1),
+    "center": (0, 1),
+}
+
+# Largest total size, in bytes, of the aperture weights kept in the cache.
+WEIGHT_CACHE_BYTES = 16 * 2**20
+
+
+class _WeightCache(OrderedDict):
+    """
+    The most recently used aperture weights, up to a total of ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, compute):
+        """
+        Return the weights for ``key``, calling ``compute`` to make them if
+        they are not in the cache.
+        """
+        try:
+            weights = self[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            self.move_to_end(key)
+            return weights
+
+        self.misses += 1
+        weights = compute()
+        self[key] = weights
+        self.nbytes += weights.nbytes
+        while self.nbytes > self.max_bytes and len(self) > 1:
+            _, oldest = self.popitem(last=False)
+            self.nbytes -= oldest.nbytes
+        return weights
+
+    def clear(self):
+        super().clear()
+        self.nbytes = self.hits = self.misses = 0
+
+
+_weight_cache = _WeightCache(WEIGHT_CACHE_BYTES)
+
+
+def _aperture_weights(radius, inner, outer, offset_x, offset_y, method, subpixels):
+    """
+    Aperture and annulus weights for a source whose offset from the center
+    of the central pixel of the stamp is ``(offset_x, offset_y)``.
+
+    The result is a read-only ``(2, size, size)`` array with the aperture
+    weights first and the annulus weights second, computed in the same way as
+    photutils does for ``method``. The weights are cached, so they are only
+    computed once for sources (and images) with the same offset.
+    """
+
+    def compute():
+        use_exact, n_subpixels = _OVERLAP_MODES.get(method, (0, subpixels))
+        half_size = _half_size(radius, outer)
+        size = 2 * half_size + 1
+        x_min = -half_size - 0.5 - offset_x
+        y_min = -half_size - 0.5 - offset_y
+
+        def overlap(r):
+            x_max, y_max = x_min + size, y_min + size
+            return circular_overlap_grid(
+                x_min, x_max, y_min, y_max, size, size, r, use_exact, n_subpixels
+            )
+
+        weights = np.stack([overlap(radius), overlap(outer)])
+        if inner > 0:
+            weights[1] -= overlap(inner)
+        weights.flags.writeable = False
+        return weights
+
+    key = (radius, inner, outer, offset_x, offset_y, method, subpixels)
+    return _weight_cache.lookup(key, compute)
+
+
+def _half_size(radius, outer):
+    # Half the size of a stamp that contains the aperture and annulus
+    return int(np.ceil(max(radius, outer))) + 1
+
+
+def _source_weights(xs, ys, radius, inner, outer, method, subpixels):
+    """
+    Aperture and annulus weights for each source.
+
+    For the ``"center"`` method the weights are computed directly, since
+    they only depend on the distance to the center of each pixel. For the
+    other methods they are computed, or taken from the cache, for the offset
+    of each source from the center of its pixel.
+
+    Returns
+    -------
+    x_pixels, y_pixels : `numpy.ndarray` of int
+        The pixel at the center of the stamp of each source.
+
+    weights : `numpy.ndarray`
+        The ``(N, 2, size * size)`` aperture and annulus weights.
+    """
+    # Half-integer positions go to the lower pixel, like overlap_slices does
+    x_pixels = np.ceil(xs - 0.5).astype(int)
+    y_pixels = np.ceil(ys - 0.5).astype(int)
+    if method == "center":
+        distance2 = _pixel_distance2(xs, ys, x_pixels, y_pixels, radius, outer)
+        weights = np.stack(
+            [
+                distance2 < radius**2,
+                (distance2 < outer**2) & ~(distance2 < inner**2),
+            ],
+            axis=1,
+        ).astype(float)
+        return x_pixels, y_pixels, weights
+
+    offsets = np.stack([xs - x_pixels, ys - y_pixels], axis=1)
+    unique_offsets, which = np.unique(offsets, axis=0, return_inverse=True)
+    weights = np.stack(
+        [
+            _aperture_weights(
+                radius, inner, outer, float(dx), float(dy), method, subpixels
+            )
+            for dx, dy in unique_offsets
+        ]
+    ).reshape(len(unique_offsets), 2, -1)[which.ravel()]
+    return x_pixels, y_pixels, weights
+
+
+def _pixel_distance2(xs, ys, x_pixels, y_pixels, radius, outer):
+    # Squared distance from each source to the center of each pixel of its
+    # stamp, flattened to shape (N, size * size)
+    half_size = _half_size(radius, outer)
+    pixel_offsets = np.arange(-half_size, half_size + 1)
+    x_offsets = (x_pixels - xs)[:, np.newaxis] + pixel_offsets
+    y_offsets = (y_pixels - ys)[:, np.newaxis] + pixel_offsets
+    distance2 = x_offsets[:, np.newaxis, :] ** 2 + y_offsets[:, :, np.newaxis] ** 2
+    return distance2.reshape(len(xs), -1)
+
+
+def _take_stamps(stamps, indices):
+    # Flattened smaller stamps taken out of each of the (N, size, size) stamps
+    return np.take_along_axis(stamps.reshape(len(stamps), -1), indices, axis=1)
+
+
+def clipped_statistics(values, sigma=5, iters=5, return_mode=False):
+    """
+    Sigma-clipped mean, median and standard deviation of each row of an
+    array, computed for all rows at once.
+
+    Each row is clipped on its own, exactly like
+    `~astropy.stats.SigmaClip` with its default median center and standard
+    deviation does: values more than ``sigma`` standard deviations from the
+    median are rejected, and this is repeated until no more values are
+    rejected or ``iters`` iterations have been done. Rows may have different
+    numbers of values; the array is padded with NaN, which are ignored like
+    all other non-finite values.
+
+    Parameters
+    ----------
+    values : array-like
+        The ``(N, M)`` values, e.g. the pixels in the annulus around each of
+        ``N`` sources, padded with NaN.
+
+    sigma : float or None, optional
+        Number of standard deviations at which values are clipped. If
+        ``None``, no clipping is done.
+
+    iters : int, optional
+        Maximum number of clipping iterations.
+
+    return_mode : bool, optional
+        If ``True``, also return an estimate of the mode of each row,
+        ``3 * median - 2 * mean``.
+
+    Returns
+    -------
+    mean, median, std : `numpy.ndarray`
+        The statistics of the values left in each row after clipping, NaN
+        for rows without any finite values.
+
+    mode : `numpy.ndarray`
+        Only if ``return_mode`` is ``True``.
+
+    Notes
+    -----
+    Each row is sorted once. Since clipping removes the values above and
+    below a bound, the values left in a row are always a contiguous range of
+    the sorted row, so each iteration only has to find the new ends of the
+    ranges.
+    """
+    values = np.asarray(values, dtype=float)
+    values = np.sort(np.where(np.isfinite(values), values, np.nan), axis=1)
+    n_rows = len(values)
+    # The NaN are sorted to the end, so they can be trimmed off
+    stop = np.isfinite(values).sum(axis=1)
+    values = values[:, : stop.max(initial=0)]
+    start = np.zeros(n_rows, dtype=int)
+    columns = np.arange(values.shape[1])
+    rows = np.arange(n_rows)
+
+    def statistics():
+        n_kept = stop - start
+        empty = n_kept == 0
+        # Median of the range of each row; for an empty row any element will
+        # do, since the result is replaced with NaN.
+        last = max(values.shape[1] - 1, 0)
+        low = np.minimum(start + (n_kept - 1) // 2, last)
+        high = np.minimum(start + n_kept // 2, last)
+        if values.size:
+            median = (values[rows, low] + values[rows, high]) / 2
+        else:
+            median = np.zeros(n_rows)
+        kept = (columns >= start[:, np.newaxis]) & (columns < stop[:, np.newaxis])
+        n_kept = np.where(empty, 1, n_kept)
+        mean = np.where(kept, values, 0).sum(axis=1) / n_kept
+        deviations = np.where(kept, values - mean[:, np.newaxis], 0)
+        std = np.sqrt((deviations**2).sum(axis=1) / n_kept)
+        nan = np.full(n_rows, np.nan)
+        return (
+            np.where(empty, nan, mean),
+            np.where(empty, nan, median),
+            np.where(empty, nan, std),
+        )
+
+    mean, median, std = statistics()
+    if sigma is not None:
+        for _ in range(iters):
+            # The bounds of empty rows are NaN, so nothing changes for them
+            lower = (median - sigma * std)[:, np.newaxis]
+            upper = (median + sigma * std)[:, np.newaxis]
+            new_start = np.maximum(start, (values < lower).sum(axis=1))
+            new_stop = np.minimum(stop, (values <= upper).sum(axis=1))
+            if np.array_equal(new_start, start) and np.array_equal(new_stop, stop):
+                break
+            start, stop = new_start, new_stop
+            mean, median, std = statistics()
+
+    if return_mode:
+        return mean, median, std, 3 * median - 2 * mean
+    return mean, median, std
+
+
+def stamp_photometry(
+    data,
+    xs,
+    ys,
+    radius,
+    inner,
+    outer,
+    method="exact",
+    subpixels=5,
+    mask=None,
+    max_value=None,
+    centroid_box_size=None,
+    shift_tolerance=np.inf,
+    sky_sigma=5,
+    sky_iters=5,
+    chunk_size=1024,
+):
+    """
+    Centroids, aperture photometry and sky statistics of sources, all computed
+    from a single stamp of the image around each source.
+
+    The stamp of a source is extracted once (for a batch of sources at a
+    time) and everything is computed from it: the source is recentroided,
+    the stamp is recentered on the new position, and the aperture sum,
+    annulus sum, number of bad pixels in the aperture and statistics of the
+    sky in the annulus are computed. No copy of the whole image is made.
+
+    The results are those of `~photutils.centroids.centroid_sources` with
+    `~photutils.centroids.centroid_com`, of
+    `~photutils.aperture.aperture_photometry` with a
+    `~photutils.aperture.CircularAperture` and a
+    `~photutils.aperture.CircularAnnulus`, and of
+    `~photutils.aperture.ApertureStats` on the annulus, with masked and
+    non-finite pixels left out of all of them. The aperture weights are
+    kept in a cache, so that they are reused for all sources (and images)
+    whose positions have the same offset from the center of a pixel.
+
+    Parameters
+    ----------
+    data : `numpy.ndarray`
+        The 2D image.
+
+    xs, ys : array-like
+        The positions of the sources, in pixels.
+
+    radius : float
+        Radius of the aperture, in pixels.
+
+    inner, outer : float
+        Inner and outer radius of the annulus, in pixels.
+
+    method : {"exact", "center", "subpixel"}, optional
+        How partial pixels are handled; see
+        `photutils.aperture.aperture_photometry`.
+
+    subpixels : int, optional
+        Number of subpixels in each dimension for the ``"subpixel"`` method.
+
+    mask : `numpy.ndarray` of bool, optional
+        Pixels that are ``True`` are left out of everything. Non-finite pixels
+        are always left out.
+
+    max_value : float, optional
+        Pixels above this value, e.g. saturated pixels, are treated like
+        non-finite pixels.
+
+    centroid_box_size : int, optional
+        If given, the sources are recentroided using the center of mass of
+        the pixels in a box of this (odd) size around the input positions.
+
+    shift_tolerance : float, optional
+        A source whose centroid is farther than this from its input position,
+        or whose centroid cannot be computed, keeps its input position.
+
+    sky_sigma : float or None, optional
+        Number of standard deviations at which sky pixels are clipped before
+        computing the sky statistics. If ``None``, no clipping is done.
+
+    sky_iters : int, optional
+        Maximum number of sigma clipping iterations for the sky.
+
+    chunk_size : int, optional
+        Number of sources for which stamps are extracted at once.
+
+    Returns
+    -------
+    `astropy.table.Table`
+        Table with the columns ``xcenter``, ``ycenter`` (the positions used for
+        the photometry), ``aperture_sum``, ``annulus_sum``, ``bad_pixel_sum``
+        (the number of non-finite pixels, or pixels above ``max_value``, in the
+        aperture, weighted like the data) and ``sky_mean``, ``sky_median`` and
+        ``sky_std`` (statistics of the pixels whose center is in the annulus).
+
+    Raises
+    ------
+    ValueError
+        If ``method`` is not valid or a position is not finite.
+
+    NoOverlapError
+        If the stamp of a source does not overlap the image at all.
+    """
+    if method not in ("exact", "center", "subpixel"):
+        raise ValueError(
+            f"Invalid method '{method}', must be 'exact', 'center' or 'subpixel'."
+        )
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    half_size = _half_size(radius, outer)
+    size = 2 * half_size + 1
+
+    # The stamps are centered on the pixel closest to the input position and
+    # are large enough to also contain the stamp around the refined position.
+    # A center of mass is always inside its box, which limits the shift.
+    if centroid_box_size is not None:
+        box_half_size = centroid_box_size // 2
+        margin = min(np.ceil(shift_tolerance), box_half_size) + 1
+        big_half_size = int(max(half_size + margin, box_half_size))
+    else:
+        big_half_size = half_size
+
+    results = {
+        name: np.full(len(xs), np.nan)
+        for name in [
+            "xcenter",
+            "ycenter",
+            "aperture_sum",
+            "annulus_sum",
+            "bad_pixel_sum",
+            "sky_mean",
+            "sky_median",
+            "sky_std",
+        ]
+    }
+
+    for start in range(0, len(xs), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        x_stamps = np.ceil(xs[chunk] - 0.5).astype(int)
+        y_stamps = np.ceil(ys[chunk] - 0.5).astype(int)
+        stamps = StampCube(
+            data, x_stamps, y_stamps, 2 * big_half_size + 1, mask=mask, fill_value=0
+        )
+        bad = ~np.isfinite(stamps.data)
+        if max_value is not None:
+            bad |= stamps.data > max_value
+        masked = stamps.mask if stamps.mask is not None else stamps.outside
+        good = ~(bad | masked)
+        clean = np.where(good, stamps.data, 0.0)
+        n_stamps = len(stamps)
+
+        x_new, y_new = xs[chunk], ys[chunk]
+        if centroid_box_size is not None:
+            # Same as centroid_com in the box used by centroid_sources, with
+            # the masked pixels set to zero
+            box = slice(
+                big_half_size - box_half_size, big_half_size + box_half_size + 1
+            )
+            box_data = clean[:, box, box]
+            offsets = np.arange(centroid_box_size)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                total = box_data.sum(axis=(1, 2))
+                x_cen = (box_data * offsets).sum(axis=(1, 2)) / total
+                y_cen = (box_data * offsets[:, np.newaxis]).sum(axis=(1, 2)) / total
+            x_cen += x_stamps - box_half_size
+            y_cen += y_stamps - box_half_size
+
+            # Sources that cannot be centroided or moved too much keep their
+            # input positions
+            shift = np.hypot(x_cen - x_new, y_cen - y_new)
+            keep = ~np.isfinite(shift) | (shift > shift_tolerance)
+            x_new = np.where(keep, x_new, x_cen)
+            y_new = np.where(keep, y_new, y_cen)
+
+        results["xcenter"][chunk] = x_new
+        results["ycenter"][chunk] = y_new
+
+        # Cut the photometry stamps, centered on the pixel closest to the
+        # positions, out of the larger stamps
+        x_pixels, y_pixels, weights = _source_weights(
+            x_new, y_new, radius, inner, outer, method, subpixels
+        )
+        pixel_offsets = np.arange(size) - half_size
+        rows = (y_pixels - y_stamps)[:, np.newaxis] + pixel_offsets + big_half_size
+        cols = (x_pixels - x_stamps)[:, np.newaxis] + pixel_offsets + big_half_size
+        indices = rows[:, :, np.newaxis] * stamps.size + cols[:, np.newaxis, :]
+        indices = indices.reshape(n_stamps, -1)
+        clean_stamps = _take_stamps(clean, indices)
+
+        sums = np.einsum("nk,nmk->nm", clean_stamps, weights)
+        results["aperture_sum"][chunk] = sums[:, 0]
+        results["annulus_sum"][chunk] = sums[:, 1]
+        results["bad_pixel_sum"][chunk] = np.einsum(
+            "nk,nk->n", _take_stamps(bad, indices), weights[:, 0]
+        )
+
+        # The sky pixels are those whose center is in the annulus, which are
+        # the ones ApertureStats uses. These use the exact positions.
+        distance2 = _pixel_distance2(x_new, y_new, x_pixels, y_pixels, radius, outer)
+        in_annulus = (distance2 >= inner**2) & (distance2 < outer**2)
+        sky = np.where(_take_stamps(good, indices) & in_annulus, clean_stamps, np.nan)
+        (
+            results["sky_mean"][chunk],
+            results["sky_median"][chunk],
+            results["sky_std"][chunk],
+        ) = clipped_statistics(sky, sky_sigma, sky_iters)
+
+    return Table(results)
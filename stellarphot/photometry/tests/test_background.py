@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from astropy import units as u
+from astropy.nddata import CCDData
+
+from stellarphot.photometry import BackgroundMesh
+
+RANDOM_SEED = 2098234
+
+SHAPE = (300, 420)
+
+
+def _sky_with_gradient(noise=5.0):
+    # A background that increases from 100 to about 184 across the image
+    rng = np.random.default_rng(RANDOM_SEED)
+    y, x = np.mgrid[: SHAPE[0], : SHAPE[1]]
+    sky = 100 + 0.2 * x
+    return sky, sky + rng.normal(0, noise, size=SHAPE)
+
+
+@pytest.mark.parametrize("accuracy", [0.1, 0.001])
+def test_background_mesh_follows_gradient(accuracy):
+    sky, image = _sky_with_gradient()
+    background = BackgroundMesh(image, box_size=32, accuracy=accuracy)
+
+    # The last row and column of boxes are smaller than the others
+    assert background.background_mesh.shape == (10, 14)
+    assert background.rms_mesh.shape == (10, 14)
+    assert background.background.shape == SHAPE
+    assert "10 by 14 boxes of 32 pixels" in repr(background)
+
+    # The background is linear, so it can be interpolated exactly between
+    # the centers of the boxes, but is constant past the outer centers. It is
+    # found to within a fraction of the noise.
+    inside = (
+        slice(int(background.y_centers[0]), int(background.y_centers[-1])),
+        slice(int(background.x_centers[0]), int(background.x_centers[-1])),
+    )
+    np.testing.assert_allclose(background.background[inside], sky[inside], atol=2.5)
+    np.testing.assert_allclose(background.background_rms[inside], 5, rtol=0.2)
+    assert background.median_rms == pytest.approx(5, rel=0.1)
+
+    # The background at a position is the same as at that pixel
+    ys, xs = np.array([[10, 150, 299], [3, 200, 418]])
+    np.testing.assert_allclose(
+        background.background_at(xs, ys), background.background[ys, xs]
+    )
+    np.testing.assert_allclose(
+        background.rms_at(xs, ys), background.background_rms[ys, xs]
+    )
+
+
+def test_background_mesh_full_image_is_only_made_once():
+    _, image = _sky_with_gradient()
+    background = BackgroundMesh(image)
+    assert background.background is background.background
+
+
+@pytest.mark.parametrize("accuracy", [0.1, 0.02])
+def test_background_mesh_equivalent_area(accuracy):
+    # The scatter of the background of a box over many images of noise is
+    # that of the mean of equivalent_area pixels
+    rng = np.random.default_rng(RANDOM_SEED)
+    noise = 5.0
+    backgrounds = [
+        BackgroundMesh(
+            rng.normal(100, noise, size=(64, 64)),
+            box_size=64,
+            filter_size=1,
+            accuracy=accuracy,
+        )
+        for _ in range(300)
+    ]
+    area = backgrounds[0].equivalent_area
+    scatter = np.std(
+        [background.background_at(31.5, 31.5) for background in backgrounds]
+    )
+    assert scatter == pytest.approx(noise / np.sqrt(area), rel=0.15)
+
+
+def test_background_mesh_ignores_stars():
+    _, image = _sky_with_gradient()
+    no_star = BackgroundMesh(image, box_size=32)
+    # A bright star in one box is clipped, and the median filter removes any
+    # box that it would still dominate.
+    image[140:160, 200:220] += 1e4
+    star = BackgroundMesh(image, box_size=32)
+    np.testing.assert_allclose(star.background_mesh, no_star.background_mesh, atol=2)
+
+
+def test_background_mesh_masked_pixels():
+    _, image = _sky_with_gradient()
+    expected = BackgroundMesh(image, box_size=32, filter_size=1)
+
+    # Mask a region of bad pixels that covers several boxes entirely
+    mask = np.zeros(SHAPE, dtype=bool)
+    mask[:100, :100] = True
+    image[mask] = -1e6
+    ccd = CCDData(image, mask=mask, unit=u.adu)
+    background = BackgroundMesh(ccd, box_size=32, filter_size=1)
+
+    assert np.isfinite(background.background_mesh).all()
+    # Boxes that have enough good pixels are not affected
+    np.testing.assert_allclose(
+        background.background_mesh[4:, 4:], expected.background_mesh[4:, 4:]
+    )
+    # The masked boxes are filled in from their neighbors
+    assert (background.background_mesh[:3, :3] > 90).all()
+
+    # Non-finite pixels are ignored in the same way as masked pixels
+    image[mask] = np.nan
+    np.testing.assert_allclose(
+        BackgroundMesh(image, box_size=32, filter_size=1).background_mesh,
+        background.background_mesh,
+    )
+
+
+def test_background_mesh_errors():
+    _, image = _sky_with_gradient()
+    with pytest.raises(ValueError, match="box_size must be at least 1"):
+        BackgroundMesh(image, box_size=0)
+    with pytest.raises(ValueError, match="must be two-dimensional"):
+        BackgroundMesh(image[0])
+    with pytest.raises(ValueError, match="Every box has too many masked"):
+        BackgroundMesh(np.full(SHAPE, np.nan))
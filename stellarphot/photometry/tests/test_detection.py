@@ -8,9 +8,15 @@ from astropy.stats import gaussian_sigma_to_fwhm
 from astropy.table import QTable
 from astropy.utils.data import get_pkg_data_path
 from astropy.utils.exceptions import AstropyUserWarning
+from photutils.utils import NoDetectionsWarning
 
 from stellarphot import SourceListData
-from stellarphot.photometry import compute_fwhm, fast_fwhm_from_image, source_detection
+from stellarphot.photometry import (
+    BackgroundMesh,
+    compute_fwhm,
+    fast_fwhm_from_image,
+    source_detection,
+)
 from stellarphot.photometry.tests.fake_image import FakeCCDImage, FakeImage
 from stellarphot.settings.models import FwhmMethods
 
@@ -178,6 +184,110 @@ def test_detect_source_bad_input():
         source_detection(None)
 
 
+@pytest.mark.parametrize("local_statistics", [True, False])
+@pytest.mark.parametrize("tile_size,workers", [(100, None), (173, 3)])
+def test_detect_source_in_tiles(tile_size, workers, local_statistics):
+    # Tiles of 100 pixels put several of the sources near the edges of tiles
+    fake_image = FakeCCDImage(seed=SEED, n_repeats=3)
+    fwhm = 2 * fake_image.sources["x_stddev"].mean()
+    if local_statistics:
+        sky_per_pix = stddev = None
+    else:
+        sky_per_pix = fake_image.sources["sky_per_pix_avg"].mean()
+        stddev = fake_image.noise_dev
+
+    whole_image_sources = source_detection(
+        fake_image,
+        fwhm=fwhm,
+        threshold=10,
+        sky_per_pix_avg=sky_per_pix,
+        stddev=stddev,
+    )
+    tiled_sources = source_detection(
+        fake_image,
+        fwhm=fwhm,
+        threshold=10,
+        sky_per_pix_avg=sky_per_pix,
+        stddev=stddev,
+        tile_size=tile_size,
+        workers=workers,
+    )
+
+    assert isinstance(tiled_sources, SourceListData)
+    assert len(tiled_sources) == len(fake_image.sources)
+    assert list(tiled_sources["star_id"]) == list(range(1, len(tiled_sources) + 1))
+    whole_image_sources.sort("xcenter")
+    tiled_sources.sort("xcenter")
+    for column in ["xcenter", "ycenter", "ra", "dec"]:
+        np.testing.assert_allclose(
+            tiled_sources[column], whole_image_sources[column], rtol=1e-10
+        )
+    # With local statistics the sky level subtracted when measuring the FWHM
+    # is a little different.
+    np.testing.assert_allclose(
+        tiled_sources["width"],
+        whole_image_sources["width"],
+        rtol=1e-3 if local_statistics else 1e-10,
+    )
+
+
+@pytest.mark.parametrize("tile_size", [None, 100])
+def test_detect_source_with_background_mesh(tile_size):
+    # A background that increases by about 20 times the noise across the
+    # image, which is too much for a single sky value
+    fake_image = FakeCCDImage(seed=SEED, n_repeats=3)
+    fwhm = 2 * fake_image.sources["x_stddev"].mean()
+    flat_sources = source_detection(
+        fake_image,
+        fwhm=fwhm,
+        threshold=10,
+        sky_per_pix_avg=fake_image.sources["sky_per_pix_avg"].mean(),
+        stddev=fake_image.noise_dev,
+    )
+    x = np.arange(fake_image.shape[1])
+    fake_image.data = fake_image.data + 20 * fake_image.noise_dev * x / x.max()
+
+    background = BackgroundMesh(fake_image, box_size=32)
+    sources = source_detection(
+        fake_image, fwhm=fwhm, threshold=10, background=background, tile_size=tile_size
+    )
+
+    assert len(sources) == len(fake_image.sources)
+    sources.sort("xcenter")
+    flat_sources.sort("xcenter")
+    for column in ["xcenter", "ycenter"]:
+        np.testing.assert_allclose(sources[column], flat_sources[column], atol=0.05)
+    np.testing.assert_allclose(sources["width"], flat_sources["width"], rtol=0.02)
+
+
+def test_compute_fwhm_with_background_mesh():
+    fake_image = FakeImage(seed=SEED)
+    sources = fake_image.sources
+    background = BackgroundMesh(fake_image.image, box_size=32)
+    fwhm_x, _ = compute_fwhm(
+        fake_image.image,
+        sources,
+        x_column="x_mean",
+        y_column="y_mean",
+        background=background,
+    )
+    expected_fwhm = np.array(sources["x_stddev"] * gaussian_sigma_to_fwhm)
+    np.testing.assert_allclose(fwhm_x, expected_fwhm, rtol=1e-2)
+
+    with pytest.raises(ValueError, match="Cannot specify `background` with"):
+        compute_fwhm(
+            fake_image.image, sources, sky_per_pix_avg=0, background=background
+        )
+
+
+def test_detect_source_in_tiles_no_sources():
+    with pytest.warns(NoDetectionsWarning, match="No sources were found"):
+        with pytest.raises(TypeError):
+            # Like the whole image, an image with no sources is an error after
+            # the warning.
+            source_detection(np.zeros((50, 50)), stddev=1, tile_size=20)
+
+
 @pytest.mark.parametrize(
     "fit_method", [FwhmMethods.FIT, FwhmMethods.PROFILE, FwhmMethods.MOMENTS]
 )
@@ -290,6 +400,22 @@ def test_fast_fwhm_from_image(aggregate_by, n_bright_expect):
         assert fwhms != fwhms_some_max_out
 
 
+def test_fast_fwhm_from_image_with_background_mesh():
+    expected_fwhm = 5.5
+    fake_image = FakeImage(seed=SEED, fwhm=expected_fwhm, n_repeats_per_side=5)
+    x = np.arange(fake_image.image.shape[1])
+    image = fake_image.image + 20 * fake_image.noise_dev * x / x.max()
+    fwhm = fast_fwhm_from_image(
+        image,
+        5,
+        noise=fake_image.noise_dev,
+        n_brightest_sources=20,
+        max_adu=65000,
+        background=BackgroundMesh(image),
+    )
+    assert fwhm == pytest.approx(fake_image.input_fwhm, rel=0.01)
+
+
 def test_fast_fwhm_from_image_bad_aggregate():
     # check that providing a bad aggregate_by method raises an error
     expected_fwhm = 5.5
@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from ccdproc import ImageFileCollection
+
+from stellarphot.photometry import HeaderIndex, header_index
+
+
+def _write_image(path, **keywords):
+    header = fits.Header()
+    for key, value in keywords.items():
+        header[key.upper().replace("_", "-")] = value
+    fits.writeto(path, np.zeros((4, 4)), header, overwrite=True)
+
+
+def _wcs_keywords():
+    return dict(
+        ctype1="RA---TAN",
+        ctype2="DEC--TAN",
+        crval1=10,
+        crval2=20,
+        crpix1=2,
+        crpix2=2,
+        cdelt1=1e-4,
+        cdelt2=1e-4,
+    )
+
+
+@pytest.fixture
+def image_directory(tmp_path):
+    _write_image(tmp_path / "a.fits", object="M13", filter="V", exptime=30)
+    _write_image(
+        tmp_path / "b.fit",
+        object="m13",
+        filter="B",
+        exposure=60,
+        airmass=1.2,
+        date_obs="2024-01-01T00:00:00",
+        **_wcs_keywords(),
+    )
+    _write_image(tmp_path / "c.fts", object="M31", filter="V", exptime=30)
+    _write_image(tmp_path / "d.fits", filter="V")
+    (tmp_path / "notes.txt").write_text("not an image")
+    return tmp_path
+
+
+def test_header_index_values(image_directory):
+    with HeaderIndex(image_directory) as index:
+        assert index.update() == 4
+        summary = index.summary
+    assert index.index_path == image_directory / HeaderIndex.index_name
+    assert list(summary["file"]) == ["a.fits", "b.fit", "c.fts", "d.fits"]
+    assert list(summary["exposure"]) == [30, 60, 30, None]
+    assert list(summary["exposure_keyword"]) == ["EXPTIME", "EXPOSURE", "EXPTIME", None]
+    assert list(summary["has_wcs"]) == [False, True, False, False]
+    assert summary["airmass"][1] == 1.2
+    assert summary["date_obs"][1] == "2024-01-01T00:00:00"
+
+
+@pytest.mark.parametrize(
+    "keywords",
+    [dict(object="M13"), dict(object="m31", filter="v"), dict(object=None), {}],
+)
+def test_header_index_matches_image_file_collection(image_directory, keywords):
+    ifc = ImageFileCollection(image_directory)
+    with HeaderIndex(image_directory) as index:
+        index.update()
+        for include_path in [True, False]:
+            assert index.files_filtered(include_path=include_path, **keywords) == list(
+                ifc.files_filtered(include_path=include_path, **keywords)
+            )
+
+
+def test_header_index_filters(image_directory):
+    with HeaderIndex(image_directory) as index:
+        index.update()
+        assert index.files_filtered(object="*") == ["a.fits", "b.fit", "c.fts"]
+        assert index.files_filtered(has_wcs=True) == ["b.fit"]
+        assert index.files_filtered(exposure=30, filter="V") == ["a.fits", "c.fts"]
+        with pytest.raises(ValueError, match="not in the header index"):
+            index.files_filtered(imagetyp="light")
+
+
+def test_header_index_is_incremental(image_directory):
+    with HeaderIndex(image_directory) as index:
+        index.update()
+
+    # Nothing changed, so no headers are read
+    with HeaderIndex(image_directory) as index:
+        assert index.update() == 0
+
+    # Change one image, add one and remove one
+    _write_image(image_directory / "a.fits", object="M31", exptime=30)
+    stat = (image_directory / "a.fits").stat()
+    os.utime(image_directory / "a.fits", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    _write_image(image_directory / "e.fits", object="M31")
+    (image_directory / "c.fts").unlink()
+    with HeaderIndex(image_directory) as index:
+        assert index.update() == 2
+        assert index.files_filtered(object="M31") == ["a.fits", "e.fits"]
+        assert len(index.summary) == 4
+
+
+def test_header_index_unreadable_image(image_directory):
+    # An image that is still being written is left out until it can be read
+    (image_directory / "partial.fits").write_bytes(b"SIMPLE  =")
+    with HeaderIndex(image_directory) as index:
+        assert index.update() == 4
+        assert "partial.fits" not in index.files_filtered()
+        assert index.update() == 0
+
+
+def test_header_index_other_extension(image_directory):
+    with HeaderIndex(image_directory) as index:
+        index.update()
+    # An index made for another extension is not reused
+    with HeaderIndex(image_directory, ext=1) as index:
+        assert len(index.summary) == 0
+
+
+def test_header_index_in_memory_if_not_writable(image_directory, monkeypatch):
+    connect = sqlite3.connect
+
+    def read_only(database, *args, **kwargs):
+        if database != ":memory:":
+            raise sqlite3.OperationalError("attempt to write a readonly database")
+        return connect(database, *args, **kwargs)
+
+    monkeypatch.setattr(sqlite3, "connect", read_only)
+    with HeaderIndex(image_directory) as index:
+        assert index.index_path is None
+        assert index.update() == 4
+
+
+def test_header_index_in_memory(image_directory):
+    with HeaderIndex(image_directory, index_path=":memory:") as index:
+        assert index.index_path is None
+        assert index.update() == 4
+        assert index.update() == 0
+    assert not (image_directory / HeaderIndex.index_name).exists()
+
+
+def _lock(index_path):
+    # Hold a write lock on the index, as another process updating it would
+    other = sqlite3.connect(index_path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN EXCLUSIVE")
+    return other
+
+
+def test_header_index_waits_for_lock(image_directory):
+    with HeaderIndex(image_directory) as index:
+        other = _lock(index.index_path)
+        release = threading.Timer(0.2, other.rollback)
+        release.start()
+        try:
+            assert index.update() == 4
+        finally:
+            release.join()
+            other.close()
+        assert index.index_path is not None
+
+
+def test_header_index_in_memory_if_locked(image_directory, monkeypatch):
+    monkeypatch.setattr(header_index, "BUSY_TIMEOUT", 0.05)
+    with HeaderIndex(image_directory) as index:
+        other = _lock(index.index_path)
+        try:
+            assert index.update() == 4
+            assert index.index_path is None
+            assert index.files_filtered(object="M31") == ["c.fts"]
+        finally:
+            other.close()
+
+
+def test_header_index_bad_directory(tmp_path):
+    with pytest.raises(ValueError, match="not a valid directory"):
+        HeaderIndex(tmp_path / "nope")
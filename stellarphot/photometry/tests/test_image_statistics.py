@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from astropy.nddata import CCDData
+from astropy.stats import sigma_clipped_stats
+
+from stellarphot.photometry import fast_sigma_clipped_stats
+
+RANDOM_SEED = 8675309
+
+
+def _image(shape):
+    # Gaussian noise with a few very bright pixels that clipping should remove
+    rng = np.random.default_rng(RANDOM_SEED)
+    image = rng.normal(1000, 10, size=shape)
+    image[rng.integers(0, shape[0], 100), rng.integers(0, shape[1], 100)] = 1e5
+    return image
+
+
+def test_small_image_same_as_astropy():
+    image = _image((100, 100))
+    np.testing.assert_allclose(
+        fast_sigma_clipped_stats(image), sigma_clipped_stats(image)
+    )
+
+
+@pytest.mark.parametrize("sampling", ["grid", "random"])
+def test_large_image_within_accuracy(sampling):
+    image = _image((1000, 1000))
+    accuracy = 0.01
+    mean, median, std = fast_sigma_clipped_stats(
+        image, accuracy=accuracy, sampling=sampling
+    )
+    full_mean, full_median, full_std = sigma_clipped_stats(image)
+    # Allow for four times the standard error of the median
+    assert abs(median - full_median) < 4 * accuracy * full_std
+    assert abs(mean - full_mean) < 4 * accuracy * full_std
+    np.testing.assert_allclose(std, full_std, rtol=0.05)
+
+
+def test_masked_pixels_are_ignored():
+    image = _image((1000, 1000))
+    mask = np.zeros_like(image, dtype=bool)
+    mask[:500] = True
+    image[:500] = 0
+
+    ccd = CCDData(image, mask=mask, unit="adu")
+    assert fast_sigma_clipped_stats(ccd)[1] == pytest.approx(1000, abs=1)
+    masked = np.ma.masked_array(image, mask=mask)
+    assert fast_sigma_clipped_stats(masked)[1] == pytest.approx(1000, abs=1)
+
+
+def test_nan_pixels_are_ignored():
+    image = _image((1000, 1000))
+    image[:500] = np.nan
+    assert fast_sigma_clipped_stats(image)[1] == pytest.approx(1000, abs=1)
+
+
+def test_no_clipping():
+    image = _image((50, 50))
+    np.testing.assert_allclose(
+        fast_sigma_clipped_stats(image, sigma=None),
+        (np.mean(image), np.median(image), np.std(image)),
+    )
+
+
+def test_bad_sampling():
+    with pytest.raises(ValueError, match="sampling must be 'grid' or 'random'"):
+        fast_sigma_clipped_stats(_image((1000, 1000)), sampling="every other")
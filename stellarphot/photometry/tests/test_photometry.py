@@ -1,4 +1,5 @@
 import logging
+import mmap
 import tempfile
 import warnings
 from copy import deepcopy
@@ -8,17 +9,28 @@ import numpy as np
 import pytest
 from astropy import units as u
 from astropy.io import ascii
-from astropy.stats import gaussian_sigma_to_fwhm
+from astropy.nddata import CCDData
+from astropy.stats import SigmaClip, gaussian_sigma_to_fwhm
+from astropy.table import Table, vstack
 from astropy.utils.data import get_pkg_data_filename
 from astropy.utils.metadata.exceptions import MergeConflictWarning
+from astropy.wcs import WCS, Sip
+from photutils.aperture import ApertureStats, CircularAnnulus
 
 from stellarphot.core import SourceListData
 from stellarphot.photometry import (
     AperturePhotometry,
+    BackgroundMesh,
+    HeaderIndex,
+    PhotometryCheckpoint,
+    PhotometryWatcher,
     calculate_noise,
+    clipped_sky_per_pix_stats,
     find_too_close,
     source_detection,
 )
+from stellarphot.photometry import photometry as photometry_module
+from stellarphot.photometry import watcher as watcher_module
 from stellarphot.photometry.tests.fake_image import FakeCCDImage, shift_FakeCCDImage
 from stellarphot.settings import (
     Camera,
@@ -438,6 +450,82 @@ class TestAperturePhotometry:
         phot_exact, _ = ap_phot_exact(image_file)
         assert np.all(phot_exact["aperture_sum"] != phot_center["aperture_sum"])
 
+    def test_photometry_sky_from_background_mesh(
+        self, tmp_path, photometry_settings_for_test
+    ):
+        # With sky_method="mesh" the sky of each source is the background of
+        # the image at its position, which follows a gradient.
+        fake_CCDimage = deepcopy(FAKE_CCD_IMAGE)
+        x = np.arange(fake_CCDimage.shape[1])
+        gradient = 10 * fake_CCDimage.noise_dev * x / x.max()
+        fake_CCDimage.data = fake_CCDimage.data + gradient
+
+        source_list = self.create_source_list()
+        source_list_file = tmp_path / "source_list.ecsv"
+        source_list.write(source_list_file, overwrite=True)
+        image_file = tmp_path / "fake_image.fits"
+        fake_CCDimage.write(image_file, overwrite=True)
+
+        photometry_settings_for_test.source_location_settings.source_list_file = str(
+            source_list_file
+        )
+        photometry_settings_for_test.photometry_optional_settings.sky_method = "mesh"
+        ap_phot = AperturePhotometry(settings=photometry_settings_for_test)
+        phot, _ = ap_phot(image_file)
+
+        assert len(phot) == len(source_list)
+        phot.sort("star_id")
+        true_sky = fake_CCDimage.mean_noise + np.interp(
+            phot["xcenter"].value, x, gradient
+        )
+        np.testing.assert_allclose(
+            phot["sky_per_pix_avg"].value,
+            true_sky,
+            atol=0.5 * fake_CCDimage.noise_dev,
+        )
+        np.testing.assert_array_equal(phot["sky_per_pix_med"], phot["sky_per_pix_avg"])
+        np.testing.assert_allclose(
+            phot["sky_per_pix_std"].value, fake_CCDimage.noise_dev, rtol=0.2
+        )
+
+        aperture = photometry_settings_for_test.photometry_apertures.radius
+        for inp, out in zip(FAKE_CCD_IMAGE.sources, phot, strict=True):
+            stdev = inp["x_stddev"]
+            expected_flux = (
+                inp["amplitude"]
+                * 2
+                * np.pi
+                * stdev**2
+                * (1 - np.exp(-(aperture**2) / (2 * stdev**2)))
+            )
+            expected_deviation = np.pi * aperture**2 * fake_CCDimage.noise_dev
+            assert (
+                np.abs(expected_flux - out["aperture_net_cnts"].value)
+                < expected_deviation
+            )
+
+        # The error of the sky comes from the pixels behind the mesh rather
+        # than from the annulus
+        background = BackgroundMesh(fake_CCDimage)
+        noise_options = dict(
+            camera=photometry_settings_for_test.camera,
+            counts=phot["aperture_net_cnts"].value,
+            sky_per_pix=phot["sky_per_pix_avg"].value,
+            aperture_area=phot["aperture_area"].value,
+            exposure=phot["exposure"].value,
+            include_digitization=(
+                photometry_settings_for_test.photometry_optional_settings.include_dig_noise
+            ),
+        )
+        np.testing.assert_allclose(
+            phot["noise_electrons"].value,
+            calculate_noise(annulus_area=background.equivalent_area, **noise_options),
+        )
+        assert np.all(
+            phot["noise_electrons"].value
+            > calculate_noise(annulus_area=phot["annulus_area"].value, **noise_options)
+        )
+
     def test_aperture_photometry_flags_saturated_source(
         self, tmp_path, photometry_settings_for_test
     ):
@@ -904,6 +992,436 @@ class TestAperturePhotometry:
         # The single missing source must have been rejected from every image.
         assert missing_id not in set(phot_data["star_id"])
 
+    def test_photometry_on_directory_parallel_matches_serial(
+        self, tmp_path, photometry_settings_for_test
+    ):
+        # Running the photometry in a pool of processes must give exactly the
+        # same result, in the same order, as running it one image at a time.
+        num_files = 4
+        fake_images = self.list_of_fakes(num_files)
+
+        noise_unit = photometry_settings_for_test.camera.read_noise.unit
+        photometry_settings_for_test.camera.read_noise = (
+            fake_images[0].noise_dev * noise_unit
+        )
+
+        for i, image in enumerate(fake_images):
+            image.write(tmp_path / f"tempfile_{i:02d}.fit")
+        object_name = fake_images[0].header["OBJECT"]
+
+        found_sources = source_detection(
+            fake_images[0],
+            fwhm=fake_images[0].sources["x_stddev"].mean(),
+            threshold=10,
+        )
+        source_list_file = tmp_path / "source_list.ecsv"
+        found_sources.write(source_list_file, format="ascii.ecsv", overwrite=True)
+
+        source_locations = photometry_settings_for_test.source_location_settings
+        source_locations.use_coordinates = "sky"
+        source_locations.source_list_file = str(source_list_file)
+        logging_settings = photometry_settings_for_test.logging_settings.model_copy()
+        logging_settings.logfile = "test.log"
+        logging_settings.console_log = False
+        photometry_settings_for_test.logging_settings = logging_settings
+
+        results = {}
+        log_contents = {}
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore",
+                message="Cannot merge meta key",
+                category=MergeConflictWarning,
+            )
+            ap_phot = AperturePhotometry(settings=photometry_settings_for_test)
+            for workers in [None, 2]:
+                results[workers] = ap_phot(
+                    tmp_path, object_of_interest=object_name, workers=workers
+                )
+                log_file = tmp_path / "test.log"
+                log_contents[workers] = log_file.read_text()
+                log_file.unlink()
+
+        serial, parallel = results[None], results[2]
+        assert len(parallel) == len(serial) == num_files * len(found_sources)
+        assert parallel.colnames == serial.colnames
+        for column in serial.colnames:
+            if column == "date-obs":
+                assert all(parallel[column] == serial[column])
+            elif serial[column].dtype.kind == "f":
+                np.testing.assert_array_equal(parallel[column], serial[column])
+            else:
+                assert list(parallel[column]) == list(serial[column])
+
+        # The messages from the workers are logged by the parent, in order.
+        assert log_contents[2] == log_contents[None]
+
+    def test_iter_directory_matches_multi_image_photometry(
+        self, tmp_path, photometry_settings_for_test
+    ):
+        # Stacking the per-image results of the streaming API must give the
+        # same table as doing photometry on the whole directory at once.
+        num_files = 3
+        fake_images = self.list_of_fakes(num_files)
+
+        noise_unit = photometry_settings_for_test.camera.read_noise.unit
+        photometry_settings_for_test.camera.read_noise = (
+            fake_images[0].noise_dev * noise_unit
+        )
+
+        file_names = [f"tempfile_{i:02d}.fit" for i in range(num_files)]
+        for file_name, image in zip(file_names, fake_images, strict=True):
+            image.write(tmp_path / file_name)
+        object_name = fake_images[0].header["OBJECT"]
+
+        found_sources = source_detection(
+            fake_images[0],
+            fwhm=fake_images[0].sources["x_stddev"].mean(),
+            threshold=10,
+        )
+        source_list_file = tmp_path / "source_list.ecsv"
+        found_sources.write(source_list_file, format="ascii.ecsv", overwrite=True)
+
+        source_locations = photometry_settings_for_test.source_location_settings
+        source_locations.use_coordinates = "sky"
+        source_locations.source_list_file = str(source_list_file)
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore",
+                message="Cannot merge meta key",
+                category=MergeConflictWarning,
+            )
+            ap_phot = AperturePhotometry(settings=photometry_settings_for_test)
+            # The header index can be kept out of the image directory
+            streamed = list(
+                ap_phot.iter_directory(
+                    tmp_path, object_of_interest=object_name, index_path=":memory:"
+                )
+            )
+            assert not (tmp_path / HeaderIndex.index_name).exists()
+            all_phot = ap_phot(
+                tmp_path, object_of_interest=object_name, reject_unmatched=False
+            )
+            assert (tmp_path / HeaderIndex.index_name).exists()
+            # Reading only the sections of the images gives the same result
+            sections_phot = ap_phot(
+                tmp_path,
+                object_of_interest=object_name,
+                reject_unmatched=False,
+                read_sections=True,
+            )
+
+        assert [fname for fname, _, _ in streamed] == file_names
+        for fname, phot, dropped in streamed:
+            assert dropped == []
+            assert set(phot["file"]) == {fname}
+        stacked = vstack([phot for _, phot, _ in streamed])
+        assert len(stacked) == len(all_phot)
+        np.testing.assert_array_equal(
+            stacked["aperture_net_cnts"], all_phot["aperture_net_cnts"]
+        )
+        np.testing.assert_array_equal(
+            sections_phot["aperture_net_cnts"], all_phot["aperture_net_cnts"]
+        )
+
+    @pytest.mark.parametrize("sky_method", ["annulus", "mesh"])
+    @pytest.mark.parametrize("dtype", [np.uint16, np.float32])
+    @pytest.mark.parametrize("coords", ["pixel", "sky"])
+    def test_read_image_sections_matches_full_image(
+        self,
+        tmp_path,
+        photometry_settings_for_test,
+        coords,
+        dtype,
+        sky_method,
+        monkeypatch,
+    ):
+        # Photometry on only the parts of the image around the sources must
+        # be the same as on the whole image. An image of unsigned integers is
+        # scaled, so sections of it are read, while an image of floats is
+        # memory-mapped. The image has a saturated source. A sky modelled
+        # from the whole image needs all of a scaled image to be read.
+        fake_CCDimage = deepcopy(FAKE_CCD_IMAGE)
+        max_adu = photometry_settings_for_test.camera.max_data_value.value
+        source_list = self.create_source_list()
+        x_sat = int(source_list[0]["xcenter"].value)
+        y_sat = int(source_list[0]["ycenter"].value)
+        fake_CCDimage.data[y_sat : y_sat + 2, x_sat : x_sat + 2] = max_adu + 1000
+        fake_CCDimage.data = np.round(fake_CCDimage.data).astype(dtype)
+        image_file = tmp_path / "fake_image.fits"
+        fake_CCDimage.write(image_file, overwrite=True)
+
+        source_list_file = tmp_path / "source_list.ecsv"
+        source_list.write(source_list_file, overwrite=True)
+        source_locations = photometry_settings_for_test.source_location_settings
+        source_locations.source_list_file = str(source_list_file)
+        source_locations.use_coordinates = coords
+        photometry_settings_for_test.photometry_optional_settings.sky_method = (
+            sky_method
+        )
+
+        sections = photometry_module.read_image_sections(
+            image_file, photometry_settings_for_test
+        )
+        assert sections.shape == fake_CCDimage.shape
+        assert sections.wcs is not None
+        assert sections.unit == fake_CCDimage.unit
+        if dtype == np.uint16 and sky_method == "mesh":
+            # The whole image is read
+            np.testing.assert_array_equal(sections.data, fake_CCDimage.data)
+        elif dtype == np.uint16:
+            # Pixels are scaled as they are read
+            assert isinstance(sections.data, photometry_module.ScaledImageData)
+            np.testing.assert_array_equal(
+                sections[10:20, 30:35].data, fake_CCDimage.data[10:20, 30:35]
+            )
+            np.testing.assert_array_equal(np.asarray(sections.data), fake_CCDimage.data)
+
+            # ...and the photometry does not need all of them
+            def scale_everything(*args, **kwargs):  # noqa: ARG001
+                pytest.fail("The whole image was scaled")
+
+            monkeypatch.setattr(
+                photometry_module.ScaledImageData, "__array__", scale_everything
+            )
+        else:
+            # The data is memory-mapped
+            base = sections.data
+            while isinstance(base, np.ndarray):
+                base = base.base
+            assert isinstance(base, mmap.mmap)
+
+        ap_phot = AperturePhotometry(settings=photometry_settings_for_test)
+        full_phot, full_dropped = ap_phot(image_file)
+        phot, dropped = ap_phot(image_file, read_sections=True)
+
+        assert dropped == full_dropped
+        assert phot["saturated"].sum() == 1
+        assert phot.colnames == full_phot.colnames
+        for column in full_phot.colnames:
+            if column == "date-obs":
+                assert all(phot[column] == full_phot[column])
+            elif full_phot[column].dtype.kind == "f":
+                np.testing.assert_array_equal(phot[column], full_phot[column])
+            else:
+                assert list(phot[column]) == list(full_phot[column])
+
+    def test_iter_directory_invalid_path(self, photometry_settings_for_test):
+        ap_phot = AperturePhotometry(settings=photometry_settings_for_test)
+        with pytest.raises(ValueError, match="is not a valid directory"):
+            ap_phot.iter_directory("invalid_path")
+
+    def test_photometry_on_directory_with_checkpoint(
+        self, tmp_path, photometry_settings_for_test, monkeypatch
+    ):
+        # Images with a stored result should not be redone, and adding an
+        # image to the directory should only require photometry on that image.
+        num_files = 3
+        fake_images = self.list_of_fakes(num_files + 1)
+
+        noise_unit = photometry_settings_for_test.camera.read_noise.unit
+        photometry_settings_for_test.camera.read_noise = (
+            fake_images[0].noise_dev * noise_unit
+        )
+
+        image_dir = tmp_path / "images"
+        image_dir.mkdir()
+        for i, image in enumerate(fake_images[:num_files]):
+            image.write(image_dir / f"tempfile_{i:02d}.fit")
+        object_name = fake_images[0].header["OBJECT"]
+
+        found_sources = source_detection(
+            fake_images[0],
+            fwhm=fake_images[0].sources["x_stddev"].mean(),
+            threshold=10,
+        )
+        source_list_file = tmp_path / "source_list.ecsv"
+        found_sources.write(source_list_file, format="ascii.ecsv", overwrite=True)
+
+        source_locations = photometry_settings_for_test.source_location_settings
+        source_locations.use_coordinates = "sky"
+        source_locations.source_list_file = str(source_list_file)
+
+        # Count the images on which photometry is actually done
+        processed = []
+        original_single_image_photometry = photometry_module.single_image_photometry
+
+        def counting_single_image_photometry(*args, **kwargs):
+            processed.append(kwargs["fname"])
+            return original_single_image_photometry(*args, **kwargs)
+
+        monkeypatch.setattr(
+            photometry_module,
+            "single_image_photometry",
+            counting_single_image_photometry,
+        )
+
+        checkpoint_dir = tmp_path / "checkpoint"
+        ap_phot = AperturePhotometry(settings=photometry_settings_for_test)
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore",
+                message="Cannot merge meta key",
+                category=MergeConflictWarning,
+            )
+            first = ap_phot(
+                image_dir,
+                object_of_interest=object_name,
+                checkpoint_dir=checkpoint_dir,
+            )
+            assert len(processed) == num_files
+
+            # Nothing should be redone on a second run
+            processed.clear()
+            second = ap_phot(
+                image_dir,
+                object_of_interest=object_name,
+                checkpoint_dir=checkpoint_dir,
+            )
+            assert processed == []
+
+            # Only the new image should be done after adding one
+            fake_images[num_files].write(image_dir / f"tempfile_{num_files:02d}.fit")
+            third = ap_phot(
+                image_dir,
+                object_of_interest=object_name,
+                checkpoint_dir=checkpoint_dir,
+            )
+            assert processed == [f"tempfile_{num_files:02d}.fit"]
+
+            # The stored results, combined, are the same as the photometry
+            direct = ap_phot(image_dir, object_of_interest=object_name)
+
+        assert third.colnames == direct.colnames
+        assert all(third["date-obs"] == direct["date-obs"])
+        assert list(third["file"]) == list(direct["file"])
+        np.testing.assert_array_equal(
+            third["aperture_net_cnts"], direct["aperture_net_cnts"]
+        )
+        assert third.camera == direct.camera
+        assert len(second) == len(first)
+        assert list(second["star_id"]) == list(first["star_id"])
+        assert list(second["file"]) == list(first["file"])
+        np.testing.assert_allclose(
+            second["aperture_net_cnts"], first["aperture_net_cnts"]
+        )
+        assert len(third) == (num_files + 1) * len(found_sources)
+
+        # The manifest has a line for the settings and one for each image, and
+        # the results are stored as Parquet
+        manifest = checkpoint_dir / PhotometryCheckpoint.manifest_name
+        assert len(manifest.read_text().splitlines()) == num_files + 2
+        assert len(list(checkpoint_dir.glob("*.parquet"))) == num_files + 1
+
+        # A line left incomplete by an interrupted run is ignored
+        with open(manifest, "a") as f:
+            f.write('{"path": "/some/where/tempfile')
+        checkpoint = PhotometryCheckpoint(checkpoint_dir, photometry_settings_for_test)
+        assert len(checkpoint) == num_files + 1
+        assert len(manifest.read_text().splitlines()) == num_files + 2
+        assert checkpoint.has_wcs(image_dir / "tempfile_00.fit")
+
+        # Recording an image again adds a line that replaces the earlier one
+        image_path = image_dir / "tempfile_00.fit"
+        checkpoint.record(image_path, False, None, None)
+        assert len(manifest.read_text().splitlines()) == num_files + 3
+        checkpoint = PhotometryCheckpoint(checkpoint_dir, photometry_settings_for_test)
+        assert len(checkpoint) == num_files + 1
+        assert not checkpoint.has_wcs(image_path)
+
+        # Changing the settings invalidates the stored results
+        photometry_settings_for_test.photometry_apertures.radius += 1
+        checkpoint = PhotometryCheckpoint(checkpoint_dir, photometry_settings_for_test)
+        assert len(checkpoint) == 0
+        assert not checkpoint.is_done(image_dir / "tempfile_00.fit")
+        assert list(checkpoint_dir.glob("*.parquet")) == []
+
+    def test_photometry_watcher(self, tmp_path, photometry_settings_for_test):
+        # Each image should have photometry done once it has stopped changing,
+        # and only once.
+        fake_images = self.list_of_fakes(3)
+
+        noise_unit = photometry_settings_for_test.camera.read_noise.unit
+        photometry_settings_for_test.camera.read_noise = (
+            fake_images[0].noise_dev * noise_unit
+        )
+
+        image_dir = tmp_path / "images"
+        image_dir.mkdir()
+
+        found_sources = source_detection(
+            fake_images[0],
+            fwhm=fake_images[0].sources["x_stddev"].mean(),
+            threshold=10,
+        )
+        source_list_file = tmp_path / "source_list.ecsv"
+        found_sources.write(source_list_file, format="ascii.ecsv", overwrite=True)
+
+        source_locations = photometry_settings_for_test.source_location_settings
+        source_locations.use_coordinates = "sky"
+        source_locations.source_list_file = str(source_list_file)
+
+        watcher = PhotometryWatcher(
+            image_dir, photometry_settings_for_test, tmp_path / "store"
+        )
+        for i, image in enumerate(fake_images[:2]):
+            image.write(image_dir / f"tempfile_{i:02d}.fit")
+
+        # An image is not used until it has been seen unchanged twice
+        assert watcher.poll() == []
+        assert watcher.poll() == ["tempfile_00.fit", "tempfile_01.fit"]
+        assert watcher.poll() == []
+
+        # A file that is still being written is not used
+        partial_file = image_dir / "tempfile_02.fit"
+        partial_file.write_bytes(b"SIMPLE  =                    T")
+        assert watcher.poll() == []
+        assert watcher.poll() == []
+        fake_images[2].write(partial_file, overwrite=True)
+        assert watcher.poll() == []
+        assert watcher.poll() == ["tempfile_02.fit"]
+
+        assert [name for name, _ in watcher.latencies] == [
+            f"tempfile_{i:02d}.fit" for i in range(3)
+        ]
+        assert all(latency >= 0 for _, latency in watcher.latencies)
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore",
+                message="Cannot merge meta key",
+                category=MergeConflictWarning,
+            )
+            all_phot = watcher.photometry()
+        assert len(all_phot) == 3 * len(found_sources)
+        assert list(np.unique(all_phot["file"])) == [
+            f"tempfile_{i:02d}.fit" for i in range(3)
+        ]
+
+        # A new watcher using the same store does not redo any images
+        watcher = PhotometryWatcher(
+            image_dir, photometry_settings_for_test, tmp_path / "store"
+        )
+        assert watcher.run(timeout=0) == 0
+
+        # A file that cannot be read is only tried a few times
+        corrupt_file = image_dir / "tempfile_03.fit"
+        corrupt_file.write_bytes(b"x" * watcher_module.FITS_BLOCK_SIZE)
+        assert watcher.poll() == []
+        for _ in range(watcher_module.MAX_READ_ATTEMPTS):
+            assert corrupt_file not in watcher._ignored
+            assert watcher.poll() == []
+        assert corrupt_file in watcher._ignored
+        # ...unless it changes
+        fake_images[0].write(corrupt_file, overwrite=True)
+        assert watcher.poll() == []
+        assert watcher.poll() == ["tempfile_03.fit"]
+
+    def test_photometry_watcher_invalid_directory(self, photometry_settings_for_test):
+        with pytest.raises(ValueError, match="is not a valid directory"):
+            PhotometryWatcher("invalid_path", photometry_settings_for_test, "store")
+
     def test_photometry_on_directory_with_no_ra_dec(self, photometry_settings_for_test):
         # Create list of fake CCDData objects
         num_files = 5
@@ -1024,6 +1542,83 @@ class TestAperturePhotometry:
                     object_of_interest=object_name,
                 )
 
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_photometry_on_directory_registers_frames(
+        self, tmp_path, photometry_settings_for_test, workers
+    ):
+        # Images without a WCS are registered to the first image that has one,
+        # which gives the same photometry as when every image has its WCS.
+        num_files = 3
+        fake_images = self.list_of_fakes(num_files)
+
+        noise_unit = photometry_settings_for_test.camera.read_noise.unit
+        photometry_settings_for_test.camera.read_noise = (
+            fake_images[0].noise_dev * noise_unit
+        )
+
+        solved = tmp_path / "solved"
+        unsolved = tmp_path / "unsolved"
+        solved.mkdir()
+        unsolved.mkdir()
+        for i, image in enumerate(fake_images):
+            image.write(solved / f"tempfile_{i:02d}.fit")
+            if i > 0:
+                image.drop_wcs()
+            image.write(unsolved / f"tempfile_{i:02d}.fit")
+        object_name = fake_images[0].header["OBJECT"]
+
+        found_sources = source_detection(
+            fake_images[0],
+            fwhm=fake_images[0].sources["x_stddev"].mean(),
+            threshold=10,
+        )
+        source_list_file = tmp_path / "source_list.ecsv"
+        found_sources.write(source_list_file, format="ascii.ecsv", overwrite=True)
+
+        source_locations = photometry_settings_for_test.source_location_settings
+        source_locations.use_coordinates = "sky"
+        source_locations.source_list_file = str(source_list_file)
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore",
+                message="Cannot merge meta key",
+                category=MergeConflictWarning,
+            )
+            ap_phot = AperturePhotometry(settings=photometry_settings_for_test)
+            expected = ap_phot(solved, object_of_interest=object_name)
+            # Images skipped in a checkpointed run without registration are
+            # done when it is resumed with registration.
+            checkpoint_dir = tmp_path / "checkpoint"
+            skipped = ap_phot(
+                unsolved, object_of_interest=object_name, checkpoint_dir=checkpoint_dir
+            )
+            registered = ap_phot(
+                unsolved,
+                object_of_interest=object_name,
+                workers=workers,
+                checkpoint_dir=checkpoint_dir,
+                register_frames=True,
+            )
+
+        # Without registration only the image with a WCS is done
+        assert set(skipped["file"]) == {"tempfile_00.fit"}
+
+        assert len(registered) == len(expected) == num_files * len(found_sources)
+        assert list(registered["file"]) == list(expected["file"])
+        assert list(registered["star_id"]) == list(expected["star_id"])
+        # The WCS of the shifted test images is off by about a pixel, so the
+        # centroids start from slightly different positions and only agree to a
+        # fraction of a pixel.
+        np.testing.assert_allclose(
+            registered["xcenter"].value, expected["xcenter"].value, atol=0.5
+        )
+        np.testing.assert_allclose(
+            registered["aperture_net_cnts"].value,
+            expected["aperture_net_cnts"].value,
+            rtol=1e-2,
+        )
+
     def test_photometry_variable_aperture(self, tmp_path, photometry_settings_for_test):
         # Create a series of images with sources of different FWHM and
         # run photometry on them with a variable aperture radius.
@@ -1448,6 +2043,32 @@ def test_calc_noise_messy_case(digit, expected, zero_camera):
     )
 
 
+def test_clipped_sky_per_pix_stats_matches_aperture_stats():
+    rng = np.random.default_rng(SEED)
+    data = rng.normal(loc=100, scale=10, size=(100, 120))
+    data[rng.uniform(size=data.shape) > 0.999] = 10000
+    data[rng.uniform(size=data.shape) > 0.995] = np.nan
+    ccd = CCDData(data, unit="adu", mask=rng.uniform(size=data.shape) > 0.99)
+    # Include an annulus that is partly off the image
+    positions = np.concatenate([rng.uniform(20, 80, (10, 2)), [[2.5, 50]]])
+    annuli = CircularAnnulus(positions, r_in=9, r_out=14.5)
+
+    stats = clipped_sky_per_pix_stats(ccd, annuli)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Input data contains non-finite")
+        expected = ApertureStats(ccd, annuli, sigma_clip=SigmaClip(sigma=5, maxiters=5))
+    for stat, expect in zip(
+        stats, [expected.mean, expected.median, expected.std], strict=True
+    ):
+        assert stat.unit == u.adu
+        np.testing.assert_allclose(stat.value, expect.value, rtol=1e-12)
+
+    # A single annulus gives scalars
+    mean, _, _ = clipped_sky_per_pix_stats(ccd, annuli[0])
+    assert mean.isscalar
+    np.testing.assert_allclose(mean.value, expected.mean[0].value, rtol=1e-12)
+
+
 def test_find_too_close():
     # Load test sourcelist into memory
     test_sl_data = ascii.read(
@@ -1493,3 +2114,135 @@ def test_find_too_close():
     # Test only image positions available
     rejects = find_too_close(sl_test_nosky, aperture_rad, pixel_scale=feder_scale)
     assert np.sum(rejects) == 5
+
+
+def test_find_too_close_matches_brute_force():
+    # The nearest neighbor search must agree with comparing every pair
+    rng = np.random.default_rng(SEED)
+    n_sources = 2000
+    x = rng.uniform(0, 2000, n_sources)
+    y = rng.uniform(0, 2000, n_sources)
+    # Add an exact duplicate, which should be flagged
+    x[1], y[1] = x[0], y[0]
+    sources = SourceListData(
+        input_data=Table(
+            dict(
+                star_id=np.arange(n_sources),
+                xcenter=x * u.pixel,
+                ycenter=y * u.pixel,
+            )
+        ),
+        colname_map=None,
+    )
+
+    distances = np.hypot(x[:, np.newaxis] - x, y[:, np.newaxis] - y)
+    np.fill_diagonal(distances, np.inf)
+    aperture_rad = 8
+    expected = distances.min(axis=0) < 2 * aperture_rad
+    assert expected[0] and expected[1]
+
+    rejects = find_too_close(sources, aperture_rad, pixel_scale=1.0)
+    np.testing.assert_array_equal(rejects, expected)
+
+
+def test_find_too_close_non_finite_positions():
+    # Sources without a finite position are not flagged and do not affect
+    # whether other sources are flagged.
+    sources = SourceListData(
+        input_data=Table(
+            dict(
+                star_id=[1, 2, 3, 4],
+                xcenter=[10.0, 12.0, np.nan, 100.0] * u.pixel,
+                ycenter=[10.0, 10.0, 10.0, 100.0] * u.pixel,
+            )
+        ),
+        colname_map=None,
+    )
+    rejects = find_too_close(sources, 2, pixel_scale=1.0)
+    np.testing.assert_array_equal(rejects, [True, True, False, False])
+
+    # A single source has no neighbors
+    rejects = find_too_close(sources[3:], 2, pixel_scale=1.0)
+    np.testing.assert_array_equal(rejects, [False])
+
+
+def _sip_wcs(crpix=(1000, 1000), crval=(283.6, 33.05), rotation=0.0, a20=2e-6):
+    # A WCS with a SIP distortion, like that of a solved image
+    wcs = WCS(naxis=2)
+    wcs.wcs.crpix = crpix
+    wcs.wcs.crval = crval
+    wcs.wcs.ctype = ["RA---TAN-SIP", "DEC--TAN-SIP"]
+    scale = 0.75 / 3600
+    cos, sin = np.cos(rotation), np.sin(rotation)
+    wcs.wcs.cd = [[-scale * cos, scale * sin], [scale * sin, scale * cos]]
+    a = np.zeros((4, 4))
+    b = np.zeros((4, 4))
+    a[2, 0] = a20
+    a[0, 2] = -1e-6
+    b[0, 2] = 2e-6
+    b[1, 1] = 1e-6
+    wcs.sip = Sip(a, b, None, None, wcs.wcs.crpix)
+    wcs.wcs.set()
+    return wcs
+
+
+def _counting_world_to_pixel(wcs):
+    # Record the number of positions transformed by the WCS
+    calls = []
+    world_to_pixel = wcs.world_to_pixel
+
+    def counting(coords):
+        calls.append(len(coords))
+        return world_to_pixel(coords)
+
+    wcs.world_to_pixel = counting
+    return calls
+
+
+@pytest.mark.parametrize(
+    "wcs_args, reused",
+    [
+        (dict(), "all"),
+        (dict(crpix=(1003.2, 998.7)), "affine"),
+        (dict(crpix=(1003.2, 998.7), rotation=np.radians(0.05)), "affine"),
+        (dict(crval=(285.6, 35.05)), "not affine"),
+        (dict(a20=3e-6), "none"),
+    ],
+)
+def test_world_to_pixel_reuses_positions(monkeypatch, wcs_args, reused):
+    monkeypatch.setattr(photometry_module, "_pixel_position_cache", {})
+    rng = np.random.default_rng(4096)
+    first_wcs = _sip_wcs()
+    sky = first_wcs.pixel_to_world(*rng.uniform(0, 2000, (2, 1000)))
+    ra, dec = sky.ra.deg, sky.dec.deg
+    photometry_module._world_to_pixel(first_wcs, ra, dec)
+
+    wcs = _sip_wcs(**wcs_args)
+    expected = wcs.world_to_pixel(sky)
+    calls = _counting_world_to_pixel(wcs)
+    xs, ys = photometry_module._world_to_pixel(wcs, ra, dec)
+
+    if reused == "all":
+        assert calls == []
+    elif reused == "affine":
+        # Only the control points are transformed with the WCS
+        assert len(calls) == 1 and calls[0] < 50
+    elif reused == "not affine":
+        # The affine update is tried, but does not match the control points
+        assert len(calls) == 2 and calls[1] == len(ra)
+    else:
+        # A different distortion cannot be an affine update
+        assert calls == [len(ra)]
+    tolerance = photometry_module._AFFINE_TOLERANCE
+    np.testing.assert_allclose(xs, expected[0], atol=tolerance, rtol=0)
+    np.testing.assert_allclose(ys, expected[1], atol=tolerance, rtol=0)
+
+
+def test_world_to_pixel_cached_positions_are_not_shared(monkeypatch):
+    monkeypatch.setattr(photometry_module, "_pixel_position_cache", {})
+    wcs = _sip_wcs()
+    ra, dec = np.array([283.6, 283.61]), np.array([33.05, 33.06])
+    xs, ys = photometry_module._world_to_pixel(wcs, ra, dec)
+    xs += 10
+    again, _ = photometry_module._world_to_pixel(wcs, ra, dec)
+    np.testing.assert_allclose(again, xs - 10)
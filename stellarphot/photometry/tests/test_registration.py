@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from astropy.wcs import WCS
+from scipy.ndimage import affine_transform
+
+from stellarphot.photometry import FrameRegistration, FrameTransform
+from stellarphot.photometry.tests.fake_image import FakeCCDImage, shift_FakeCCDImage
+
+SEED = 5432985
+
+
+@pytest.fixture
+def reference():
+    return FakeCCDImage(seed=SEED)
+
+
+def _rotated(image, dx, dy, rotation):
+    # An image in which the pixel at (x, y) in ``image`` is at
+    # R @ (x, y) + (dx, dy)
+    transform = FrameTransform(dx, dy, rotation)
+    # affine_transform maps each output pixel, as (y, x), to an input pixel
+    (a, b), (c, d) = transform.matrix.T
+    matrix = np.array([[d, c], [b, a]])
+    offset = -matrix @ np.array([dy, dx])
+    return affine_transform(image, matrix, offset=offset, order=3, mode="nearest")
+
+
+def test_register_translation(reference):
+    registration = FrameRegistration(reference)
+    shifted = shift_FakeCCDImage(reference, 23, -11)
+    shifted.noise_dev = reference.noise_dev
+    transform = registration.register(shifted)
+
+    # The sources of the shifted image are moved by minus the shift
+    assert transform.rotation == 0
+    assert transform.dx == pytest.approx(-23, abs=0.05)
+    assert transform.dy == pytest.approx(11, abs=0.05)
+
+    # The moved WCS gives each pixel of the shifted image the sky position of
+    # the same place in the reference image
+    wcs = transform.transform_wcs(registration.wcs)
+    x, y = np.array([10, 250, 450]), np.array([20, 200, 380])
+    expected = reference.wcs.pixel_to_world(x + 23, y - 11)
+    assert expected.separation(wcs.pixel_to_world(x, y)).arcsec.max() < 0.05
+
+
+@pytest.mark.parametrize("fit_rotation", [True, False])
+def test_register_rotation(reference, fit_rotation):
+    rotation = np.radians(0.4)
+    rotated = _rotated(reference.data, 4.5, -2.25, rotation)
+    registration = FrameRegistration(reference, fit_rotation=fit_rotation)
+    transform = registration.register(rotated)
+    if fit_rotation:
+        assert transform.rotation == pytest.approx(rotation, rel=0.1)
+        # The centers of the image match
+        expected = FrameTransform(4.5, -2.25, rotation).to_frame(250, 200)
+        np.testing.assert_allclose(transform.to_frame(250, 200), expected, atol=0.1)
+    else:
+        assert transform.rotation == 0
+
+
+def test_register_with_masked_pixels(reference):
+    registration = FrameRegistration(reference)
+    shifted = shift_FakeCCDImage(reference, -7, 5)
+    # A bad column, masked, and a block of pixels that are not finite
+    shifted.mask = np.zeros(shifted.shape, dtype=bool)
+    shifted.data[:, 100] = 1e6
+    shifted.mask[:, 100] = True
+    shifted.data[300:320, 300:320] = np.nan
+    transform = registration.register(shifted)
+    assert transform.dx == pytest.approx(7, abs=0.05)
+    assert transform.dy == pytest.approx(-5, abs=0.05)
+
+
+def test_frame_transform():
+    transform = FrameTransform(3, -2, np.radians(1))
+    x, y = np.array([0, 100, 250]), np.array([0, 400, 30])
+    np.testing.assert_allclose(
+        transform.to_reference(*transform.to_frame(x, y)), [x, y]
+    )
+    np.testing.assert_allclose(transform.to_frame(0, 0), [3, -2])
+
+
+@pytest.mark.parametrize("use_cd", [True, False])
+def test_transform_wcs(reference, use_cd):
+    wcs = reference.wcs.deepcopy()
+    if use_cd:
+        wcs = WCS(naxis=2)
+        wcs.wcs.crpix = reference.wcs.wcs.crpix
+        wcs.wcs.crval = reference.wcs.wcs.crval
+        wcs.wcs.ctype = reference.wcs.wcs.ctype
+        wcs.wcs.cd = reference.wcs.wcs.cdelt[:, np.newaxis] * reference.wcs.wcs.get_pc()
+        wcs.wcs.set()
+    transform = FrameTransform(12.5, -3, np.radians(0.5))
+    moved = transform.transform_wcs(wcs)
+    assert moved is not wcs
+
+    # A position in the reference image has the same sky position as the
+    # matching position in the frame
+    x, y = np.array([0, 100, 499]), np.array([0, 300, 399])
+    expected = wcs.pixel_to_world(x, y)
+    result = moved.pixel_to_world(*transform.to_frame(x, y))
+    assert expected.separation(result).arcsec.max() < 1e-6
+
+
+def test_register_errors(reference):
+    registration = FrameRegistration(reference)
+    with pytest.raises(ValueError, match="has shape"):
+        registration.register(reference.data[:200])
+
+    # An image of nothing but noise cannot be registered
+    noise = np.random.default_rng(SEED + 1).normal(100, 5, reference.shape)
+    with pytest.raises(ValueError, match="Could not find the shift"):
+        registration.register(noise)
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+from astropy.nddata import CCDData
+
+from stellarphot import SourceListData
+from stellarphot.photometry import (
+    reference_source_list,
+    source_detection,
+    stack_images,
+)
+from stellarphot.photometry.tests.fake_image import FakeCCDImage
+
+SEED = 2387652
+N_FRAMES = 16
+# A star too faint to find in any one frame, but not in a stack of them
+FAINT_STAR = (300, 200)
+
+
+@pytest.fixture
+def frames():
+    frames = []
+    y, x = np.mgrid[:400, :500]
+    faint_star = 50 * np.exp(
+        -((x - FAINT_STAR[0]) ** 2 + (y - FAINT_STAR[1]) ** 2) / (2 * 3**2)
+    )
+    for i in range(N_FRAMES):
+        frame = FakeCCDImage(seed=SEED + i, noise_dev=10)
+        frame.data = frame.data + faint_star
+        frames.append(frame)
+    # A cosmic ray in one frame
+    frames[3].data[50:53, 60:63] += 2000
+    return frames
+
+
+def _detect(image, frames):
+    return source_detection(
+        image,
+        fwhm=2 * frames[0].sources["x_stddev"].mean(),
+        threshold=10,
+        sky_per_pix_avg=None,
+    )
+
+
+def _has_source_at(sources, x, y):
+    return (
+        np.hypot(sources["xcenter"].value - x, sources["ycenter"].value - y) < 1
+    ).any()
+
+
+def test_reference_source_list(frames):
+    sources = reference_source_list(
+        frames, fwhm=2 * frames[0].sources["x_stddev"].mean(), threshold=10
+    )
+    assert isinstance(sources, SourceListData)
+
+    # All of the stars are found, including the faint one, but not the cosmic
+    # ray
+    assert len(sources) == len(frames[0].sources) + 1
+    for star in frames[0].sources:
+        assert _has_source_at(sources, star["x_mean"], star["y_mean"])
+    assert _has_source_at(sources, *FAINT_STAR)
+    # The positions on the sky come from the WCS of the first frame
+    assert np.isfinite(sources["ra"]).all()
+    assert np.isfinite(sources["dec"]).all()
+
+    # Any one frame misses the faint star and finds the cosmic ray
+    single_frame_sources = _detect(frames[3], frames)
+    assert not _has_source_at(single_frame_sources, *FAINT_STAR)
+    assert _has_source_at(single_frame_sources, 61, 51)
+
+
+@pytest.mark.parametrize("method", ["median", "mean"])
+def test_stack_images_in_chunks(frames, method):
+    whole = stack_images(frames, method=method, mem_limit=1e12)
+    # Less than one row of all of the frames at a time
+    chunked = stack_images(frames, method=method, mem_limit=1e5)
+    np.testing.assert_array_equal(chunked.data, whole.data)
+
+    values = np.array([frame.data for frame in frames])
+    if method == "median":
+        np.testing.assert_allclose(whole.data, np.median(values, axis=0))
+    else:
+        # The cosmic ray is clipped
+        np.testing.assert_allclose(
+            whole.data[50:53, 60:63],
+            np.delete(values, 3, axis=0).mean(axis=0)[50:53, 60:63],
+        )
+    assert whole.header["NCOMBINE"] == N_FRAMES
+    assert whole.header["COMBINE"] == method
+    assert whole.wcs is not None
+    assert not whole.mask.any()
+
+
+def test_stack_images_from_files(tmp_path, frames):
+    paths = []
+    for i, frame in enumerate(frames):
+        path = tmp_path / f"frame_{i}.fits"
+        if i == 0:
+            # Mask a pixel that is very bright in the first frame
+            frame.data[10, 10] = 1e6
+            frame.mask = np.zeros(frame.shape, dtype=bool)
+            frame.mask[10, 10] = True
+            frame.write(path)
+        elif i == 1:
+            # Unsigned integers are stored scaled
+            frame.data = np.round(frame.data).astype(np.uint16)
+            frame.write(path)
+        else:
+            frame.write(path)
+        paths.append(path)
+
+    from_files = stack_images(paths, mem_limit=1e6)
+    in_memory = stack_images(frames)
+    np.testing.assert_allclose(from_files.data, in_memory.data)
+    assert from_files.data[10, 10] < 1000
+    assert from_files.wcs is not None
+    assert from_files.unit == frames[0].unit
+
+
+def test_stack_images_all_masked():
+    images = [
+        CCDData(np.ones((5, 5)), mask=np.eye(5, dtype=bool), unit="adu")
+        for _ in range(3)
+    ]
+    stacked = stack_images(images)
+    np.testing.assert_array_equal(stacked.mask, np.eye(5, dtype=bool))
+    assert np.isnan(stacked.data[stacked.mask]).all()
+    assert (stacked.data[~stacked.mask] == 1).all()
+
+
+def test_stack_images_errors(tmp_path):
+    with pytest.raises(ValueError, match="method must be 'median' or 'mean'"):
+        stack_images([np.zeros((5, 5))], method="mode")
+    with pytest.raises(ValueError, match="There are no images to stack"):
+        stack_images([])
+    path = tmp_path / "small.fits"
+    fits.PrimaryHDU(np.zeros((4, 5))).writeto(path)
+    with pytest.raises(ValueError, match="must have the same shape"):
+        stack_images([np.zeros((5, 5)), path])
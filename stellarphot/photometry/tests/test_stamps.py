@@ -0,0 +1,283 @@
+import numpy as np
+import pytest
+from astropy.nddata import Cutout2D, NoOverlapError
+from astropy.stats import SigmaClip
+from photutils.aperture import (
+    ApertureStats,
+    CircularAnnulus,
+    CircularAperture,
+    aperture_photometry,
+)
+from photutils.centroids import centroid_sources
+from photutils.morphology import data_properties
+from photutils.profiles import RadialProfile
+
+from stellarphot.photometry.stamps import (
+    StampCube,
+    _aperture_weights,
+    _weight_cache,
+    clipped_statistics,
+    gaussian_fwhm,
+    moments_fwhm,
+    radial_profiles,
+    stamp_photometry,
+)
+
+SEED = 5432985
+
+
+@pytest.mark.parametrize("size", [7, 10, 12.6])
+def test_stamps_match_cutout2d(size):
+    # The part of each stamp inside the image must be exactly the data of a
+    # Cutout2D, including for positions close to or past the edge.
+    rng = np.random.default_rng(SEED)
+    data = rng.normal(size=(40, 50))
+    mask = rng.uniform(size=data.shape) > 0.8
+    xs = np.concatenate([rng.uniform(0, 50, 20), [0, -2.2, 49.5, 51.1, 25]])
+    ys = np.concatenate([rng.uniform(0, 40, 20), [0, 20, 39.9, 10, -3.4]])
+
+    stamps = StampCube(data, xs, ys, size, mask=mask)
+    assert stamps.data.shape == (len(xs), round(size), round(size))
+
+    for index, (x, y) in enumerate(zip(xs, ys, strict=True)):
+        cutout = Cutout2D(data, (x, y), size)
+        stamp, stamp_mask, position = stamps.trimmed(index)
+        np.testing.assert_array_equal(stamp, cutout.data)
+        np.testing.assert_array_equal(stamp_mask, mask[cutout.slices_original])
+        assert position == cutout.to_cutout_position((x, y))
+
+        # Everything outside of the image is filled and masked
+        outside = stamps.outside[index]
+        assert outside.sum() == outside.size - cutout.data.size
+        assert np.isnan(stamps.data[index][outside]).all()
+        assert stamps.mask[index][outside].all()
+
+
+def test_stamps_no_overlap():
+    data = np.zeros((20, 20))
+    with pytest.raises(NoOverlapError):
+        StampCube(data, [5, 40], [5, 5], 5)
+
+
+def test_stamps_non_finite_position():
+    data = np.zeros((20, 20))
+    with pytest.raises(ValueError, match="invalid values"):
+        StampCube(data, [5, np.nan], [5, 5], 5)
+
+
+def _gaussian_stamps(n_stamps, size=21):
+    # Noisy, slightly elliptical Gaussians with a few NaN pixels
+    rng = np.random.default_rng(SEED)
+    y, x = np.indices((size, size))
+    xs = size / 2 + rng.uniform(-1.5, 1.5, n_stamps)
+    ys = size / 2 + rng.uniform(-1.5, 1.5, n_stamps)
+    sigma_x = rng.uniform(1.5, 3, n_stamps)[:, np.newaxis, np.newaxis]
+    sigma_y = rng.uniform(1.5, 3, n_stamps)[:, np.newaxis, np.newaxis]
+    stamps = 1000 * np.exp(
+        -0.5 * ((x - xs[:, np.newaxis, np.newaxis]) / sigma_x) ** 2
+        - 0.5 * ((y - ys[:, np.newaxis, np.newaxis]) / sigma_y) ** 2
+    )
+    stamps += rng.normal(scale=5, size=stamps.shape)
+    stamps[0, 3:6, 4] = np.nan
+    return stamps, xs, ys
+
+
+@pytest.mark.filterwarnings("ignore:Input data contains non-finite values")
+def test_moments_fwhm_matches_data_properties():
+    stamps, _, _ = _gaussian_stamps(10)
+    expected = [data_properties(stamp).fwhm.value for stamp in stamps]
+    np.testing.assert_allclose(moments_fwhm(stamps), expected, rtol=1e-10)
+
+
+@pytest.mark.filterwarnings("ignore:Input data contains non-finite values")
+def test_radial_profile_fwhm_matches_radial_profile():
+    stamps, xs, ys = _gaussian_stamps(10)
+    radii = np.arange(10)
+    radius, profiles = radial_profiles(stamps, xs, ys, radii)
+    fwhm = gaussian_fwhm(radius, profiles)
+
+    for index, stamp in enumerate(stamps):
+        profile = RadialProfile(stamp, (xs[index], ys[index]), radii)
+        np.testing.assert_allclose(radius, profile.radius)
+        np.testing.assert_allclose(profiles[index], profile.profile, rtol=1e-10)
+        np.testing.assert_allclose(fwhm[index], profile.gaussian_fwhm, rtol=1e-5)
+
+
+def test_gaussian_fwhm_needs_two_points():
+    profiles = np.array([[1.0, np.nan, np.nan], [1.0, 0.5, np.nan]])
+    fwhm = gaussian_fwhm(np.array([0.5, 1.5, 2.5]), profiles)
+    assert np.isnan(fwhm[0])
+    assert np.isfinite(fwhm[1])
+
+
+def _image_for_apertures():
+    rng = np.random.default_rng(SEED)
+    data = rng.normal(loc=100, scale=10, size=(100, 120))
+    # Some stars, so that centroiding has something to find
+    y, x = np.indices(data.shape)
+    for x_star, y_star in rng.uniform(20, 80, (10, 2)):
+        data += 2000 * np.exp(-0.5 * ((x - x_star) ** 2 + (y - y_star) ** 2) / 2**2)
+    bad_pixels = rng.uniform(size=data.shape) > 0.995
+    data[bad_pixels] = np.nan
+    mask = (rng.uniform(size=data.shape) > 0.99) | bad_pixels
+    return data, mask, bad_pixels
+
+
+def _photutils_photometry(data, xs, ys, method, mask, bad_pixels, sigma_clip):
+    positions = np.array([xs, ys]).T
+    apers = CircularAperture(positions, r=4.3)
+    annuli = CircularAnnulus(positions, r_in=9, r_out=14.5)
+    photom = aperture_photometry(data, (apers, annuli), mask=mask, method=method)
+    bad = aperture_photometry(bad_pixels.astype(float), apers, method=method)
+    sky = ApertureStats(data, annuli, mask=mask, sigma_clip=sigma_clip)
+    return dict(
+        aperture_sum=photom["aperture_sum_0"],
+        annulus_sum=photom["aperture_sum_1"],
+        bad_pixel_sum=bad["aperture_sum"],
+        sky_mean=sky.mean,
+        sky_median=sky.median,
+        sky_std=sky.std,
+    )
+
+
+@pytest.mark.filterwarnings("ignore:Input data contains non-finite values")
+@pytest.mark.parametrize("method", ["exact", "center", "subpixel"])
+@pytest.mark.parametrize("sky_sigma", [5, None])
+def test_stamp_photometry_matches_photutils(method, sky_sigma):
+    data, mask, bad_pixels = _image_for_apertures()
+    rng = np.random.default_rng(SEED)
+    # Include sources on pixel centers and on pixel edges
+    xs = np.concatenate([rng.uniform(16, 104, 50), [20, 30.5]])
+    ys = np.concatenate([rng.uniform(16, 84, 50), [40, 60.5]])
+
+    photom = stamp_photometry(
+        data,
+        xs,
+        ys,
+        4.3,
+        9,
+        14.5,
+        method=method,
+        mask=mask,
+        sky_sigma=sky_sigma,
+        chunk_size=16,
+    )
+    sigma_clip = SigmaClip(sigma=sky_sigma, maxiters=5) if sky_sigma else None
+    expected = _photutils_photometry(data, xs, ys, method, mask, bad_pixels, sigma_clip)
+    np.testing.assert_array_equal(photom["xcenter"], xs)
+    np.testing.assert_array_equal(photom["ycenter"], ys)
+    for name, expect in expected.items():
+        np.testing.assert_allclose(photom[name], expect, rtol=1e-12, err_msg=name)
+
+
+@pytest.mark.parametrize("method", ["exact", "center", "subpixel"])
+def test_bad_pixel_just_outside_aperture(method):
+    # A saturated pixel that the aperture only just misses does not count
+    data = np.ones((50, 50))
+    # The corner of the pixel at (29, 25) is 4.3 + 1e-6 from the source
+    corner = 28.5, 24.5
+    x = corner[0] - (4.3 + 1e-6) / np.sqrt(2)
+    y = corner[1] - (4.3 + 1e-6) / np.sqrt(2)
+    data[25, 29] = 1e6
+    photom = stamp_photometry(
+        data, [x], [y], 4.3, 9, 14.5, method=method, max_value=1000
+    )
+    assert photom["bad_pixel_sum"][0] == 0
+
+    # ...but one that is in it does
+    photom = stamp_photometry(
+        data, [x + 2e-6], [y + 2e-6], 4.3, 9, 14.5, method="exact", max_value=1000
+    )
+    assert photom["bad_pixel_sum"][0] > 0
+
+
+@pytest.mark.filterwarnings("ignore:Input data contains non-finite values")
+def test_stamp_photometry_centroids_match_centroid_sources():
+    data, mask, _ = _image_for_apertures()
+    rng = np.random.default_rng(SEED)
+    # Include a source close to the edge and one in a completely masked
+    # region, which cannot be centroided
+    xs = np.concatenate([rng.uniform(16, 104, 30), [3.2, 60.5]])
+    ys = np.concatenate([rng.uniform(16, 84, 30), [40.7, 50]])
+    mask = mask.copy()
+    mask[40:61, 50:71] = True
+
+    photom = stamp_photometry(
+        data, xs, ys, 4.3, 9, 14.5, mask=mask, centroid_box_size=9, shift_tolerance=3
+    )
+    x_cen, y_cen = centroid_sources(np.where(mask, np.nan, data), xs, ys, box_size=9)
+    moved = np.hypot(x_cen - xs, y_cen - ys) <= 3
+    assert moved.sum() > 10
+    assert not moved[-1]
+    np.testing.assert_allclose(photom["xcenter"][moved], x_cen[moved], rtol=1e-12)
+    np.testing.assert_allclose(photom["ycenter"][moved], y_cen[moved], rtol=1e-12)
+    # The others keep their input positions
+    np.testing.assert_array_equal(photom["xcenter"][~moved], xs[~moved])
+    np.testing.assert_array_equal(photom["ycenter"][~moved], ys[~moved])
+
+
+def test_aperture_weights_are_cached(monkeypatch):
+    data = np.ones((50, 50))
+    _weight_cache.clear()
+    # All sources but the fourth have the same offset from the center of their
+    # pixel, so their weights are only computed once
+    stamp_photometry(data, [10.25, 20.25, 30.25, 30.75], [20, 20, 20, 20], 3, 5, 8)
+    stamp_photometry(data, [15.25], [25], 3, 5, 8)
+    assert (_weight_cache.misses, _weight_cache.hits) == (2, 1)
+    assert not _aperture_weights(3, 5, 8, 0.0, 0.0, "exact", 5).flags.writeable
+
+    # The cache holds no more than its limit
+    weights = _aperture_weights(3, 5, 8, 0.0, 0.0, "exact", 5)
+    monkeypatch.setattr(_weight_cache, "max_bytes", 3 * weights.nbytes)
+    stamp_photometry(data, [10.1, 10.2, 10.3, 10.4], [20, 20, 20, 20], 3, 5, 8)
+    assert len(_weight_cache) == 3
+    assert _weight_cache.nbytes == 3 * weights.nbytes
+
+
+def test_stamp_photometry_invalid_method():
+    with pytest.raises(ValueError, match="Invalid method"):
+        stamp_photometry(np.ones((20, 20)), [10], [10], 3, 5, 8, method="nope")
+
+
+@pytest.mark.filterwarnings("ignore:Input data contains invalid values")
+@pytest.mark.parametrize("sigma", [5, 2, None])
+def test_clipped_statistics_matches_sigma_clip(sigma):
+    # Rows with different numbers of values, outliers, a constant row and a
+    # row without any finite values
+    rng = np.random.default_rng(SEED)
+    values = rng.normal(loc=100, scale=10, size=(20, 300))
+    values[:, :5] = 1000
+    values[3, 50:] = np.nan
+    values[4, 10:20] = np.inf
+    values[5] = 7
+    values[6] = np.nan
+    lengths = rng.integers(1, 300, len(values))
+    values[np.arange(300) >= lengths[:, np.newaxis]] = np.nan
+
+    mean, median, std, mode = clipped_statistics(
+        values, sigma=sigma, iters=5, return_mode=True
+    )
+
+    for index, row in enumerate(values):
+        row = row[np.isfinite(row)]
+        if sigma is not None:
+            row = SigmaClip(sigma=sigma, maxiters=5)(row, masked=False)
+        if not len(row):
+            assert np.isnan([mean[index], median[index], std[index]]).all()
+            continue
+        np.testing.assert_allclose(mean[index], np.mean(row), rtol=1e-12)
+        np.testing.assert_allclose(median[index], np.median(row), rtol=1e-12)
+        np.testing.assert_allclose(std[index], np.std(row), rtol=1e-10, atol=1e-12)
+    np.testing.assert_allclose(mode, 3 * median - 2 * mean)
+
+
+def test_clipped_statistics_stops_after_iters():
+    # Each iteration clips only the most extreme value
+    values = np.array([[0.0] * 10 + [10.0**k for k in range(1, 8)]])
+    mean_1, _, _ = clipped_statistics(values, sigma=1.5, iters=1)
+    mean_5, _, _ = clipped_statistics(values, sigma=1.5, iters=5)
+    expected_1 = np.mean(SigmaClip(sigma=1.5, maxiters=1)(values[0], masked=False))
+    expected_5 = np.mean(SigmaClip(sigma=1.5, maxiters=5)(values[0], masked=False))
+    assert expected_1 != expected_5
+    np.testing.assert_allclose(mean_1, expected_1, rtol=1e-12)
+    np.testing.assert_allclose(mean_5, expected_5, rtol=1e-12)
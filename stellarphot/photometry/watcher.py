@@ -0,0 +1,315 @@
+import logging
+import time
+import warnings
+from collections import deque
+from pathlib import Path
+
+from astropy.wcs import FITSFixedWarning
+
+from stellarphot.settings import PhotometrySettings
+
+from .checkpoint import PhotometryCheckpoint
+from .photometry import (
+    _add_log_handlers,
+    _remove_our_handlers,
+    read_image_sections,
+    single_image_photometry,
+)
+
+__all__ = ["PhotometryWatcher"]
+
+# Size of a FITS block; an uncompressed FITS file that has been completely
+# written is always a multiple of this.
+FITS_BLOCK_SIZE = 2880
+
+# Number of times an image that has not changed is read before giving up on it
+MAX_READ_ATTEMPTS = 3
+
+# Number of images for which the latency is kept
+MAX_LATENCIES = 1000
+
+
+class PhotometryWatcher:
+    """
+    Watch a directory and perform photometry on each new image as soon as it
+    has been completely written.
+
+    The directory is polled for new images. An image is ready once its size
+    and modification time are the same on two consecutive polls, after which
+    `~stellarphot.photometry.single_image_photometry` is run on it and the
+    result is stored with a `~stellarphot.photometry.PhotometryCheckpoint`,
+    so that photometry is not redone on images that are already in the store
+    if the watcher is restarted. Only the parts of each image that the
+    photometry needs are read, using
+    `~stellarphot.photometry.read_image_sections`. An image that cannot be
+    read is tried again on the next polls, and if it still cannot be read
+    after ``MAX_READ_ATTEMPTS`` tries it is skipped until it changes.
+
+    Parameters
+    ----------
+
+    directory : str or Path
+        Directory to watch.
+
+    photometry_settings : `stellarphot.settings.PhotometrySettings`
+        Photometry settings to use for the photometry. The source list must
+        have RA/Dec coordinates if ``use_coordinates`` is ``"sky"``.
+
+    store_directory : str or Path
+        Directory in which the photometry of each image is stored.
+
+    object_of_interest : str, optional (Default: None)
+        If given, only images whose ``OBJECT`` header keyword has this value
+        are used.
+
+    poll_interval : float, optional (Default: 2)
+        Time, in seconds, between polls of ``directory`` when using `run`.
+
+    extensions : tuple of str, optional
+        File extensions of the images to watch for.
+
+    Attributes
+    ----------
+
+    latencies : `collections.deque`
+        The file name and latency, the time in seconds between the last
+        modification of the image and the moment its photometry was stored,
+        of each of the last ``MAX_LATENCIES`` images on which photometry was
+        done.
+
+    Notes
+    -----
+    The source list is only read again if the file changes, so the time spent
+    on each image is only that needed to read the image and do the photometry
+    on it.
+    """
+
+    def __init__(
+        self,
+        directory,
+        photometry_settings,
+        store_directory,
+        object_of_interest=None,
+        poll_interval=2,
+        extensions=("fit", "fits", "fts", "fit.gz", "fits.gz", "fts.gz"),
+    ):
+        if not Path(directory).is_dir():
+            raise ValueError(f"directory '{directory}' is not a valid directory.")
+        if not isinstance(photometry_settings, PhotometrySettings):
+            raise TypeError(
+                "photometry_settings must be a PhotometrySettings object, but it "
+                f"is '{type(photometry_settings)}'."
+            )
+
+        self.directory = Path(directory)
+        self.photometry_settings = photometry_settings
+        self.store = PhotometryCheckpoint(store_directory, photometry_settings)
+        self.object_of_interest = object_of_interest
+        self.poll_interval = poll_interval
+        self.extensions = tuple(f".{ext.lstrip('.')}".lower() for ext in extensions)
+        self.latencies = deque(maxlen=MAX_LATENCIES)
+        self.logger = logging.getLogger("PhotometryWatcher")
+
+        # File state (size, modification time) of each image seen on the last
+        # poll that has not been dealt with yet.
+        self._last_seen = {}
+        # Images that are not used, e.g. because they are of another object
+        self._ignored = {}
+        # File state and number of failed reads of images that could not be read
+        self._failed_reads = {}
+
+    def _candidate_images(self):
+        for path in sorted(self.directory.iterdir()):
+            if path.is_file() and path.name.lower().endswith(self.extensions):
+                yield path
+
+    def _ready_images(self):
+        """
+        Find the images that have not changed since the last poll and are not
+        yet in the store.
+        """
+        ready = []
+        last_seen = {}
+        for path in self._candidate_images():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # The file was removed (or renamed) while we were looking
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if self._ignored.get(path) == state or self.store.is_done(path):
+                continue
+
+            if self._last_seen.get(path) == state and self._is_complete(path, state):
+                ready.append(path)
+            # An image that is ready but cannot be read is tried on the next poll
+            last_seen[path] = state
+        self._last_seen = last_seen
+        return ready
+
+    @staticmethod
+    def _is_complete(path, state):
+        size, _ = state
+        if size == 0:
+            return False
+        if path.suffix.lower() == ".gz":
+            return True
+        return size % FITS_BLOCK_SIZE == 0
+
+    def poll(self):
+        """
+        Check the directory once and perform photometry on any images that
+        are ready.
+
+        Returns
+        -------
+
+        list of str
+            Names of the files on which photometry was done.
+        """
+        processed = []
+        for path in self._ready_images():
+            start = time.perf_counter()
+            state = path.stat()
+            file_state = (state.st_size, state.st_mtime_ns)
+            try:
+                with warnings.catch_warnings():
+                    warnings.filterwarnings("ignore", category=FITSFixedWarning)
+                    ccd = read_image_sections(path, self.photometry_settings)
+            except (OSError, ValueError) as err:
+                self._read_failed(path, file_state, err)
+                continue
+            self._failed_reads.pop(path, None)
+
+            if (
+                self.object_of_interest is not None
+                and ccd.header.get("OBJECT") != self.object_of_interest
+            ):
+                self._ignored[path] = file_state
+                continue
+
+            self.logger.info(f"PhotometryWatcher: Processing image {path.name}")
+            if ccd.wcs is None and (
+                self.photometry_settings.source_location_settings.use_coordinates
+                == "sky"
+            ):
+                self.logger.warning(
+                    "                   .... SKIPPING THIS IMAGE (NO WCS)"
+                )
+                self.store.record(path, False, None, None)
+                continue
+
+            photom_data, dropped_sources = single_image_photometry(
+                ccd,
+                self.photometry_settings,
+                fname=path.name,
+                logline="    >",
+            )
+            self.store.record(path, True, photom_data, dropped_sources)
+            # Measure latency from the moment the image was finished
+            latency = time.time() - state.st_mtime
+            self.latencies.append((path.name, latency))
+            if photom_data is None:
+                self.logger.info("  single_image_photometry failed for this image.")
+            else:
+                self.logger.info(
+                    f"  Done with {path.name} in "
+                    f"{time.perf_counter() - start:.2f} s, "
+                    f"{latency:.2f} s after it was written."
+                )
+            processed.append(path.name)
+
+        return processed
+
+    def _read_failed(self, path, file_state, err):
+        """
+        Keep track of an image that could not be read, giving up on it if it
+        could not be read too many times without changing.
+        """
+        last_state, attempts = self._failed_reads.get(path, (None, 0))
+        attempts = attempts + 1 if last_state == file_state else 1
+        if attempts < MAX_READ_ATTEMPTS:
+            # Most likely the file is still being written even though its
+            # size did not change; try again on the next poll.
+            self._failed_reads[path] = (file_state, attempts)
+            self.logger.warning(
+                f"PhotometryWatcher: could not read {path.name} ({err}), "
+                "will try again."
+            )
+        else:
+            # Skip it until it changes
+            del self._failed_reads[path]
+            self._ignored[path] = file_state
+            self.logger.warning(
+                f"PhotometryWatcher: could not read {path.name} ({err}) after "
+                f"{attempts} tries, skipping it unless it changes."
+            )
+
+    def run(self, max_images=None, timeout=None):
+        """
+        Poll the directory until stopped, performing photometry on each new
+        image.
+
+        Polling stops when ``max_images`` images have been processed, when
+        ``timeout`` seconds have passed or on a `KeyboardInterrupt`, whichever
+        comes first.
+
+        Parameters
+        ----------
+
+        max_images : int, optional (Default: None)
+            Stop after photometry has been done on this many images.
+
+        timeout : float, optional (Default: None)
+            Stop after this many seconds.
+
+        Returns
+        -------
+
+        int
+            The number of images on which photometry was done.
+        """
+        logging_settings = self.photometry_settings.logging_settings
+        _remove_our_handlers(self.logger)
+        fh = _add_log_handlers(
+            self.logger, logging_settings.logfile, logging_settings.console_log
+        )
+        self.logger.info(f"PhotometryWatcher: watching {self.directory}")
+
+        start = time.monotonic()
+        n_processed = 0
+        try:
+            while True:
+                n_processed += len(self.poll())
+                if max_images is not None and n_processed >= max_images:
+                    break
+                if timeout is not None and time.monotonic() - start >= timeout:
+                    break
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.logger.info(
+                f"PhotometryWatcher: stopped watching {self.directory} after "
+                f"processing {n_processed} images."
+            )
+            if fh is not None:
+                fh.flush()
+                fh.close()
+            _remove_our_handlers(self.logger)
+
+        return n_processed
+
+    def photometry(self):
+        """
+        All of the photometry in the store.
+
+        Returns
+        -------
+
+        photom_data : `stellarphot.PhotometryData` or None
+            The photometry of every image processed so far (including images
+            processed in earlier runs using the same store), or ``None`` if
+            there is none.
+        """
+        return self.store.photometry()
@@ -59,6 +59,9 @@ TEST_PHOTOMETRY_OPTIONS = dict(
     reject_background_outliers=False,
     fwhm_method="fit",
     partial_pixel_method="center",
+    # The default, so that tests that use these settings measure the sky in an
+    # annulus unless they ask for something else.
+    sky_method="annulus",
 )
 
 TEST_PASSBAND_MAP = dict(
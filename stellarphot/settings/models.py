@@ -729,6 +729,14 @@ class PhotometryOptionalSettings(BaseModelWithTableRep):
         For more information, see the
         `photutils documentation <https://photutils.readthedocs.io/en/stable/aperture.html#aperture-and-pixel-overlap>`_.
 
+    sky_method : `typing.Literal["annulus", "mesh"]`, optional
+        How to find the sky background of each source. If ``'annulus'``, the
+        statistics of the pixels in the annulus around the source are used. If
+        ``'mesh'``, a `~stellarphot.photometry.BackgroundMesh` of the image is
+        made once and the background at the position of each source is used,
+        which is better for images with gradients in the background, e.g.
+        from moonlight or twilight. The default is ``'annulus'``.
+
     Examples
     --------
 
@@ -843,6 +851,16 @@ class PhotometryOptionalSettings(BaseModelWithTableRep):
         ),
     ] = "exact"
 
+    sky_method: Annotated[
+        Literal["annulus", "mesh"],
+        Field(
+            description=(
+                "How to find the sky background of each source: from the pixels "
+                "in its annulus, or from a background mesh of the whole image."
+            ),
+        ),
+    ] = "annulus"
+
 
 class PassbandMapEntry(BaseModel):
     """
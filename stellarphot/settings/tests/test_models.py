@@ -65,6 +65,7 @@ class TableWithAttribute(BaseEnhancedTable):
         [Exoplanet, TEST_EXOPLANET_SETTINGS],
         [Observatory, TEST_OBSERVATORY_SETTINGS],
         [PhotometryOptionalSettings, TEST_PHOTOMETRY_OPTIONS],
+        [PhotometryOptionalSettings, TEST_PHOTOMETRY_OPTIONS | dict(sky_method="mesh")],
         [PassbandMap, TEST_PASSBAND_MAP],
         [PhotometrySettings, TEST_PHOTOMETRY_SETTINGS],
         [LoggingSettings, TEST_LOGGING_SETTINGS],
@@ -37,6 +37,29 @@ def generate_table_representers(cls):
     AstropyLoader.add_constructor(class_string, _constructor)
 
 
+def _model_to_dict(model_instance):
+    # So, funny story. model_dump gives you a nice dictionary, in which
+    # things like Longitude are turned into strings. However, writing them
+    # to ECSV fails, because ECSV doesn't understand np.str_, and - guess what -
+    # a Longitude returns a np.str_ when you do str(some_longitude).
+    # The upshot is that the workaround here, i.e. using model_dump to get
+    # simple objects into the header, does not work unless all string values
+    # are converted to str.
+    #
+    # The issue has been reported in
+    # https://github.com/astropy/astropy/issues/18235
+    #
+
+    # Dumping to json ensures that all the objects are converted to
+    # very basic types, which is easy enough to convert to a dictionary.
+
+    # Use model_dump_json to get a simple dictionary representation
+    model_json = model_instance.model_dump_json()
+    model_dict = json.loads(model_json)
+    model_dict["_model_name"] = model_instance.__class__.__name__
+    return model_dict
+
+
 def serialize_models_in_table_meta(table_meta):
     """
     Serialize the models in the table metadata **IN PLACE**.
@@ -53,32 +76,42 @@ def serialize_models_in_table_meta(table_meta):
     for key, value in table_meta.items():
         # If the value is a model instance, serialize it
         if isinstance(value, model_classes):
-            model_instance = value
-            # So, funny story. model_dump gives you a nice dictionary, in which
-            # things like Longitude are turned into strings. However, writing them
-            # to ECSV fails, because ECSV doesn't understand np.str_, and - guess what -
-            # a Longitude returns a np.str_ when you do str(some_longitude).
-            # The upshot is that the workaround here, i.e. using model_dump to get
-            # simple objects into the header, does not work unless all string values
-            # are converted to str.
-            #
-            # The issue has been reported in
-            # https://github.com/astropy/astropy/issues/18235
-            #
-
-            # Dumping to json ensures that all the objects are converted to
-            # very basic types, which is easy enough to convert to a dictionary.
-
-            # Use model_dump_json to get a simple dictionary representation
-            model_json = model_instance.model_dump_json()
-            model_dict = json.loads(model_json)
-            table_meta[key] = model_dict
-            table_meta[key]["_model_name"] = model_instance.__class__.__name__
+            table_meta[key] = _model_to_dict(value)
         # If the value is a dict, recurse
         elif isinstance(value, dict):
             serialize_models_in_table_meta(value)
 
 
+def serialized_table_meta(table_meta):
+    """
+    Return a copy of the table metadata in which the models are serialized.
+
+    Unlike `serialize_models_in_table_meta`, the metadata is left unchanged.
+    Only the dictionaries in the metadata are copied; all other values are
+    shared with the original, so this is much cheaper than a deep copy of
+    the metadata.
+
+    Parameters
+    ----------
+    table_meta : dict
+        The metadata dictionary of the table.
+
+    Returns
+    -------
+    dict
+        The metadata, with the models replaced by dictionaries.
+    """
+    model_classes = tuple(getattr(models, model_name) for model_name in models.__all__)
+
+    serialized = table_meta.copy()
+    for key, value in table_meta.items():
+        if isinstance(value, model_classes):
+            serialized[key] = _model_to_dict(value)
+        elif isinstance(value, dict):
+            serialized[key] = serialized_table_meta(value)
+    return serialized
+
+
 def deserialize_models_in_table_meta(table_meta):
     """
     Deserialize the models in the table metadata **IN PLACE**.
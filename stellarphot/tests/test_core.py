@@ -19,6 +19,8 @@ from stellarphot.core import (
     CatalogData,
     PhotometryData,
     SourceListData,
+    _light_travel_time,
+    _night,
 )
 from stellarphot.settings import Camera, Observatory, PassbandMap
 
@@ -666,6 +668,112 @@ def test_photometry_data_filter_name_map_preserves_original_names(
     assert phot_data["passband"][1] == "SI"
 
 
+@pytest.mark.parametrize("copy", [True, False])
+def test_photometry_data_copy(feder_cg_16m, feder_passbands, feder_obs, copy):
+    input_data = testphot_clean.copy()
+    input_data.rename_column("star_id", "id_of_star")
+    phot_data = PhotometryData(
+        observatory=feder_obs,
+        camera=feder_cg_16m,
+        passband_map=feder_passbands,
+        input_data=input_data,
+        colname_map={"id_of_star": "star_id"},
+        copy=copy,
+    )
+    expected = PhotometryData(
+        observatory=feder_obs,
+        camera=feder_cg_16m,
+        passband_map=feder_passbands,
+        input_data=testphot_clean,
+    )
+    assert phot_data.colnames == expected.colnames
+    for column in ["star_id", "aperture_sum", "passband", "night"]:
+        assert all(phot_data[column] == expected[column])
+
+    # The data is only shared with the input if it is not copied...
+    assert (
+        np.shares_memory(phot_data["aperture_sum"], input_data["aperture_sum"])
+        is not copy
+    )
+    # ...but the input table itself is not changed either way
+    assert "id_of_star" in input_data.colnames
+    assert "star_id" not in input_data.colnames
+    assert "night" not in input_data.colnames
+    assert "__attributes__" not in input_data.meta
+
+
+def _night_with_time_arithmetic(date_obs, longitude):
+    # The way the night was calculated before it was vectorized
+    hr_offset = int(longitude / 15)
+    LocalTime = Time(date_obs) + hr_offset * u.hr
+    hr = LocalTime.ymdhms.hour
+    shift_hr = hr.copy()
+    shift_hr[hr < 12] = shift_hr[hr < 12] + 12
+    shift_hr[hr >= 12] = shift_hr[hr >= 12] - 12
+    delta = (
+        -shift_hr * u.hr
+        - LocalTime.ymdhms.minute * u.min
+        - LocalTime.ymdhms.second * u.s
+    )
+    return np.array((Time(date_obs) + delta).to_value("mjd"), dtype=int)
+
+
+@pytest.mark.parametrize(
+    "longitude", [-180, -179.9, -96.8, -15, -14.9, -0.1, 0, 7.5, 15, 120.3, 180]
+)
+def test_night_matches_time_arithmetic(longitude):
+    rng = np.random.default_rng(int(longitude * 10) % 1000)
+    # Random times over 30 years...
+    mjd = 50000 + rng.uniform(0, 11000, 5000)
+    # ...and times within a few seconds of each local hour, where the night
+    # changes
+    hr_offset = int(longitude / 15)
+    hours = rng.integers(0, 24, 1000)
+    seconds = rng.choice([-5, -1, 1, 5], 1000)
+    mjd_near_hours = (
+        rng.integers(50000, 61000, 1000) + (hours - hr_offset) / 24 + seconds / 86400
+    )
+    date_obs = Time(np.concatenate([mjd, mjd_near_hours]), format="mjd", scale="utc")
+    date_obs.format = "isot"
+
+    # Time arithmetic on UTC times is done in TAI, so within a day after a leap
+    # second the old calculation can land a second before midnight, which is
+    # when local noon is for a longitude of -180, and so be a day off.
+    def tai_minus_utc(times):
+        return np.round((times.tai.jd1 - times.jd1 + times.tai.jd2 - times.jd2) * 86400)
+
+    leap_second_in_last_day = tai_minus_utc(date_obs) != tai_minus_utc(
+        date_obs - 1 * u.day
+    )
+    date_obs = date_obs[~leap_second_in_last_day]
+    np.testing.assert_array_equal(
+        _night(date_obs, longitude), _night_with_time_arithmetic(date_obs, longitude)
+    )
+
+
+@pytest.mark.parametrize("one_position", [True, False])
+def test_light_travel_time_matches_astropy(feder_obs, one_position):
+    rng = np.random.default_rng(1234)
+    # A few images, each with many stars
+    image_times = Time(60000 + rng.uniform(0, 365, 10), format="mjd", scale="utc")
+    times = image_times[rng.integers(0, 10, 500)]
+    if one_position:
+        sky_coords = SkyCoord(ra=78.3 * u.deg, dec=-12.7 * u.deg)
+    else:
+        sky_coords = SkyCoord(
+            ra=rng.uniform(0, 360, 500) * u.deg,
+            dec=np.degrees(np.arcsin(rng.uniform(-1, 1, 500))) * u.deg,
+        )
+    location = feder_obs.earth_location
+    expected = times.light_travel_time(sky_coords, location=location)
+    np.testing.assert_allclose(
+        _light_travel_time(times, sky_coords, location).to_value(u.s),
+        expected.to_value(u.s),
+        rtol=0,
+        atol=1e-6,
+    )
+
+
 def test_photometry_roundtrip_ecsv(tmp_path, feder_cg_16m, feder_passbands, feder_obs):
     # Check that we can save the test data to ECSV and restore it
     file_path = tmp_path / "test_photometry.ecsv"
@@ -682,6 +790,57 @@ def test_photometry_roundtrip_ecsv(tmp_path, feder_cg_16m, feder_passbands, fede
     assert phot_data["ra"] == phot_data2["ra"]
 
 
+def test_photometry_roundtrip_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    phot_data = PhotometryData.read(
+        get_pkg_data_filename("data/test_photometry_data.ecsv")
+    )
+    file_path = tmp_path / "test_photometry.parquet"
+    phot_data.write(file_path)
+    # Writing should not change the models in the metadata
+    assert isinstance(phot_data.camera, Camera)
+    assert isinstance(phot_data.observatory, Observatory)
+
+    phot_data2 = PhotometryData.read(file_path)
+    assert phot_data2.colnames == phot_data.colnames
+    assert phot_data2.camera == phot_data.camera
+    assert phot_data2.observatory == phot_data.observatory
+    for column in phot_data.colnames:
+        if isinstance(phot_data[column], Time):
+            assert phot_data2[column].scale == phot_data[column].scale
+            assert all(phot_data2[column] == phot_data[column])
+        else:
+            assert getattr(phot_data2[column], "unit", None) == getattr(
+                phot_data[column], "unit", None
+            )
+            np.testing.assert_array_equal(phot_data2[column], phot_data[column])
+
+
+def test_photometry_read_part_of_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    phot_data = PhotometryData.read(
+        get_pkg_data_filename("data/test_photometry_data.ecsv")
+    )
+    file_path = tmp_path / "test_photometry.parquet"
+    phot_data.write(file_path)
+
+    star_id = phot_data["star_id"][0]
+    columns = ["star_id", "mag_inst", "date-obs"]
+    part = PhotometryData.read(
+        file_path, include_names=columns, filters=[("star_id", "=", star_id)]
+    )
+    assert part.colnames == columns
+    assert part.camera == phot_data.camera
+    this_star = phot_data[phot_data["star_id"] == star_id]
+    assert all(part["star_id"] == star_id)
+    np.testing.assert_array_equal(part["mag_inst"], this_star["mag_inst"])
+    assert all(part["date-obs"] == this_star["date-obs"])
+
+    # Nothing matches a night with no data
+    night = phot_data["night"][0] + 1
+    assert len(PhotometryData.read(file_path, filters=[("night", "=", night)])) == 0
+
+
 def test_photometry_slicing(feder_cg_16m, feder_passbands, feder_obs):
     # Create photometry data instance
     phot_data = PhotometryData(
@@ -1178,6 +1337,35 @@ def test_sourcelist():
     assert sl_test["star_id"][0] == 0
 
 
+def test_sourcelist_and_catalog_roundtrip_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    sl_test = SourceListData(input_data=test_sl_data, colname_map=None)
+    sl_test.write(tmp_path / "sources.parquet")
+    sl_test2 = SourceListData.read(tmp_path / "sources.parquet")
+    assert sl_test2.colnames == sl_test.colnames
+    for column in sl_test.colnames:
+        np.testing.assert_array_equal(sl_test2[column], sl_test[column])
+
+    catalog = CatalogData(
+        input_data=test_cat,
+        catalog_name="VSX",
+        catalog_source="Vizier",
+        colname_map={
+            "Name": "id",
+            "RAJ2000": "ra",
+            "DEJ2000": "dec",
+            "max": "mag",
+            "n_max": "passband",
+        },
+        no_catalog_error=True,
+    )
+    catalog.write(tmp_path / "catalog.parquet")
+    catalog2 = CatalogData.read(tmp_path / "catalog.parquet")
+    assert catalog2.meta == catalog.meta
+    assert catalog2.colnames == catalog.colnames
+    np.testing.assert_array_equal(catalog2["ra"], catalog["ra"])
+
+
 def test_sourcelist_no_skypos():
     test_sl_data2 = test_sl_data.copy()
     del test_sl_data2["ra"]
@@ -1384,6 +1572,85 @@ def test_to_lightcurve_multiple_passbands(simple_photometry_data):
         two_filters.lightcurve_for(1, passband="SI")
 
 
+def test_lightcurves(simple_photometry_data):
+    # Several times of a few stars in two passbands
+    delta_t = 3 * u.minute
+    t_init = simple_photometry_data["date-obs"][0]
+    new_data = []
+    for i in range(5):
+        data = simple_photometry_data.copy()
+        data["date-obs"] = t_init + i * delta_t
+        data["mag_inst"] += i
+        new_data.append(data)
+    one_filter = vstack(new_data)
+    second_filter = one_filter.copy()
+    second_filter["passband"] = "SG"
+    two_filters = vstack([one_filter, second_filter])
+
+    light_curves = two_filters.lightcurves(passband="SR")
+    assert sorted(light_curves) == sorted(set(simple_photometry_data["star_id"]))
+    for star_id, light_curve in light_curves.items():
+        expected = two_filters.lightcurve_for(star_id, passband="SR")
+        assert len(light_curve) == 5
+        assert light_curve.colnames == expected.colnames
+        assert (light_curve["passband"] == "SR").all()
+        assert (light_curve["star_id"] == star_id).all()
+        np.testing.assert_array_equal(light_curve.time.jd, expected.time.jd)
+        np.testing.assert_array_equal(light_curve.flux, expected.flux)
+        np.testing.assert_array_equal(light_curve.flux_err, expected.flux_err)
+
+    # With only one passband it need not be given
+    assert sorted(one_filter.lightcurves()) == sorted(light_curves)
+
+    with pytest.raises(ValueError, match=r"Multiple passbands found: SG, SR"):
+        two_filters.lightcurves()
+
+    with pytest.raises(ValueError, match=r"Passband SI not found"):
+        two_filters.lightcurves(passband="SI")
+
+
+def test_star_index_follows_column_changes(simple_photometry_data):
+    phot = simple_photometry_data.copy()
+    star_id = phot["star_id"][0]
+    assert len(phot.lightcurve_for(star_id)) == 1
+    assert phot.coord[0].ra == phot["ra"][0]
+
+    # Replacing the columns must update the star index and the coordinates
+    phot["star_id"] = phot["star_id"] + 1000
+    with pytest.raises(ValueError, match="No star found that matched"):
+        phot.lightcurve_for(star_id)
+    assert len(phot.lightcurve_for(star_id + 1000)) == 1
+
+    phot["ra"] = phot["ra"] + 1 * u.deg
+    assert phot.coord[0].ra == phot["ra"][0]
+    light_curve = phot.lightcurve_for(phot.coord[0])
+    assert light_curve["star_id"][0] == star_id + 1000
+
+
+@pytest.mark.parametrize("reorder", ["sort", "reverse", "assign_rows"])
+def test_star_index_follows_row_order_changes(reorder):
+    # Sorting, reversing and assigning rows change the values inside the same
+    # column objects, which must not leave the star index or the coordinates
+    # out of date.
+    phot = PhotometryData.read(get_pkg_data_filename("data/test_photometry_data.ecsv"))
+    # Fill the caches
+    phot.lightcurve_for(1)
+    assert phot.coord[0].ra == phot["ra"][0]
+
+    if reorder == "sort":
+        phot.sort("mag_inst", reverse=True)
+    elif reorder == "reverse":
+        phot.reverse()
+    else:
+        phot[:] = phot[::-1]
+
+    light_curve = phot.lightcurve_for(1)
+    assert len(light_curve) > 0
+    assert (light_curve["star_id"] == 1).all()
+    assert phot.coord[0].ra == phot["ra"][0]
+    assert phot.coord[-1].dec == phot["dec"][-1]
+
+
 def test_reading_2_0_0_alpha_photometry_file():
     """
     Just make sure that old photometry files are still readable.
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+from astropy import units as u
+from astropy.table import vstack
+from astropy.time import Time
+from astropy.utils.data import get_pkg_data_filename
+
+from stellarphot import PhotometryData, PhotometryDataset
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def photometry():
+    # One night in one passband...
+    first = PhotometryData.read(get_pkg_data_filename("data/test_photometry_data.ecsv"))
+    # ...the same night in another passband...
+    other_passband = first.copy()
+    other_passband["passband"] = "SI"
+    # ...and the next night.
+    next_night = first.copy()
+    next_night["date-obs"] = next_night["date-obs"] + 1 * u.day
+    next_night["night"] += 1
+    return first, other_passband, next_night
+
+
+def _assert_same(table, expected):
+    assert table.colnames == expected.colnames
+    for column in expected.colnames:
+        if isinstance(expected[column], Time):
+            assert all(table[column] == expected[column])
+        else:
+            np.testing.assert_array_equal(table[column], expected[column])
+
+
+def test_dataset_append_and_read(tmp_path, photometry):
+    first, other_passband, next_night = photometry
+    dataset = PhotometryDataset(tmp_path / "dataset")
+    written = dataset.append(vstack([first, other_passband]))
+    assert len(written) == 2
+    dataset.append(next_night)
+
+    night = first["night"][0]
+    assert dataset.nights == [night, night + 1]
+    assert dataset.passbands == ["SI", "SR"]
+    assert (tmp_path / "dataset" / f"night={night}" / "passband=SR").is_dir()
+
+    everything = dataset.read()
+    assert everything.camera == first.camera
+    assert everything.observatory == first.observatory
+    # In order of night, then passband
+    _assert_same(everything, vstack([other_passband, first, next_night]))
+
+
+def test_dataset_read_part(tmp_path, photometry):
+    first, other_passband, next_night = photometry
+    dataset = PhotometryDataset(tmp_path)
+    dataset.append(vstack([first, other_passband, next_night]))
+    night = first["night"][0]
+    star_id = first["star_id"][0]
+
+    _assert_same(dataset.read(night=night + 1), next_night)
+    _assert_same(dataset.read(passband="SI"), other_passband)
+    _assert_same(
+        dataset.read(night=[night], passband=["SR"], star_id=star_id),
+        first[first["star_id"] == star_id],
+    )
+    columns = ["star_id", "mag_inst"]
+    _assert_same(
+        dataset.read(night=night, passband="SR", columns=columns), first[columns]
+    )
+
+    partitions = list(dataset.iter_partitions(passband="SR"))
+    assert len(partitions) == 2
+    _assert_same(partitions[1], next_night)
+
+    assert len(dataset.read(night=night + 2)) == 0
+
+
+def test_dataset_append_only(tmp_path, photometry):
+    first, _, _ = photometry
+    dataset = PhotometryDataset(tmp_path)
+    dataset.append(first[:5])
+    dataset.append(first[5:])
+    partition = tmp_path / f"night={first['night'][0]}" / "passband=SR"
+    assert sorted(path.name for path in partition.iterdir()) == [
+        "part-00000.parquet",
+        "part-00001.parquet",
+    ]
+    _assert_same(dataset.read(), first)
+
+
+def test_dataset_append_twice(tmp_path, photometry):
+    first, other_passband, next_night = photometry
+    dataset = PhotometryDataset(tmp_path)
+    dataset.append(vstack([first, other_passband]))
+    # Nothing is written if any of the photometry is already in the dataset
+    with pytest.raises(ValueError, match="already in the dataset"):
+        dataset.append(vstack([next_night, first[3:4]]))
+    assert dataset.nights == [first["night"][0]]
+    _assert_same(dataset.read(passband="SR"), first)
+
+    # The same times for other stars are fine
+    night_dir = tmp_path / f"night={first['night'][0]}"
+    more_stars = first.copy()
+    more_stars["star_id"] += 1000
+    dataset.append(more_stars)
+    assert len(list((night_dir / "passband=SR").iterdir())) == 2
+
+
+def test_dataset_append_bad_input(tmp_path, photometry):
+    first, _, _ = photometry
+    dataset = PhotometryDataset(tmp_path)
+    with pytest.raises(TypeError, match="must be a stellarphot.PhotometryData"):
+        dataset.append(first.as_array())
+
+    dataset.append(first)
+    other_camera = first.copy()
+    other_camera.camera = first.camera.model_copy(update={"name": "Another camera"})
+    with pytest.raises(ValueError, match="camera of the photometry does not match"):
+        dataset.append(other_camera)
+
+
+def test_dataset_path_is_file(tmp_path):
+    (tmp_path / "file").write_text("not a dataset")
+    with pytest.raises(ValueError, match="is not a directory"):
+        PhotometryDataset(tmp_path / "file")
+
+
+def test_dataset_lightcurve_for(tmp_path, photometry):
+    first, other_passband, next_night = photometry
+    dataset = PhotometryDataset(tmp_path)
+    dataset.append(vstack([first, other_passband, next_night]))
+    star_id = first["star_id"][3]
+
+    light_curve = dataset.lightcurve_for(star_id, passband="SR")
+    expected = vstack([first, next_night]).lightcurve_for(star_id, passband="SR")
+    np.testing.assert_array_equal(light_curve.flux, expected.flux)
+    np.testing.assert_array_equal(light_curve.time.jd, expected.time.jd)
+
+    # The star can also be found by its position
+    light_curve = dataset.lightcurve_for(
+        first.coord[3], passband="SR", night=first["night"][0]
+    )
+    expected = first.lightcurve_for(star_id)
+    np.testing.assert_array_equal(light_curve.flux, expected.flux)
+
+    with pytest.raises(ValueError, match="No photometry in the dataset"):
+        dataset.lightcurve_for(star_id, passband="V")
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from astropy import units as u
+from astropy.table import vstack
+from astropy.time import Time
+
+from stellarphot import FluxMatrix
+
+
+@pytest.fixture
+def photometry(simple_photometry_data):
+    # The same stars at three times, given out of order, with one star
+    # missing at the last time
+    delta_t = 3 * u.minute
+    t_init = simple_photometry_data["date-obs"][0]
+    tables = []
+    for i in [2, 0, 1]:
+        data = simple_photometry_data.copy()
+        data["date-obs"] = t_init + i * delta_t
+        data["aperture_net_cnts"] += 100 * i * data["aperture_net_cnts"].unit
+        if i == 2:
+            data = data[1:]
+        tables.append(data)
+    return vstack(tables)
+
+
+def test_flux_matrix_arrangement(photometry, simple_photometry_data):
+    matrix = FluxMatrix(photometry)
+    star_ids = np.sort(simple_photometry_data["star_id"])
+    n_stars = len(star_ids)
+    assert matrix.shape == (3, n_stars)
+    np.testing.assert_array_equal(matrix.star_ids, star_ids)
+    assert isinstance(matrix.times, Time)
+    assert all(np.diff(matrix.times.jd) > 0)
+
+    # Only the first star at the last time is missing
+    missing_star = simple_photometry_data["star_id"][0]
+    expected_present = np.ones((3, n_stars), dtype=bool)
+    expected_present[2, star_ids == missing_star] = False
+    np.testing.assert_array_equal(matrix.present, expected_present)
+    assert (matrix.rows[~expected_present] == -1).all()
+
+    # Each row of the photometry is in the right cell
+    for row, (time_index, star_index) in enumerate(
+        zip(matrix.time_index, matrix.star_index, strict=True)
+    ):
+        assert matrix.rows[time_index, star_index] == row
+        assert matrix.times[time_index] == photometry["date-obs"][row]
+        assert matrix.star_ids[star_index] == photometry["star_id"][row]
+
+
+def test_flux_matrix_columns(photometry):
+    matrix = FluxMatrix(photometry)
+    counts = matrix["aperture_net_cnts"]
+    assert counts.shape == matrix.shape
+    assert np.isnan(counts[~matrix.present]).all()
+    assert not np.isnan(counts[matrix.present]).any()
+    # Each time has 100 more counts than the one before
+    np.testing.assert_allclose(np.diff(counts[:2], axis=0).value, 100)
+    np.testing.assert_array_equal(
+        matrix.to_rows(counts), photometry["aperture_net_cnts"]
+    )
+
+    # Units are kept
+    width = matrix["width"]
+    assert width.unit == photometry["width"].unit
+    np.testing.assert_array_equal(matrix.to_rows(width), photometry["width"])
+
+    # The array is only made once
+    assert matrix["aperture_net_cnts"] is counts
+
+
+def test_flux_matrix_masked_values(photometry):
+    photometry["airmass"] = np.ma.masked_array(
+        photometry["airmass"], mask=np.arange(len(photometry)) == 0
+    )
+    matrix = FluxMatrix(photometry)
+    airmass = matrix["airmass"]
+    assert np.isnan(matrix.to_rows(airmass)[0])
+    assert not np.isnan(matrix.to_rows(airmass)[1:]).any()
+
+
+def test_flux_matrix_errors(photometry):
+    with pytest.raises(TypeError, match="'passband' is not numeric"):
+        FluxMatrix(photometry)["passband"]
+
+    with pytest.raises(ValueError, match="more than one row of photometry"):
+        FluxMatrix(vstack([photometry, photometry[:1]]))
@@ -188,4 +188,5 @@ class VersionMigrator:
             observatory=self.observatory,
             passband_map=self.passband_map,
             colname_map=v1_to_v2_col_renames,
+            copy=False,
         )